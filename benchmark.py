@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+Benchmark the P4_16 code generator itself.
+
+Each benchmark takes the same arguments as generate.py after its name, e.g.:
+    benchmark.py render -t v1model --number-tables 5000 --header-fields 64
+"""
+import argparse
+import collections
+import gc
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import generate
+from p4gen16 import bmv2, entries, snapshot
+from p4gen16.types import targets, templateable
+from p4gen16.types.fragments import FragmentCache
+
+FORMAT = generate.FORMAT
+
+
+def _timed(func, repeat):
+    """ Return the best wall-clock time of repeat calls to func. """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_render(args, gen_args):
+    """ Time str(program) with and without template cache and memoization. """
+    program, _, _ = generate.build(gen_args)
+
+    def render():
+        # start from scratch, memoized output of the last run is outdated
+        templateable.invalidate_renders()
+        return str(program)
+
+    cached_get_template = templateable.get_template
+    def uncached_get_template(*key):
+        # mimic the former behaviour: a fresh environment per rendered node
+        templateable.invalidate_cache()
+        return cached_get_template(*key)
+
+    templateable.MEMOIZE = False
+    templateable.get_template = uncached_get_template
+    try:
+        uncached = _timed(render, args.repeat)
+    finally:
+        templateable.get_template = cached_get_template
+    templateable.invalidate_cache()
+    cold = _timed(render, 1)
+    warm = _timed(render, args.repeat)
+    templateable.MEMOIZE = True
+    memoized = _timed(render, args.repeat)
+
+    print('output:   {:>10} bytes'.format(len(render())))
+    print('uncached: {:>10.4f} s'.format(uncached))
+    print('cold:     {:>10.4f} s'.format(cold))
+    print('warm:     {:>10.4f} s ({:.1f}x)'.format(warm, uncached / warm))
+    print('memoized: {:>10.4f} s ({:.1f}x)'.format(memoized, uncached / memoized))
+    # only nodes rendered repeatedly keep their output
+    kept = [node._rendered[-1] for node in gc.get_objects() # pylint: disable=protected-access
+            if isinstance(node, templateable.Templateable)
+            and isinstance(node._rendered, tuple)] # pylint: disable=protected-access
+    print('kept:     {:>10} bytes by {} nodes'.format(sum(map(len, kept)), len(kept)))
+
+
+def bench_coldstart(args, gen_args):
+    """ Time complete generate.py runs with and without the bytecode cache. """
+    output = tempfile.mkdtemp()
+    command = [sys.executable, generate.__file__] + args.generate_args
+    if not gen_args.output:
+        command += ['-o', output]
+    def run(cache_dir):
+        env = dict(os.environ)
+        env[templateable.BYTECODE_CACHE_ENV] = cache_dir
+        subprocess.run(command, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        run(cache_dir) # populate cache
+        disabled = _timed(lambda: run(''), args.repeat)
+        enabled = _timed(lambda: run(cache_dir), args.repeat)
+    shutil.rmtree(output)
+    print('no cache: {:>10.4f} s'.format(disabled))
+    print('cached:   {:>10.4f} s ({:.1f}x)'.format(enabled, disabled / enabled))
+
+
+def bench_emitter(args, gen_args):
+    """ Compare output and time of the jinja2 and native emitter backends. """
+    program, controller, utilities = generate.build(gen_args)
+    contents = [program, controller] + list(utilities.values())
+
+    def render():
+        templateable.invalidate_renders()
+        return [str(content) for content in contents]
+
+    times = {}
+    outputs = {}
+    for emitter in templateable.EMITTERS:
+        templateable.set_emitter(emitter)
+        outputs[emitter] = render()
+        times[emitter] = _timed(render, args.repeat)
+    templateable.set_emitter('jinja2')
+
+    reference = outputs['jinja2']
+    for emitter, output in outputs.items():
+        if output != reference:
+            print('{}: output differs from jinja2'.format(emitter))
+            return 1
+    for emitter, elapsed in times.items():
+        print('{:<9} {:>10.4f} s ({:.1f}x)'.format(
+            emitter + ':', elapsed, times['jinja2'] / elapsed))
+    return 0
+
+
+def bench_derive(args, gen_args):
+    """ Time building a sweep over --number-tables from scratch and derived
+        from one base program.
+    """
+    counts = range(1, args.variants + 1)
+
+    def rebuild():
+        variants = []
+        for count in counts:
+            gen_args.number_tables = count
+            variants.append(generate.build(gen_args)[0])
+        return variants
+
+    def derive():
+        gen_args.number_tables = counts[0]
+        base = generate.build(gen_args)[0]
+        return [base.derive(number_tables=count) for count in counts]
+
+    # check a few variants, rendering all of them takes longer than building
+    for rebuilt, derived in list(zip(rebuild(), derive()))[::max(1, args.variants // 10)]:
+        if str(rebuilt) != str(derived):
+            print('derive: output differs')
+            return 1
+    rebuilt = _timed(rebuild, args.repeat)
+    derived = _timed(derive, args.repeat)
+    print('variants: {:>10}'.format(args.variants))
+    print('rebuild:  {:>10.4f} s'.format(rebuilt))
+    print('derive:   {:>10.4f} s ({:.1f}x)'.format(derived, rebuilt / derived))
+    return 0
+
+
+def bench_sweep(args, gen_args):
+    """ Time rendering a sweep over --number-table-entries without and with
+        the fragment cache, kept in memory or on disk (a cache per variant,
+        like generate.py runs sharing --fragment-cache DIR).
+    """
+    variants = []
+    for count in range(1, args.variants + 1):
+        gen_args.number_table_entries = count
+        variants.append(generate.build(gen_args)[0])
+
+    def render(caches):
+        # stream like generate.py does, start from scratch
+        templateable.invalidate_renders()
+        outputs = []
+        for program, cache in zip(variants, caches):
+            templateable.set_fragment_cache(cache)
+            outputs.append(''.join(program.generate()))
+        templateable.set_fragment_cache(None)
+        return outputs
+
+    reference = render([None] * len(variants))
+    uncached = _timed(lambda: render([None] * len(variants)), args.repeat)
+    print('variants: {:>10}'.format(args.variants))
+    print('no cache: {:>10.4f} s'.format(uncached))
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ('memory', 'disk'):
+            best = None
+            for run in range(args.repeat):
+                # empty caches, filled by the first variant
+                if mode == 'memory':
+                    caches = [FragmentCache()] * len(variants)
+                else:
+                    path = os.path.join(directory, str(run))
+                    caches = [FragmentCache(path) for _ in variants]
+                start = time.perf_counter()
+                outputs = render(caches)
+                elapsed = time.perf_counter() - start
+                if outputs != reference:
+                    print('fragment cache ({}): output differs'.format(mode))
+                    return 1
+                if best is None or elapsed < best:
+                    best = elapsed
+            hits = sum(cache.hits for cache in set(caches))
+            misses = sum(cache.misses for cache in set(caches))
+            print('{:<9} {:>10.4f} s ({:.1f}x, {} hits, {} misses)'.format(
+                mode + ':', best, uncached / best, hits, misses))
+    return 0
+
+
+def bench_snapshot(args, gen_args):
+    """ Compare building a program, controller and utilities with loading
+        their snapshot.
+    """
+    contents = generate.build(gen_args)
+    data = snapshot.dumps(contents)
+
+    def render(contents):
+        program, controller, utilities = contents
+        templateable.invalidate_renders()
+        return [str(content) for content in [program, controller] + list(utilities.values())]
+
+    if render(snapshot.loads(data)) != render(contents):
+        print('snapshot: output differs')
+        return 1
+    built = _timed(lambda: generate.build(gen_args), args.repeat)
+    dumped = _timed(lambda: snapshot.dumps(contents), args.repeat)
+    loaded = _timed(lambda: snapshot.loads(data), args.repeat)
+    print('size:     {:>10} bytes'.format(len(data)))
+    print('build:    {:>10.4f} s'.format(built))
+    print('dump:     {:>10.4f} s'.format(dumped))
+    print('load:     {:>10.4f} s ({:.1f}x)'.format(loaded, built / loaded))
+    return 0
+
+
+def bench_headertypes(args, gen_args):
+    """ Compare output size, generation time and compile time (--p4c, if
+        installed) of unrolled and shared header types.
+    """
+    compiler = shutil.which(args.p4c)
+    sizes = {}
+    with tempfile.TemporaryDirectory() as output:
+        for mode in generate.HEADER_TYPES:
+            gen_args.header_types = mode
+            file_name = os.path.join(output, mode + '.p4')
+
+            def render():
+                templateable.invalidate_renders()
+                program = generate.build(gen_args)[0]
+                with open(file_name, 'wt') as file_:
+                    program.render_to(file_)
+
+            generated = _timed(render, args.repeat)
+            sizes[mode] = os.path.getsize(file_name)
+            line = '{:<9} {:>10} bytes, generated in {:.4f} s'.format(
+                mode + ':', sizes[mode], generated)
+            if compiler:
+                compiled = _timed(lambda: subprocess.run(
+                    [compiler, file_name], check=True, cwd=output,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL), args.repeat)
+                line += ', compiled in {:.4f} s'.format(compiled)
+            print(line)
+    if not compiler:
+        print('{}: not found, compile time not measured (see --p4c)'.format(args.p4c))
+    print('size:     {:>10.1f}x smaller'.format(sizes['unrolled'] / sizes['shared']))
+    return 0
+
+
+# configurations checked by the bmv2 benchmark, applied on top of its arguments
+BMV2_SAMPLE = [
+    [],
+    ['--match-type', 'lpm'],
+    ['--match-type', 'ternary'],
+    ['--action', 'set_egress_port', '--default-action', 'drop'],
+    ['--action', 'scale_action_data', '--number-action-data', '4'],
+    ['--header-stack-height', '3', '--parser-branching-factor', '2'],
+    ['--header-field-modifies', '2', '--meta-field-modifies', '2', '--deparser-add-headers', '2'],
+    ['--header-types', 'shared'],
+]
+
+
+def bench_bmv2(args, gen_args):
+    """ Emit bmv2 JSON from the IR for a sample of configurations (BMV2_SAMPLE)
+        and, if --p4c-bmv2 is installed, check its conformance with the JSON
+        compiled by p4c and compare the emission and compile times.
+    """
+    # pylint: disable=unused-argument
+    compiler = shutil.which(args.p4c_bmv2)
+    failed = 0
+    with tempfile.TemporaryDirectory() as output:
+        for extra in BMV2_SAMPLE:
+            sample_args = generate.create_parser().parse_args(
+                args.generate_args + ['-t', 'v1model'] + extra)
+            program = generate.build(sample_args)[0]
+            config = bmv2.program_json(program)
+            emitted = _timed(lambda: bmv2.program_json(program), args.repeat)
+            line = '{:<40} emitted in {:.4f} s'.format(' '.join(extra) or '(arguments)', emitted)
+            if compiler:
+                source = os.path.join(output, 'program.p4')
+                compiled_file = os.path.join(output, 'program.json')
+                with open(source, 'wt') as file_:
+                    program.render_to(file_)
+                compiled = _timed(lambda: subprocess.run(
+                    [compiler, source, '-o', compiled_file], check=True, cwd=output,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL), args.repeat)
+                with open(compiled_file) as file_:
+                    differences = bmv2.compare(config, json.load(file_))
+                line += ', compiled in {:.4f} s, {}'.format(
+                    compiled, 'conforms' if not differences else 'differs')
+                failed += bool(differences)
+            print(line)
+            if compiler:
+                for difference in differences:
+                    print('    ' + difference)
+    if not compiler:
+        print('{}: not found, conformance not checked (see --p4c-bmv2)'.format(args.p4c_bmv2))
+    return 1 if failed else 0
+
+
+def bench_entries(args, gen_args):
+    """ Time the generation of the table entries (--number-table-entries per
+        table) for every key distribution and insertion order.
+    """
+    tables = generate.build_program(gen_args).get_main_pipeline().tables
+    options = generate.entry_options(gen_args)
+    count = sum(table.size or 0 for table in tables)
+    for distribution in sorted(entries.DISTRIBUTIONS):
+        for order in sorted(entries.ORDERS):
+            options.update(distribution=distribution, order=order)
+            generated = _timed(lambda: entries.generate_tables(tables, **options), args.repeat)
+            print('{:<10} {:<11} {:>10} entries in {:.4f} s ({:.0f} entries/s)'.format(
+                distribution, order, count, generated, count / generated))
+    return 0
+
+
+def _import_times(command):
+    """ Return the self time (us) of each module imported by command, as
+        reported by python -X importtime.
+    """
+    result = subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_time, _, name = line[len('import time:'):].split('|')
+        if self_time.strip().isdigit():
+            times[name.strip()] = int(self_time)
+    return times
+
+
+def _unused_target_packages(gen_args):
+    """ Return the packages of the target plugins a run does not use. """
+    # pylint: disable=protected-access
+    plugins = targets._plugins
+    used = set()
+    for target in gen_args.target:
+        for sub_target in generate._sub_targets(gen_args, target):
+            name = '/'.join([target, sub_target]) if sub_target else target
+            while name in plugins:
+                module, name = plugins[name]
+                used.add(module.rpartition('.')[0])
+    return {module.rpartition('.')[0] for module, _ in plugins.values()} - used
+
+
+# stdlib imports timed alongside a run, import times vary with the machine
+# and its load, their ratio much less
+_REFERENCE_IMPORTS = 'import argparse, email.parser, json, logging, subprocess, tempfile, typing'
+# median ratio measured for generate.py -t v1model on a clean checkout (1.8-1.9),
+# --max-import-ratio leaves headroom for noise
+IMPORT_RATIO = 1.9
+
+
+def bench_importtime(args, gen_args):
+    """ Time the imports of a generate.py run (python -X importtime) and fail
+        if they take more than --max-import-ratio times as long as the
+        reference imports (or above --max-import-time, if given) or if
+        modules the run does not use (other targets, optional dependencies)
+        are imported.
+    """
+    output = tempfile.mkdtemp()
+    command = [sys.executable, '-X', 'importtime', generate.__file__] + args.generate_args
+    if not gen_args.output:
+        command += ['-o', output]
+    reference = [sys.executable, '-X', 'importtime', '-c', _REFERENCE_IMPORTS]
+    best = None
+    ratios = []
+    for _ in range(args.repeat):
+        # paired, both see the same load
+        reference_total = sum(_import_times(reference).values())
+        times = _import_times(command)
+        ratios.append(sum(times.values()) / reference_total)
+        if best is None or sum(times.values()) < sum(best.values()):
+            best = times
+    shutil.rmtree(output)
+
+    total = sum(best.values()) / 1000
+    ratio = statistics.median(ratios)
+    print('modules:  {:>10}'.format(len(best)))
+    print('total:    {:>10.1f} ms{}'.format(total, '' if args.max_import_time is None
+                                            else ' (max {} ms)'.format(args.max_import_time)))
+    print('ratio:    {:>10.2f} x reference (max {}, baseline {})'.format(
+        ratio, args.max_import_ratio, IMPORT_RATIO))
+    for name, self_time in sorted(best.items(), key=lambda item: -item[1])[:10]:
+        print('  {:<40} {:>8.1f} ms'.format(name, self_time / 1000))
+
+    unused = [name for name in best
+              if name == 'ipcalc' or name in _unused_target_packages(gen_args)]
+    if unused:
+        print('unused modules imported: {}'.format(', '.join(sorted(unused))))
+        return 1
+    if ratio > args.max_import_ratio:
+        print('import time regression: {:.2f} x > {} x reference'.format(
+            ratio, args.max_import_ratio))
+        return 1
+    if args.max_import_time is not None and total > args.max_import_time:
+        print('import time regression: {:.1f} ms > {} ms'.format(
+            total, args.max_import_time))
+        return 1
+    return 0
+
+
+# attributes holding the fields and transitions of a node, OrderedDicts
+# before __slots__ were introduced
+_CONTAINERS = ('_fields', '_transitions')
+# per class: a class without __slots__, see _unslotted_size
+_unslotted = {}
+
+
+def _deep_size(obj):
+    """ Return the size of obj including its attribute dict and field or
+        transition container, if any.
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    for name in _CONTAINERS:
+        value = getattr(obj, name, None)
+        if isinstance(value, dict):
+            size += sys.getsizeof(value)
+    return size
+
+
+def _unslotted_size(obj):
+    """ Return the size _deep_size(obj) had before __slots__: attributes in
+        an instance dict, the template configuration stored per instance and
+        OrderedDict containers. Measured on a replica sharing the values.
+    """
+    cls = type(obj)
+    if cls not in _unslotted:
+        _unslotted[cls] = type(cls.__name__, (), {})
+    replica = _unslotted[cls]()
+    containers = 0
+    for name, value in obj._attributes(): # pylint: disable=protected-access
+        if name == '_jinja2':
+            module, templates, delimiter, suffix = value
+            replica._jinja2_suffix = suffix # pylint: disable=protected-access
+            replica._jinja2_module = module # pylint: disable=protected-access
+            replica._jinja2_templates = templates # pylint: disable=protected-access
+            replica.delimiter = delimiter
+            replica.log = logging
+        elif name == '_rendered' and value is None:
+            continue # only set once rendered
+        elif name in ('_modified', '_fragment'):
+            continue # added since, for memoized output and the fragment cache
+        else:
+            if name in _CONTAINERS and isinstance(value, dict):
+                containers += sys.getsizeof(collections.OrderedDict(value))
+            setattr(replica, name, value)
+    return sys.getsizeof(replica) + sys.getsizeof(replica.__dict__) + containers
+
+
+def bench_memory(args, gen_args):
+    """ Report the memory used by the IR of a program, per node and class,
+        and the size of its nodes compared to their layout before __slots__.
+    """
+    # pylint: disable=unused-argument
+    gc.collect()
+    tracemalloc.start()
+    program, controller, utilities = generate.build(gen_args)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    classes = {}
+    for obj in gc.get_objects():
+        if isinstance(obj, templateable.Templateable):
+            entry = classes.setdefault(type(obj).__name__, [0, 0, 0])
+            entry[0] += 1
+            entry[1] += _deep_size(obj)
+            entry[2] += _unslotted_size(obj)
+    nodes = sum(count for count, _, _ in classes.values())
+    size = sum(size for _, size, _ in classes.values())
+    before = sum(before for _, _, before in classes.values())
+    print('nodes:    {:>10}'.format(nodes))
+    print('total:    {:>10} bytes ({:.1f} bytes/node)'.format(allocated, allocated / nodes))
+    print('layout:   {:>10} bytes ({:.1f} bytes/node), before __slots__: {} bytes '
+          '({:.1f} bytes/node, {:.2f}x)'.format(size, size / nodes, before, before / nodes,
+                                                before / size))
+    print('  {:<24} {:>8}   {:>6} {:>6} bytes'.format('class', 'nodes', 'slots', 'before'))
+    for name, (count, size, before) in sorted(classes.items(), key=lambda item: -item[1][0]):
+        print('  {:<24} {:>8} x {:>6.1f} {:>6.1f}'.format(
+            name, count, size / count, before / count))
+    del program, controller, utilities
+
+
+BENCHMARKS = {
+    'bmv2': bench_bmv2,
+    'coldstart': bench_coldstart,
+    'derive': bench_derive,
+    'emitter': bench_emitter,
+    'entries': bench_entries,
+    'headertypes': bench_headertypes,
+    'importtime': bench_importtime,
+    'memory': bench_memory,
+    'render': bench_render,
+    'snapshot': bench_snapshot,
+    'sweep': bench_sweep,
+}
+
+
+def create_parser():
+    """ Argument parser creation wrapper. """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the P4_16 program generator')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS),
+                        help='benchmark to run')
+    parser.add_argument('--repeat', default=3, type=int,
+                        help='number of timed repetitions (best is reported)')
+    parser.add_argument('--variants', default=20, type=int,
+                        help='number of program variants (derive, sweep)')
+    parser.add_argument('--p4c', default='p4test',
+                        help='compiler timed on the output (headertypes)')
+    parser.add_argument('--p4c-bmv2', default='p4c-bm2-ss',
+                        help='compiler of the reference bmv2 JSON (bmv2)')
+    parser.add_argument('--max-import-ratio', default=2.5, type=float,
+                        help='maximum import time relative to the reference imports '
+                        '(importtime)')
+    parser.add_argument('--max-import-time', type=int,
+                        help='maximum total import time in ms, e.g. on a known machine '
+                        '(importtime)')
+    parser.add_argument('generate_args', nargs=argparse.REMAINDER,
+                        help='arguments passed on to generate.py')
+    return parser
+
+
+def main(args=None):
+    """ Wrapper for script content. """
+    parser = create_parser()
+    if not args:
+        args = sys.argv[1:] # drop script name
+    args = parser.parse_args(args)
+    gen_args = generate.create_parser().parse_args(args.generate_args)
+    logging.basicConfig(
+        level=(5 - min(4, gen_args.verbose)) * 10,
+        format=FORMAT)
+    return BENCHMARKS[args.benchmark](args, gen_args) or 0
+
+if __name__ == '__main__':
+    sys.exit(main())
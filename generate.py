@@ -7,12 +7,10 @@ import logging
 import os.path
 import sys
 
-import ipcalc
-
-import p4gen16.header as p4header
-import p4gen16.complexity as p4complexity
-import p4gen16.types.rule
 import p4gen16.types as p4
+from p4gen16 import bmv2, catalog, cost, entries, passes, snapshot
+from p4gen16.types import templateable
+from p4gen16.types.fragments import FragmentCache
 from p4gen16.program import Program
 from p4gen16.controller import Controller
 
@@ -22,9 +20,14 @@ TARGETS = ['v1model',       # p4lang/p4c's simple_switch
            'sume_switch',   # Xilinx P4-SDNet's SimpleSumeSwitch
           ]
 SUB_TARGETS = [
+    'none',         # the target itself
     't4p4s',
 ]
 
+HEADER_TYPES = ['unrolled',
+                'shared',
+                ]
+
 MATCH_TYPES = ['exact',
                'lpm',
                'ternary'
@@ -43,6 +46,29 @@ def _actions(action):
     except KeyError:
         raise argparse.ArgumentTypeError('valid actions: {}'.format(','.join(_actions.keys())))
 
+def _choices(choices):
+    def parse(values):
+        values = list(dict.fromkeys(values.split(','))) # unique, in order
+        if not all(value in choices for value in values):
+            raise argparse.ArgumentTypeError('valid values: {}'.format(','.join(choices)))
+        return values
+    return parse
+
+def _passes(names):
+    if names == 'all':
+        return list(passes.PASSES)
+    names = names.split(',') if names else []
+    unknown = [name for name in names if name not in passes.PASSES]
+    if unknown:
+        raise argparse.ArgumentTypeError('valid passes: all,{}'.format(','.join(passes.PASSES)))
+    return names
+
+def _prefix_lengths(text):
+    try:
+        return entries.parse_prefix_lengths(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected LEN:WEIGHT[,LEN:WEIGHT...]') from None
+
 def create_parser():
     """ Argument parser creation wrapper. """
     parser = argparse.ArgumentParser(
@@ -50,10 +76,16 @@ def create_parser():
         ' a particular feature')
     parser.add_argument('-o', '--output', metavar='DIR',
                         help='output directory for generated files, must exist')
-    parser.add_argument('-t', '--target', choices=TARGETS, required=True,
-                        help='select a target architecture for benchmarking')
-    parser.add_argument('--sub-target', choices=SUB_TARGETS,
-                        help='select a sub-target of an architecture')
+    parser.add_argument('-t', '--target', type=_choices(TARGETS), required=True,
+                        metavar='TARGET[,TARGET...]',
+                        help='select target architectures for benchmarking ({}), '
+                        'several are generated from one build into a directory '
+                        'per target'.format(','.join(TARGETS)))
+    parser.add_argument('--sub-target', type=_choices(SUB_TARGETS), default=[],
+                        metavar='SUB_TARGET[,SUB_TARGET...]',
+                        help='select sub-targets of the architectures ({}), none selects '
+                        'the architecture itself, e.g. none,t4p4s generates both'.format(
+                            ','.join(SUB_TARGETS)))
 
     # Processing options
     parser.add_argument('--number-tables', default=1, type=int,
@@ -62,6 +94,25 @@ def create_parser():
                         help='number of apply for tables')
     parser.add_argument('--number-table-entries', default=0, type=int,
                         help='number of table entries per table')
+    parser.add_argument('--entries', action='store_true',
+                        help='write the table entries (unique keys, prefix lengths, masks and '
+                        'priorities) to entries.npz (requires numpy)')
+    parser.add_argument('--entry-distribution', default='uniform',
+                        choices=sorted(entries.DISTRIBUTIONS),
+                        help='distribution of the entry keys over the key space')
+    parser.add_argument('--entry-order', default='sorted', choices=sorted(entries.ORDERS),
+                        help='insertion order of the entries (worst-case: descending keys, '
+                        'longest prefixes or lowest priorities first)')
+    parser.add_argument('--entry-seed', default=0, type=int,
+                        help='seed of the entry generation')
+    parser.add_argument('--lpm-prefix-lengths', type=_prefix_lengths,
+                        metavar='LEN:WEIGHT[,LEN:WEIGHT...]',
+                        help='histogram of the prefix lengths of lpm entries (default: full '
+                        'length)')
+    parser.add_argument('--ternary-mask-density', default=1.0, type=float,
+                        help='probability of a mask bit of ternary entries being set')
+    parser.add_argument('--ternary-overlap', default=0.0, type=float,
+                        help='fraction of ternary entries covering another entry')
     parser.add_argument('--match-type', choices=MATCH_TYPES, default='exact',
                         help='the used type for matching (exact, lpm,ternary)')
     parser.add_argument('--number-match-keys', default=1, type=int,
@@ -76,6 +127,10 @@ def create_parser():
                         help='number of action data passed to function')
     parser.add_argument('--match-last', action='store_true',
                         help='use match keys beginning with last parsed fields')
+    parser.add_argument('--key-strategy', choices=sorted(catalog.STRATEGIES),
+                        help='selection of match keys (default: first, last with --match-last)')
+    parser.add_argument('--key-seed', default=0, type=int,
+                        help='seed of the random key selection')
 
     # Parser (Field|Header) and Packet Modification options
     parser.add_argument('--header-stack-height', default=1, type=int,
@@ -100,6 +155,12 @@ def create_parser():
                         help='add extra headers in deparser of x bytes')
     parser.add_argument('--deparser-remove-headers', type=int, default=0,
                         help='remove headers in deparser')
+    parser.add_argument('--header-types', choices=HEADER_TYPES, default='unrolled',
+                        help='declare a header type per header (unrolled) or one per '
+                        'field layout (shared)')
+    parser.add_argument('--lazy-parser-tree', action='store_true',
+                        help='create parser tree headers and states while rendering, keeps '
+                        'memory low for large branching factors and stack heights')
 
     # general options
     parser.add_argument('--skip-ethernet', action='store_true',
@@ -112,27 +173,60 @@ def create_parser():
                         help='default value of the set_egress_spec action')
     parser.add_argument('--skip-filling-tables', action='store_true',
                         help='do not create any table filling rules')
+    parser.add_argument('--shard-commands', action='store_true',
+                        help='write the simple_switch_CLI commands of plain v1model programs '
+                        'to one commands_TABLE.txt per table instead of commands.txt')
+    parser.add_argument('--emitter', choices=templateable.EMITTERS, default='jinja2',
+                        help='backend rendering high-volume leaf types (header/struct fields, '
+                        'statements, table keys, parameters)')
+    parser.add_argument('-j', '--jobs', default=1, type=int,
+                        help='number of processes rendering tables, actions and parser '
+                        'states (0: one per CPU)')
+    parser.add_argument('--render-stats', metavar='FILE',
+                        help='write render count, time and output size per template and '
+                        'class as JSON to FILE (renders in --jobs workers are not included)')
+    parser.add_argument('--fragment-cache', metavar='DIR',
+                        help='reuse the rendered structs, parser and controls of earlier runs '
+                        'built with the same options (e.g. of a parameter sweep) kept in DIR')
+    parser.add_argument('--passes', default=[], type=_passes, metavar='PASS[,PASS...]',
+                        help='optimization passes stripping components unrelated to the '
+                        'measured feature (all,{}), their report is written to '
+                        'passes.json'.format(','.join(passes.PASSES)))
+    parser.add_argument('--cost-report', action='store_true',
+                        help='write the static per-packet cost model of the program as JSON '
+                        'to cost.json (computed without rendering)')
+    parser.add_argument('--bmv2-json', action='store_true',
+                        help='write the simple_switch configuration of v1model programs to '
+                        'program.json, emitted from the IR without p4c')
+    parser.add_argument('--save-snapshot', metavar='FILE',
+                        help='write a snapshot of the generated program, controller and '
+                        'utilities to FILE')
+    parser.add_argument('--load-snapshot', metavar='FILE',
+                        help='render the program, controller and utilities of the snapshot '
+                        'FILE instead of generating them (generator options are ignored)')
     # Logging level, inspired by https://stackoverflow.com/a/34065768
     parser.add_argument('-v', '--verbose', action='count', default=0,
                         help='increase the logging level with each call')
     return parser
 
 
-def main(args=None):
-    """ Wrapper for script content. """
-    # pylint: disable=too-many-branches, too-many-locals, too-many-nested-blocks, too-many-statements
-    parser = create_parser()
-    if not args:
-        args = sys.argv[1:] # drop script name
-    args = parser.parse_args(args)
-    logging.basicConfig(
-        # see logging documentation "16.6.2 Logging Levels"
-        level=(5 - min(4, args.verbose)) * 10,
-        format=FORMAT)
-    logging.info('successfully parsed command line arguments')
+def _sub_targets(args, target):
+    """ Return the sub-targets of target selected by args (None: target only). """
+    selected = [None if sub_target == 'none' else sub_target for sub_target in args.sub_target
+                if sub_target == 'none'
+                or p4.targets.is_registered('/'.join([target, sub_target]))]
+    return selected or [None]
+
 
-    # build program
-    program = Program(target=args.target,
+def _fill_tables(args, sub_target):
+    return sub_target == 't4p4s' and (args.number_table_entries or args.skip_filling_tables)
+
+
+def build_program(args, target=None):
+    """ Build the program for target (the first selected one by default) from
+        parsed arguments.
+    """
+    program = Program(target=target or args.target[0],
                       skip_ethernet=args.skip_ethernet,
                       skip_ip=args.skip_ip,
                       add_uninteresting=args.add_uninteresting_header)
@@ -144,15 +238,22 @@ def main(args=None):
                              deparser_remove_headers=args.deparser_remove_headers,
                              deparser_field_count=args.deparser_add_headers_size,
                              meta_field_modifies=args.meta_field_modifies,
+                             lazy=args.lazy_parser_tree,
+                             shared_types=args.header_types == 'shared',
                              )
     program.generate_parser_tree(stack_height=args.header_stack_height,
-                                 branching_factor=args.parser_branching_factor)
+                                 branching_factor=args.parser_branching_factor,
+                                 field_count=args.header_fields,
+                                 field_size=args.header_field_size,
+                                 lazy=args.lazy_parser_tree)
     program.generate_controls(egress_port=args.default_egress_spec,
                               number_tables=args.number_tables,
                               repeat_apply_tables=args.repeat_apply_tables,
                               number_table_entries=args.number_table_entries,
                               match_type=args.match_type,
                               match_last=args.match_last,
+                              key_strategy=args.key_strategy,
+                              key_seed=args.key_seed,
                               number_match_keys=args.number_match_keys,
                               match_key_size=args.match_key_size,
                               action=args.action,
@@ -161,47 +262,259 @@ def main(args=None):
                               header_field_modifies=args.header_field_modifies,
                               meta_field_modifies=args.meta_field_modifies)
     program.generate_deparser(emit=not args.no_emit)
+    return program
+
 
-    logging.debug('Generating controller')
-    controller = Controller(program, args.sub_target,
-			    skip_filling_tables=args.skip_filling_tables,
-                            egress_port=args.default_egress_spec)
+def _entry_actions(args, program, sub_target):
+    """ Return the names of the actions the table entries of program for
+        sub_target use, None if unknown.
+    """
+    if sub_target == 't4p4s':
+        return [args.action[0]] if _fill_tables(args, sub_target) else []
+    if sub_target is None and p4.targets.get(program.target, 'rules') is not None:
+        # the simple_switch_CLI commands of build_outputs
+        filled = args.number_table_entries and not args.skip_filling_tables
+        return [args.action[0]] if filled else []
+    return None
 
+
+def optimize(args, program, sub_targets=(None,)):
+    """ Run the selected optimization passes on program, emitted for
+        sub_targets_. Returns their report.
+    """
+    # actions of the control planes of all sub-targets are kept
+    entry_actions = []
+    for sub_target in sub_targets:
+        actions = _entry_actions(args, program, sub_target)
+        if actions is None:
+            entry_actions = None
+            break
+        entry_actions.extend(actions)
+    return passes.run(program, args.passes, entry_actions=entry_actions)
+
+
+def build_outputs(args, program, sub_target=None):
+    """ Build controller and target utilities of program for sub_target. """
     # some targets have extra utilities
     utilities = {}
-    if args.sub_target == 't4p4s' and args.number_table_entries or args.skip_filling_tables:
-        from p4gen16.types.v1model.t4p4s.controlplane import ControlPlane
-        utilities['controlplane.c.py'] = ControlPlane(
-            program, args.sub_target, egress_port=args.default_egress_spec, action=args.action)
+    rules = p4.targets.get(program.target, 'rules') if sub_target is None else None
+    if rules is None:
+        logging.debug('Generating controller')
+        controller = Controller(program, sub_target,
+                                skip_filling_tables=args.skip_filling_tables,
+                                egress_port=args.default_egress_spec)
+    else:
+        # simple_switch_CLI commands replace the controller
+        logging.debug('Generating table commands')
+        controller = None
+        options = {
+            'action': args.action[0],
+            'egress_port': args.default_egress_spec,
+            'entry_options': entry_options(args) if args.entries else None,
+            'skip_filling_tables': args.skip_filling_tables,
+        }
+        tables = program.get_main_pipeline().tables
+        if args.shard_commands:
+            for i, table in enumerate(tables):
+                if args.entries:
+                    # the seeds of entries.generate_tables()
+                    options['entry_options'] = dict(entry_options(args),
+                                                    seed=args.entry_seed + i)
+                utilities['commands_{}.txt'.format(table.name)] = rules(
+                    program, tables=[table], **options)
+        else:
+            utilities['commands.txt'] = rules(program, tables=tables, **options)
+    if _fill_tables(args, sub_target):
+        control_plane = p4.targets.lookup('v1model/t4p4s', 'controlplane')
+        utilities['controlplane.c.py'] = control_plane(
+            program, sub_target, egress_port=args.default_egress_spec, action=args.action)
+    return controller, utilities
+
+
+def build(args, report=None):
+    """ Build program, controller and target utilities of the first selected
+        target and sub-target from parsed arguments. The report of the
+        optimization passes is stored in the dict report, if given.
+    """
+    program = build_program(args)
+    sub_target = _sub_targets(args, program.target)[0]
+    if args.passes:
+        pass_report = optimize(args, program, [sub_target])
+        if report is not None:
+            report.update(pass_report)
+    return (program,) + build_outputs(args, program, sub_target)
+
 
+def build_targets(args, failed=None):
+    """ Build program, controller and target utilities of every selected
+        target and sub-target from one build of the target independent IR.
+        Returns a list of (name, program, controller, utilities, pass report).
+        If the list failed is given, a target failing to build with a
+        ValueError is appended to it as (target, error) and the other
+        targets are still built, otherwise the error is raised.
+    """
+    base = None
+    built = []
+    for target in args.target:
+        try:
+            if base is None:
+                base = program = build_program(args, target)
+                if args.passes:
+                    # passes must not modify the base of the other targets
+                    program = base.clone()
+            else:
+                program = base.retarget(target)
+            selected = _sub_targets(args, target)
+            pass_report = optimize(args, program, selected) if args.passes else None
+            units = []
+            for sub_target in selected:
+                name = '_'.join([target, sub_target]) if sub_target else target
+                units.append((name, program) + build_outputs(args, program, sub_target)
+                             + (pass_report,))
+        except ValueError as error:
+            if failed is None:
+                raise
+            failed.append((target, error))
+        else:
+            built.extend(units)
+    return built
+
+
+def entry_options(args):
+    """ Return the options of entries.generate() selected by args. """
+    return {
+        'distribution': args.entry_distribution,
+        'order': args.entry_order,
+        'seed': args.entry_seed,
+        'prefix_lengths': args.lpm_prefix_lengths,
+        'mask_density': args.ternary_mask_density,
+        'overlap': args.ternary_overlap,
+    }
 
-    logging.debug('Generated program:\n%s', program)
-    logging.debug('Generated controller:\n%s', controller)
-    for name, content in utilities.items():
-        logging.debug('Generated %s:\n%s', name, content)
 
+def write(args, program, controller, utilities, pass_report, output):
+    """ Write the rendered program, controller, utilities and the selected
+        reports to the directory output. Returns the names of the requested
+        files that could not be created.
+    """
+    unwritten = []
+    if output != args.output and not os.path.isdir(output):
+        os.mkdir(output)
+    files = [
+        (program, 'program.p4'),
+        (controller, 'controller'),
+    ]
+    files.extend((content, name) for name, content in utilities.items())
+
+    if pass_report is not None:
+        with open(os.path.join(output, 'passes.json'), 'wt') as file_:
+            passes.dump(pass_report, file_)
+    if args.cost_report:
+        with open(os.path.join(output, 'cost.json'), 'wt') as file_:
+            cost.dump(program, file_)
+    if args.bmv2_json:
+        try:
+            config = bmv2.program_json(program)
+        except ValueError as error:
+            logging.critical('No bmv2 JSON written: %s', error)
+            unwritten.append('program.json')
+        else:
+            with open(os.path.join(output, 'program.json'), 'wt') as file_:
+                bmv2.dump(config, file_)
+    if args.entries:
+        try:
+            entry_sets = entries.generate_tables(program.get_main_pipeline().tables,
+                                                 **entry_options(args))
+        except (ValueError, ModuleNotFoundError) as error:
+            logging.critical('No table entries written: %s', error)
+            unwritten.append('entries.npz')
+        else:
+            with open(os.path.join(output, 'entries.npz'), 'wb') as file_:
+                entries.dump(entry_sets, file_)
+    for content, name in files:
+        if not content:
+            continue
+        # nodes shared by the programs of several targets are rendered for
+        # the program's target, controllers and utilities for their own
+        templateable.set_render_target(program.target if content is program else None)
+        with open(os.path.join(output, name), 'wt+') as file_:
+            content.render_to(file_)
+    templateable.set_render_target(None)
+    return unwritten
+
+
+def main(args=None):
+    """ Wrapper for script content. """
+    # pylint: disable=too-many-branches, too-many-locals, too-many-nested-blocks, too-many-statements
+    parser = create_parser()
+    if not args:
+        args = sys.argv[1:] # drop script name
+    args = parser.parse_args(args)
+    logging.basicConfig(
+        # see logging documentation "16.6.2 Logging Levels"
+        level=(5 - min(4, args.verbose)) * 10,
+        format=FORMAT)
+    logging.info('successfully parsed command line arguments')
+    templateable.set_emitter(args.emitter)
+    templateable.set_jobs(args.jobs)
+    if args.render_stats:
+        templateable.enable_stats()
+    if args.fragment_cache:
+        templateable.set_fragment_cache(FragmentCache(args.fragment_cache))
+
+    # targets failing to build, the others are still written
+    failed = []
+    if args.load_snapshot:
+        with open(args.load_snapshot, 'rb') as file_:
+            built = snapshot.load(file_)
+        if isinstance(built, tuple): # a single target
+            built = [('',) + built + (None,)]
+    else:
+        try:
+            built = build_targets(args, failed)
+        except ModuleNotFoundError as error:
+            logging.fatal(error)
+            return 1
+        for _, error in failed:
+            logging.fatal(error)
+        if not built:
+            return 1
+    if args.save_snapshot:
+        with open(args.save_snapshot, 'wb') as file_:
+            if len(built) == 1:
+                snapshot.dump(built[0][1:4], file_)
+            else:
+                snapshot.dump([unit[:4] + (None,) for unit in built], file_)
+
+    for name, program, controller, utilities, _ in built:
+        logging.debug('Generated program %s:\n%s', name, program)
+        logging.debug('Generated controller %s:\n%s', name, controller)
+        for file_name, content in utilities.items():
+            logging.debug('Generated %s %s:\n%s', name, file_name, content)
+
+    # requested files that could not be created
+    unwritten = []
     if args.output:
         try:
-            # write content to file, if condition is true
-            files = [
-                # use lambda to delay evaluation (if tuple[0] is None)
-                (program, lambda: os.path.join(args.output, 'program.p4')),
-                (controller, lambda: os.path.join(args.output, 'controller')),
-            ]
-            for name, content in utilities.items():
-                files.append((content, lambda: os.path.join(args.output, name)))
-
-            for content, file_name in files:
-                if not content:
-                    continue
-                with open(file_name(), 'wt+') as file_:
-                    file_.write(str(content))
+            for name, program, controller, utilities, pass_report in built:
+                output = (os.path.join(args.output, name) if len(built) + len(failed) > 1
+                          else args.output)
+                unwritten.extend(os.path.join(output, file_name) for file_name in write(
+                    args, program, controller, utilities, pass_report, output))
         except FileNotFoundError:
             logging.fatal('Please ensure that the output directory is present.')
             return 1
     else:
         logging.warning('No output directory given.')
-    return 0
+
+    if args.render_stats:
+        with open(args.render_stats, 'wt') as file_:
+            templateable.disable_stats().dump(file_)
+    if failed:
+        logging.fatal('Failed to build target(s) %s', ', '.join(target for target, _ in failed))
+    if unwritten:
+        logging.fatal('Failed to write %s', ', '.join(unwritten))
+    return 1 if failed or unwritten else 0
 
 if __name__ == '__main__':
     sys.exit(main())
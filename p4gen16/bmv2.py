@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+'''
+Direct bmv2 JSON backend: emits the simple_switch configuration of a
+generated v1model program straight from the IR, without p4c, and compares
+bmv2 JSON configurations by behavior (parse graph, pipeline steps, tables
+and deparser) to check it against p4c-compiled ones.
+'''
+import json
+import re
+
+from .types.control import ControlFlow
+from .types.statement import ApplyTable, ModifyHeader, ModifyMeta, SetHeaderValid
+
+# version of the bmv2 JSON format emitted
+VERSION = [2, 23]
+
+_BITS = re.compile(r'bit<(\d+)>')
+# integer literals as generated: 255, 0xff, 8w1
+_LITERAL = re.compile(r'(?:(\d+)w)?(0x[0-9a-fA-F]+|0b[01]+|\d+)')
+_ASSIGN = re.compile(r'([\w.]+)\s*=\s*([\w.]+)')
+_CALL = re.compile(r'(\w+)\(\)')
+
+STANDARD_METADATA = [
+    ('ingress_port', 9), ('egress_spec', 9), ('egress_port', 9), ('instance_type', 32),
+    ('packet_length', 32), ('enq_timestamp', 32), ('enq_qdepth', 19),
+    ('deq_timedelta', 32), ('deq_qdepth', 19), ('ingress_global_timestamp', 48),
+    ('egress_global_timestamp', 48), ('mcast_grp', 16), ('egress_rid', 16),
+    ('checksum_error', 1), ('parser_error', 32), ('priority', 3),
+]
+
+ERRORS = ['NoError', 'PacketTooShort', 'NoMatch', 'StackOutOfBounds', 'HeaderTooShort',
+          'ParserTimeout', 'ParserInvalidArgument']
+
+# v1model names of standard_metadata fields, as emitted by p4c
+FIELD_ALIASES = [
+    ('queueing_metadata.' + name, name)
+    for name in ('enq_timestamp', 'enq_qdepth', 'deq_timedelta', 'deq_qdepth')
+] + [
+    ('intrinsic_metadata.' + name, name)
+    for name in ('ingress_global_timestamp', 'egress_global_timestamp', 'mcast_grp',
+                 'egress_rid', 'priority')
+]
+
+def _hexstr(value, bits=0):
+    return '0x{:0{}x}'.format(value, 2 * ((bits + 7) // 8) or 1)
+
+def _literal(text):
+    ''' Return (value, bits) of an integer literal, bits is 0 if unsized;
+        None if text is no literal.
+    '''
+    match = _LITERAL.fullmatch(text)
+    if not match:
+        return None
+    return int(match.group(2), 0), int(match.group(1) or 0)
+
+def _fields(fields):
+    ''' Return bmv2 header type fields of (name, bits), padded to bytes. '''
+    fields = [[name, bits, False] for name, bits in fields]
+    padding = -sum(bits for _, bits, _ in fields) % 8
+    if padding:
+        fields.append(['_padding', padding, False])
+    return fields
+
+class _Converter():
+    ''' Converts the IR of one program, holding the ids handed out. '''
+    def __init__(self, program):
+        self.program = program
+        self.actions = []
+        self._action_ids = {}
+        self._headers = {}
+        self._runs = 0
+
+    def field(self, name):
+        ''' Return the bmv2 field of a P4 field reference (e.g. h.h000.f000). '''
+        parts = name.split('.')
+        if parts[0] == 'h' and len(parts) == 3:
+            return {'type': 'field', 'value': parts[1:]}
+        if parts[0] in ('meta', 'standard_metadata') and len(parts) == 2:
+            return {'type': 'field', 'value': parts}
+        raise ValueError('unsupported field reference {!r} for bmv2'.format(name))
+
+    def expression(self, text, parameters):
+        ''' Return the bmv2 parameter of a statement's right hand side. '''
+        literal = _literal(text)
+        if literal:
+            return {'type': 'hexstr', 'value': _hexstr(*literal)}
+        if text in parameters:
+            return {'type': 'runtime_data', 'value': parameters.index(text)}
+        return self.field(text)
+
+    def primitives(self, statement, parameters=(), calls=None):
+        ''' Return the primitives of a statement; parameters are the names
+            of the enclosing action's parameters, calls maps the names of the
+            actions it may call to their statements.
+        '''
+        if isinstance(statement, SetHeaderValid):
+            return [{'op': 'add_header',
+                     'parameters': [{'type': 'header', 'value': statement.header.name}]}]
+        if isinstance(statement, ModifyHeader):
+            target = {'type': 'field', 'value': [statement.field.parent.name, statement.field.name]}
+        elif isinstance(statement, ModifyMeta):
+            target = {'type': 'field', 'value': [statement.field.parent, statement.field.name]}
+        else:
+            target = None
+        text = statement.statement
+        match = _ASSIGN.fullmatch(text)
+        if match:
+            return [{'op': 'assign', 'parameters': [
+                target or self.field(match.group(1)),
+                self.expression(match.group(2), parameters)]}]
+        match = _CALL.fullmatch(text)
+        if match and match.group(1) == 'mark_to_drop':
+            return [{'op': 'mark_to_drop',
+                     'parameters': [{'type': 'header', 'value': 'standard_metadata'}]}]
+        if match and calls and match.group(1) in calls:
+            # direct action call, inlined
+            return [primitive for called in calls[match.group(1)]
+                    for primitive in self.primitives(called)]
+        raise ValueError('unsupported statement {!r} for bmv2'.format(text))
+
+    def action(self, action):
+        ''' Return the id of action, converting it on first use. '''
+        if action.name in self._action_ids:
+            return self._action_ids[action.name]
+        parameters = [parameter.name for parameter in action.parameter]
+        self._action_ids[action.name] = len(self.actions)
+        self.actions.append({
+            'name': action.name,
+            'id': len(self.actions),
+            'runtime_data': [
+                {'name': parameter.name, 'bitwidth': parameter.size or int(
+                    _BITS.fullmatch(parameter.type).group(1))}
+                for parameter in action.parameter],
+            'primitives': [primitive for statement in action.statements
+                           for primitive in self.primitives(statement, parameters)],
+        })
+        return self._action_ids[action.name]
+
+    def statements(self, name, statements, calls):
+        ''' Return a table running statements once per packet (like the
+            tbl_act tables of p4c), with a constant default action name.
+        '''
+        action_id = len(self.actions)
+        self._action_ids[name] = action_id
+        self.actions.append({
+            'name': name,
+            'id': action_id,
+            'runtime_data': [],
+            'primitives': [primitive for statement in statements
+                           for primitive in self.primitives(statement, calls=calls)],
+        })
+        return {
+            'name': 'tbl_' + name,
+            'key': [],
+            'match_type': 'exact',
+            'max_size': 1024,
+            'action_ids': [action_id],
+            'actions': [name],
+            'default_entry': {'action_id': action_id, 'action_const': True,
+                              'action_data': [], 'action_entry_const': True},
+        }
+
+    def table(self, table):
+        ''' Return the bmv2 table of table (without id and next tables). '''
+        kinds = {key.match_kind for key in table.keys}
+        unsupported = kinds - {'exact', 'lpm', 'ternary'}
+        if unsupported:
+            raise ValueError('table {}: unsupported match kinds {} for bmv2'.format(
+                table.name, ', '.join(sorted(unsupported))))
+        if sum(key.match_kind == 'lpm' for key in table.keys) > 1:
+            raise ValueError('table {}: more than one lpm key'.format(table.name))
+        actions = sorted(table.actions, key=lambda action: action.name)
+        default = table.default_action
+        return {
+            'name': table.name,
+            'key': [{'match_type': key.match_kind,
+                     'name': 'h.{}.{}'.format(key.header.name, key.field.name),
+                     'target': [key.header.name, key.field.name],
+                     'mask': None}
+                    for key in table.keys],
+            'match_type': ('ternary' if 'ternary' in kinds else
+                           'lpm' if 'lpm' in kinds else 'exact'),
+            # like P4 tables without size, 0 means the default size
+            'max_size': table.size or 1024,
+            'action_ids': [self.action(action) for action in actions],
+            'actions': [action.name for action in actions],
+            'default_entry': {
+                'action_id': self.action(default), 'action_const': False,
+                'action_data': [], 'action_entry_const': False,
+            } if default else None,
+        }
+
+    def pipeline(self, block, id_):
+        ''' Return the bmv2 pipeline of a control block: its sequence as
+            chain of tables, runs of other statements in keyless tables.
+        '''
+        calls = {action.name: action.statements for action in block.actions}
+        tables = []
+        applied = set()
+        run = []
+        for statement in list(block.sequence) + [None]:
+            if statement is not None and not isinstance(statement, ApplyTable):
+                run.append(statement)
+                continue
+            if run:
+                tables.append(self.statements('act_{}'.format(self._runs), run, calls))
+                self._runs += 1
+                run = []
+            if statement is None:
+                break
+            if statement.table.name in applied:
+                # a bmv2 table has one successor, like p4c reject these
+                raise ValueError('table {} is applied more than once'.format(
+                    statement.table.name))
+            applied.add(statement.table.name)
+            tables.append(self.table(statement.table))
+        for i, table in enumerate(tables):
+            next_ = tables[i + 1]['name'] if i + 1 < len(tables) else None
+            table.update({
+                'id': i,
+                'type': 'simple',
+                'with_counters': False,
+                'support_timeout': False,
+                'direct_meters': None,
+                'base_default_next': next_,
+                'next_tables': {action: next_ for action in table['actions']},
+            })
+            if table['default_entry'] is None:
+                del table['default_entry']
+        return {
+            'name': block.name,
+            'id': id_,
+            'init_table': tables[0]['name'] if tables else None,
+            'tables': tables,
+            'action_profiles': [],
+            'conditionals': [],
+        }
+
+    def parse_state(self, state, id_):
+        ''' Return the bmv2 parse state of state. '''
+        extracted = list(state.extract_extra) + [state.header] + list(state.extract_extra_after)
+        transitions = []
+        bits = {field.name: field.bits for field in self._headers[state.header].fields}
+        for transition in ([] if state.is_end else state.transitions):
+            next_ = None if transition.next in ('accept', 'reject') else transition.next
+            if transition.expr == 'default':
+                transitions.append({'type': 'default', 'value': None, 'mask': None,
+                                    'next_state': next_})
+                continue
+            literal = _literal(transition.expr)
+            if literal is None:
+                raise ValueError('state {}: unsupported select expression {!r}'.format(
+                    state.name, transition.expr))
+            value, width = literal
+            transitions.append({'type': 'hexstr',
+                                'value': _hexstr(value, width or bits[state.field]),
+                                'mask': None, 'next_state': next_})
+        if state.is_end:
+            transitions.append({'type': 'default', 'value': None, 'mask': None,
+                                'next_state': None})
+        return {
+            'name': state.name,
+            'id': id_,
+            'parser_ops': [{'op': 'extract', 'parameters': [{'type': 'regular', 'value': name}]}
+                           for name in extracted],
+            'transition_key': [] if state.is_end else [
+                {'type': 'field', 'value': [state.header, state.field]}],
+            'transitions': transitions,
+        }
+
+    def convert(self):
+        ''' Return the bmv2 JSON configuration (as dict). '''
+        program = self.program
+        if program.target != 'v1model':
+            raise ValueError('bmv2 JSON is emitted for v1model programs only, not {}'.format(
+                program.target))
+        for block in program.controls.declarations().values():
+            if getattr(block, 'enable', False):
+                raise ValueError('checksum control {} is not supported for bmv2'.format(
+                    block.name))
+        self._headers = {header.name: header for header in program.headers}
+
+        header_types = [
+            {'name': 'standard_metadata', 'fields': _fields(STANDARD_METADATA)},
+            {'name': 'metadata', 'fields': _fields(
+                (field.name, int(_BITS.fullmatch(field.type).group(1)))
+                for field in program.struct_metadata().get_fields())},
+        ]
+        headers = [
+            {'name': 'standard_metadata', 'header_type': 'standard_metadata', 'metadata': True},
+            {'name': 'meta', 'header_type': 'metadata', 'metadata': True},
+        ]
+        types = set()
+        for header in self._headers.values():
+            if header.type not in types:
+                types.add(header.type)
+                header_types.append({'name': header.type, 'fields': [
+                    [field.name, field.bits, False] for field in header.fields]})
+            headers.append({'name': header.name, 'header_type': header.type, 'metadata': False})
+        for i, header_type in enumerate(header_types):
+            header_type['id'] = i
+        for i, header in enumerate(headers):
+            header['id'] = i
+            header['pi_omit'] = True
+
+        pipelines = [self.pipeline(block, i) for i, block in enumerate(
+            block for name, block in program.controls.declarations().items()
+            if isinstance(block, ControlFlow) and name in ('ingress', 'egress'))]
+        return {
+            'header_types': header_types,
+            'headers': headers,
+            'header_stacks': [],
+            'header_union_types': [],
+            'header_unions': [],
+            'header_union_stacks': [],
+            'field_lists': [],
+            'errors': [[name, i] for i, name in enumerate(ERRORS)],
+            'enums': [],
+            'parsers': [{
+                'name': 'parser',
+                'id': 0,
+                'init_state': 'start',
+                'parse_states': [self.parse_state(state, i)
+                                 for i, state in enumerate(program.parser.states)],
+            }],
+            'parse_vsets': [],
+            'deparsers': [{
+                'name': 'deparser',
+                'id': 0,
+                'order': [name.split('.', 1)[-1] for name in program.controls.deparse.header],
+                'primitives': [],
+            }],
+            'meter_arrays': [],
+            'counter_arrays': [],
+            'register_arrays': [],
+            'calculations': [],
+            'learn_lists': [],
+            'actions': self.actions,
+            'pipelines': pipelines,
+            'checksums': [],
+            'force_arith': [],
+            'extern_instances': [],
+            'field_aliases': [[alias, ['standard_metadata', name]]
+                              for alias, name in FIELD_ALIASES],
+            'program': 'program.p4',
+            '__meta__': {'version': VERSION, 'compiler': 'p4gen16'},
+        }
+
+def program_json(program):
+    ''' Return the bmv2 JSON configuration of a v1model program as dict. '''
+    return _Converter(program).convert()
+
+def dump(config, file_):
+    ''' Write a configuration of program_json() to a file-like object. '''
+    json.dump(config, file_, indent=2)
+    file_.write('\n')
+
+def _short(name):
+    ''' Strip the control prefix p4c adds to table and action names. '''
+    return name.rsplit('.', 1)[-1]
+
+def behavior(config):
+    ''' Return a normalized description of what a bmv2 JSON configuration
+        does to a packet, independent of names and grouping chosen by the
+        compiler: parse graph, pipelines as steps (table applies and the
+        primitives run by keyless tables), tables and deparser order.
+    '''
+    metadata = {header['name'] for header in config['headers']
+                if header['metadata'] and header['name'] != 'standard_metadata'}
+
+    def parameter(value):
+        if value['type'] == 'field':
+            header, field = value['value']
+            if header in metadata:
+                # p4c places user metadata in scalars (userMetadata.<field>)
+                return ('field', 'meta', _short(field))
+            return ('field', header, field)
+        if value['type'] == 'hexstr':
+            return ('hexstr', int(value['value'], 16))
+        return (value['type'], value['value'])
+
+    def primitives(action):
+        return [(primitive['op'],) + tuple(parameter(value) for value in primitive['parameters'])
+                for primitive in action['primitives']]
+
+    actions = {action['id']: action for action in config['actions']}
+    parser = config['parsers'][0]
+    states = {
+        state['name']: {
+            'extract': [op['parameters'][0]['value'] for op in state['parser_ops']
+                        if op['op'] == 'extract'],
+            'key': [parameter(key) for key in state['transition_key']],
+            'transitions': sorted(
+                (-1 if transition['value'] is None else int(transition['value'], 16),
+                 transition['next_state'] or '')
+                for transition in state['transitions']),
+        }
+        for state in parser['parse_states']}
+
+    steps = {}
+    tables = {}
+    for pipeline in config['pipelines']:
+        by_name = {table['name']: table for table in pipeline['tables']}
+        steps[pipeline['name']] = sequence = []
+        name, seen = pipeline['init_table'], set()
+        while name and name not in seen:
+            seen.add(name)
+            if name not in by_name:
+                sequence.append(('conditional', name))
+                break
+            table = by_name[name]
+            if table['key']:
+                sequence.append(('apply', _short(name)))
+                tables[_short(name)] = {
+                    'match_type': table['match_type'],
+                    'key': [(key['match_type'], parameter({'type': 'field', 'value': key['target']}))
+                            for key in table['key']],
+                    'max_size': table['max_size'],
+                    'actions': sorted(
+                        (_short(actions[id_]['name']),
+                         [data['bitwidth'] for data in actions[id_]['runtime_data']],
+                         primitives(actions[id_]))
+                        for id_ in table['action_ids']
+                        if _short(actions[id_]['name']) != 'NoAction'),
+                    'default': _short(actions[table['default_entry']['action_id']]['name'])
+                               if 'default_entry' in table else None,
+                }
+            elif 'default_entry' in table:
+                sequence.extend(primitives(actions[table['default_entry']['action_id']]))
+            name = table['base_default_next']
+    return {
+        'parser': {'init': parser['init_state'], 'states': states},
+        'pipelines': steps,
+        'tables': tables,
+        'deparser': config['deparsers'][0]['order'],
+    }
+
+def compare(config, reference):
+    ''' Compare two bmv2 JSON configurations by behavior (see behavior()).
+        Return the differences as list of strings, empty if they conform.
+    '''
+    differences = []
+    def diff(path, this, other):
+        if isinstance(this, dict) and isinstance(other, dict):
+            for key in sorted(set(this) | set(other), key=str):
+                if key not in this or key not in other:
+                    differences.append('{}.{}: only in {}'.format(
+                        path, key, 'reference' if key in other else 'configuration'))
+                else:
+                    diff('{}.{}'.format(path, key), this[key], other[key])
+        elif this != other:
+            differences.append('{}: {!r} != {!r}'.format(path, this, other))
+    diff('', behavior(config), behavior(reference))
+    return [difference.lstrip('.') for difference in differences]
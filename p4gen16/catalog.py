@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+'''
+Catalog of the header fields of a program, indexed by bit width and by
+header, and the strategies selecting match keys from it.
+'''
+import functools
+import itertools
+import random
+
+from .types.header import Header, HeaderFieldView
+from .types.lazy import Concat, LazySequence
+
+class FieldCatalog():
+    ''' The fields of headers, built once and indexed by bit width and by
+        header. headers may contain LazySequences of headers which are not
+        materialized; all headers of such a sequence have the same fields
+        (like the generic headers of a parser tree).
+    '''
+    __slots__ = ('_runs',)
+    def __init__(self, headers):
+        # bits -> [(headers, field specs)], every header of a run has the specs
+        self._runs = {}
+        for header in headers:
+            if isinstance(header, LazySequence):
+                if not header:
+                    continue
+                run, fields = header, header[0].fields
+            elif isinstance(header, Header):
+                run, fields = (header,), header.fields
+            else:
+                raise TypeError('{that} is not an instance of Header or LazySequence'.format(
+                    that=header.__class__.__name__))
+            by_width = {}
+            for field in fields:
+                by_width.setdefault(field.bits, []).append(field)
+            for bits, specs in by_width.items():
+                self._runs.setdefault(bits, []).append((run, tuple(specs)))
+
+    def widths(self):
+        ''' Return the field widths (bits) of the catalog. '''
+        return self._runs.keys()
+
+    def count(self, bits):
+        ''' Return the number of fields of bits width. '''
+        return sum(len(run) * len(specs) for run, specs in self._runs.get(bits, ()))
+
+    def fields(self, bits):
+        ''' Return all fields of bits width as a sequence of HeaderFieldViews,
+            in header order.
+        '''
+        sequences = []
+        for run, specs in self._runs.get(bits, ()):
+            if isinstance(run, LazySequence):
+                sequences.append(LazySequence(
+                    len(run) * len(specs), functools.partial(_run_field, run, specs),
+                    ('fields', bits, run.key)))
+            else:
+                sequences.append([HeaderFieldView(header, spec)
+                                  for header in run for spec in specs])
+        return Concat(*sequences)
+
+    def headers(self, bits):
+        ''' Yield (header, field specs) of all headers having fields of bits
+            width, in header order.
+        '''
+        for run, specs in self._runs.get(bits, ()):
+            for header in run:
+                yield header, specs
+
+def _run_field(run, specs, i):
+    ''' Return field i of a run of headers as HeaderFieldView. '''
+    header, index = divmod(i, len(specs))
+    return HeaderFieldView(run[header], specs[index])
+
+def select_first(catalog, bits, count, rng):
+    ''' The first count fields. '''
+    # pylint: disable=unused-argument
+    return catalog.fields(bits)[:count]
+
+def select_last(catalog, bits, count, rng):
+    ''' The last count fields. '''
+    # pylint: disable=unused-argument
+    fields = catalog.fields(bits)
+    return fields[len(fields) - count:]
+
+def select_spread(catalog, bits, count, rng):
+    ''' count fields spread across headers: the first field of each header,
+        then the second one and so on.
+    '''
+    # pylint: disable=unused-argument
+    selected = []
+    for index in itertools.count():
+        found = False
+        for header, specs in catalog.headers(bits):
+            if len(selected) == count:
+                return selected
+            if index < len(specs):
+                selected.append(HeaderFieldView(header, specs[index]))
+                found = True
+        if not found:
+            return selected
+
+def select_random(catalog, bits, count, rng):
+    ''' count fields drawn at random (from rng), in header order. '''
+    fields = catalog.fields(bits)
+    return [fields[i] for i in sorted(rng.sample(range(len(fields)), count))]
+
+# name -> strategy(catalog, bits, count, rng) returning a list of count
+# HeaderFieldViews, the catalog has at least count fields of bits width
+STRATEGIES = {
+    'first': select_first,
+    'last': select_last,
+    'spread': select_spread,
+    'random': select_random,
+}
+
+def register_strategy(name, strategy):
+    ''' Register a key selection strategy, see STRATEGIES. '''
+    STRATEGIES[name] = strategy
+
+def select(catalog, bits, count, strategy='first', seed=0):
+    ''' Return count fields of bits width selected by strategy (name). '''
+    try:
+        strategy = STRATEGIES[strategy]
+    except KeyError:
+        raise ValueError('unknown key selection strategy {!r}'.format(strategy)) from None
+    if count <= 0:
+        return []
+    return strategy(catalog, bits, count, random.Random(seed))
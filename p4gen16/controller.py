@@ -2,6 +2,7 @@
 '''
 P4 controller type
 '''
+from .keyspace import KeySpace
 from .types.templateable import Templateable
 
 class Controller(Templateable):
@@ -10,5 +11,9 @@ class Controller(Templateable):
         super().__init__(target=program.target, sub_target=sub_target, suffix='.j2', **kwargs)
 
         self.tables = program.get_main_pipeline().tables
+        self.key_spaces = [KeySpace(table) for table in self.tables]
         self.skip_filling_tables = skip_filling_tables
+        if not skip_filling_tables:
+            for key_space, table in zip(self.key_spaces, self.tables):
+                key_space.check(table.size or 0)
         self.egress_port = egress_port
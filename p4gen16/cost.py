@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+'''
+Static per-packet cost model of a generated program, computed from the IR
+(without rendering) in O(nodes): bytes extracted per parse path, table
+lookups, key and action data widths, header and metadata writes and
+deparsed bytes.
+'''
+import collections
+import json
+import re
+
+from .types.control import ControlFlow
+from .types.statement import ApplyTable, ModifyHeader, ModifyMeta, SetHeaderValid
+
+_BITS = re.compile(r'bit<(\d+)>')
+
+def _type_bits(type_):
+    ''' Return the width of a bit<N> type, 0 for other types. '''
+    match = _BITS.fullmatch(type_)
+    return int(match.group(1)) if match else 0
+
+def _header_bytes(header):
+    return (sum(field.bits for field in header.fields) + 7) // 8
+
+def _parameter_bits(parameter):
+    return parameter.size or _type_bits(parameter.type)
+
+def _summary(values, counts):
+    ''' Return min, max and mean of values weighted by counts. '''
+    total = sum(counts)
+    if not total:
+        return {'min': 0, 'max': 0, 'mean': 0}
+    return {
+        'min': min(values),
+        'max': max(values),
+        'mean': sum(value * count for value, count in zip(values, counts)) / total,
+    }
+
+def parser_cost(parser, header_bytes):
+    ''' Return the parse paths of parser grouped by (depth, extracted bytes);
+        header_bytes maps header names to their size.
+    '''
+    # name -> (bytes extracted, names of next states)
+    states = {}
+    for state in parser.states:
+        extracted = list(state.extract_extra) + [state.header] + list(state.extract_extra_after)
+        states[state.name] = (
+            sum(header_bytes.get(name, 0) for name in extracted),
+            [] if state.is_end else [transition.next for transition in state.transitions])
+    # (depth, bytes) -> number of paths, a path ends in a final state or on
+    # a transition to accept (or reject)
+    paths = collections.Counter()
+    pending = [('start', 1, 0)] if 'start' in states else []
+    while pending:
+        name, depth, extracted = pending.pop()
+        if depth > len(states):
+            raise ValueError('parser {} contains a loop'.format(parser.name))
+        state_bytes, next_names = states[name]
+        extracted += state_bytes
+        ends = not next_names
+        for next_name in next_names:
+            if next_name in states:
+                pending.append((next_name, depth + 1, extracted))
+            else:
+                ends = True
+        if ends:
+            paths[depth, extracted] += 1
+    groups = sorted(paths.items())
+    counts = [count for _, count in groups]
+    return {
+        'states': len(states),
+        'paths': sum(counts),
+        'depth': _summary([depth for (depth, _), _ in groups], counts),
+        'bytes': _summary([extracted for (_, extracted), _ in groups], counts),
+        'by_path': [{'depth': depth, 'bytes': extracted, 'paths': count}
+                    for (depth, extracted), count in groups],
+    }
+
+def table_cost(table, applies):
+    ''' Return key and action data widths of table, applied applies times
+        per packet.
+    '''
+    return {
+        'name': table.name,
+        'applies': applies,
+        'keys': len(table.keys),
+        'key_bits': sum(key.field.bits for key in table.keys),
+        'match_kinds': sorted({key.match_kind for key in table.keys}),
+        'actions': len(table.actions),
+        # an entry holds the data of one action, the widest one determines its size
+        'action_data_bits': max((sum(_parameter_bits(parameter) for parameter in action.parameter)
+                                 for action in table.actions), default=0),
+        'size': table.size,
+    }
+
+def program_cost(program):
+    ''' Return the cost model of program as dict (JSON serializable). '''
+    header_bytes = {header.name: _header_bytes(header) for header in program.headers}
+    blocks = [block for block in program.controls.declarations().values()
+              if isinstance(block, ControlFlow)]
+
+    tables = []
+    per_packet = collections.Counter()
+    for block in blocks:
+        applies = collections.Counter()
+        for statement in block.sequence:
+            if isinstance(statement, ApplyTable):
+                applies[statement.table.name] += 1
+            elif isinstance(statement, ModifyHeader):
+                per_packet['header_writes'] += 1
+                per_packet['header_write_bits'] += statement.field.bits
+            elif isinstance(statement, ModifyMeta):
+                per_packet['metadata_writes'] += 1
+                per_packet['metadata_write_bits'] += _type_bits(statement.field.type)
+            elif isinstance(statement, SetHeaderValid):
+                per_packet['headers_set_valid'] += 1
+        for table in block.tables:
+            cost = table_cost(table, applies[table.name])
+            cost['control'] = block.name
+            tables.append(cost)
+            per_packet['table_lookups'] += cost['applies']
+            per_packet['key_bits'] += cost['applies'] * cost['key_bits']
+            per_packet['action_data_bits'] += cost['applies'] * cost['action_data_bits']
+
+    deparsed = [name.split('.', 1)[-1] for name in program.controls.deparse.header]
+    return {
+        'target': program.target,
+        'headers': len(header_bytes),
+        'parser': parser_cost(program.parser, header_bytes),
+        'tables': tables,
+        'per_packet': {name: per_packet[name] for name in (
+            'table_lookups', 'key_bits', 'action_data_bits', 'header_writes',
+            'header_write_bits', 'metadata_writes', 'metadata_write_bits',
+            'headers_set_valid')},
+        'deparser': {
+            'headers': len(deparsed),
+            'bytes': sum(header_bytes.get(name, 0) for name in deparsed),
+        },
+    }
+
+def dump(program, file_):
+    ''' Write the cost model of program as JSON to a file-like object. '''
+    json.dump(program_cost(program), file_, indent=2)
+    file_.write('\n')
+
+def summary(cost):
+    ''' Return the scalar metrics of a cost model, e.g. to compare programs. '''
+    metrics = {
+        'headers': cost['headers'],
+        'parser_states': cost['parser']['states'],
+        'parse_paths': cost['parser']['paths'],
+        'parse_depth_max': cost['parser']['depth']['max'],
+        'parse_bytes_max': cost['parser']['bytes']['max'],
+        'tables': len(cost['tables']),
+        'table_actions': sum(table['actions'] for table in cost['tables']),
+    }
+    metrics.update(cost['per_packet'])
+    metrics['deparser_headers'] = cost['deparser']['headers']
+    metrics['deparser_bytes'] = cost['deparser']['bytes']
+    return metrics
+
+def delta(before, after):
+    ''' Return the changed metrics (after - before) of two summaries. '''
+    return {name: after[name] - before[name] for name in before
+            if after[name] != before[name]}
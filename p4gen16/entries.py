@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+'''
+Vectorized table entry engine: generates the entries of a table (unique
+keys, prefix lengths, masks and priorities) as NumPy arrays, shaped by a
+key distribution and an insertion order. Requires numpy (optional, only
+imported on use).
+
+Keys are unique by construction: sorted keys are the cumulative sum of
+gaps >= 1, the distribution determines the gaps. A table's keys form one
+composite key (the last key is least significant), the distribution shapes
+its low 63 bits; the higher bits of wider composite keys are uniformly
+random.
+'''
+from .keyspace import shifts
+from .types.lazy import lazy_import
+
+# imported on first use, see _require_numpy
+numpy = None
+
+MAX_BITS = 63
+
+def _require_numpy():
+    global numpy # pylint: disable=global-statement
+    if numpy is None:
+        try:
+            numpy = lazy_import('numpy')
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError('table entry generation requires numpy',
+                                      name='numpy') from None
+
+def uniform(rng, count, space, **options):
+    ''' Keys spread uniformly over the key space (geometric gaps). '''
+    # pylint: disable=unused-argument
+    return rng.geometric(min(1.0, count / space), count).astype(numpy.uint64)
+
+def zipf(rng, count, space, zipf_exponent=1.2, **options):
+    ''' Dense runs of keys separated by heavy-tailed (Zipf) jumps. '''
+    # pylint: disable=unused-argument
+    # clamped in uint64, space may exceed the int64 range
+    return numpy.minimum(rng.zipf(zipf_exponent, count).astype(numpy.uint64),
+                         numpy.uint64(space - 1))
+
+def clustered(rng, count, space, clusters=16, **options):
+    ''' clusters runs of consecutive keys, placed at random in the key space. '''
+    # pylint: disable=unused-argument
+    gaps = numpy.ones(count, dtype=numpy.uint64)
+    starts = rng.choice(count, min(clusters, count), replace=False)
+    gaps[starts] = rng.integers(1, max(2, space // max(1, clusters)), len(starts),
+                                dtype=numpy.uint64)
+    return gaps
+
+# name -> distribution(rng, count, space, **options) returning count gaps
+# (>= 1) between sorted keys, rescaled to the key space if too large
+DISTRIBUTIONS = {
+    'uniform': uniform,
+    'zipf': zipf,
+    'clustered': clustered,
+}
+
+def register_distribution(name, distribution):
+    ''' Register a key distribution, see DISTRIBUTIONS. '''
+    DISTRIBUTIONS[name] = distribution
+
+def unique_keys(rng, count, bits, distribution='uniform', **options):
+    ''' Return count unique sorted keys of bits width (at most MAX_BITS,
+        wider keys are clamped) as uint64 array, see _composite.
+    '''
+    _require_numpy()
+    bits = min(bits, MAX_BITS)
+    space = 1 << bits
+    if count > space:
+        raise ValueError('{} unique keys requested, the {} bit key space holds {}'.format(
+            count, bits, space))
+    if count == 0:
+        return numpy.zeros(0, dtype=numpy.uint64)
+    try:
+        gaps = DISTRIBUTIONS[distribution](rng, count, space, **options)
+    except KeyError:
+        raise ValueError('unknown key distribution {!r}'.format(distribution)) from None
+    extra = gaps - numpy.uint64(1)
+    total = float(extra.sum(dtype=numpy.float64))
+    budget = space - count
+    if total > budget:
+        # shrink the gaps to fit, keeping them >= 1
+        scaled = numpy.floor(extra * (budget * (1 - 1e-9) / total))
+        extra = scaled.astype(numpy.uint64)
+        total = float(extra.sum(dtype=numpy.float64))
+    keys = numpy.cumsum(extra + numpy.uint64(1), dtype=numpy.uint64) - numpy.uint64(1)
+    slack = budget - int(total)
+    if slack > 0:
+        keys += numpy.uint64(rng.integers(0, slack + 1))
+    return keys
+
+def _composite(rng, count, widths, distribution, options):
+    ''' Return count unique composite keys as columns of widths (the last
+        least significant): the distribution shapes the low MAX_BITS bits,
+        which make the keys unique, higher bits are drawn uniformly.
+    '''
+    low = unique_keys(rng, count, min(sum(widths), MAX_BITS), distribution, **options)
+    columns = []
+    for width, shift in zip(widths, shifts(widths)):
+        column = numpy.zeros(count, dtype=numpy.uint64)
+        if shift < MAX_BITS:
+            column |= low >> numpy.uint64(shift) & numpy.uint64(
+                (1 << min(width, MAX_BITS - shift)) - 1)
+        start = max(shift, MAX_BITS)
+        if start < shift + width:
+            high = rng.integers(0, (1 << shift + width - start) - 1, count, dtype=numpy.uint64,
+                                endpoint=True)
+            column |= high << numpy.uint64(start - shift)
+        columns.append(column)
+    return columns
+
+def _random_bits(rng, count, density, precision=8):
+    ''' Return count random uint64 words, each bit set with probability
+        density (rounded to 1/2**precision).
+    '''
+    level = int(round(density * (1 << precision)))
+    if level <= 0:
+        return numpy.zeros(count, dtype=numpy.uint64)
+    if level >= 1 << precision:
+        return numpy.full(count, numpy.iinfo(numpy.uint64).max, dtype=numpy.uint64)
+    # combine random words along the binary expansion of density
+    while not level & 1:
+        level >>= 1
+        precision -= 1
+    words = numpy.zeros(count, dtype=numpy.uint64)
+    for i in range(precision):
+        random = rng.integers(0, numpy.iinfo(numpy.uint64).max, count, dtype=numpy.uint64,
+                              endpoint=True)
+        words = words | random if level >> i & 1 else words & random
+    return words
+
+_POPCOUNT = None
+
+def _popcount(values):
+    ''' Return the number of set bits of uint64 values. '''
+    global _POPCOUNT # pylint: disable=global-statement
+    if hasattr(numpy, 'bitwise_count'):
+        return numpy.bitwise_count(values)
+    if _POPCOUNT is None:
+        _POPCOUNT = numpy.array([bin(i).count('1') for i in range(256)], dtype=numpy.uint8)
+    return _POPCOUNT[values.view(numpy.uint8)].reshape(-1, 8).sum(axis=1)
+
+def parse_prefix_lengths(text):
+    ''' Return a prefix length histogram {length: weight} of LEN:WEIGHT,... '''
+    histogram = {}
+    for item in text.split(','):
+        length, _, weight = item.partition(':')
+        histogram[int(length)] = float(weight or 1)
+    return histogram
+
+class EntrySet():
+    ''' The entries of a table as arrays: keys (one column per table key),
+        prefix_lengths (of the lpm key), masks (one column per key, ternary
+        tables) and priorities (ternary tables, higher values win); absent
+        arrays are None. Entries are in insertion order.
+    '''
+    __slots__ = ('table', 'keys', 'prefix_lengths', 'masks', 'priorities')
+    def __init__(self, table, keys, prefix_lengths=None, masks=None, priorities=None):
+        self.table = table
+        self.keys = keys
+        self.prefix_lengths = prefix_lengths
+        self.masks = masks
+        self.priorities = priorities
+
+    def __len__(self):
+        return len(self.keys[0]) if self.keys else 0
+
+    def take(self, indices):
+        ''' Return the entries at indices (e.g. a slice) as EntrySet. '''
+        return EntrySet(
+            self.table,
+            [column[indices] for column in self.keys],
+            None if self.prefix_lengths is None else self.prefix_lengths[indices],
+            None if self.masks is None else [column[indices] for column in self.masks],
+            None if self.priorities is None else self.priorities[indices])
+
+    def rows(self, chunk_size=65536):
+        ''' Yield the entries as tuples of Python ints: the key values, then
+            the prefix length, the masks and the priority if present.
+        '''
+        for start in range(0, len(self), chunk_size):
+            chunk = self.take(slice(start, start + chunk_size))
+            columns = [column.tolist() for column in chunk.keys]
+            if chunk.prefix_lengths is not None:
+                columns.append(chunk.prefix_lengths.tolist())
+            if chunk.masks is not None:
+                columns.extend(column.tolist() for column in chunk.masks)
+            if chunk.priorities is not None:
+                columns.append(chunk.priorities.tolist())
+            yield from zip(*columns)
+
+    def arrays(self):
+        ''' Return the arrays by name, e.g. for numpy.savez. '''
+        arrays = {}
+        for key, column in zip(self.table.keys, self.keys):
+            arrays['{}.{}.{}'.format(self.table.name, key.header.name, key.field.name)] = column
+        if self.prefix_lengths is not None:
+            arrays[self.table.name + '.prefix_length'] = self.prefix_lengths
+        if self.masks is not None:
+            for key, column in zip(self.table.keys, self.masks):
+                arrays['{}.{}.{}.mask'.format(
+                    self.table.name, key.header.name, key.field.name)] = column
+        if self.priorities is not None:
+            arrays[self.table.name + '.priority'] = self.priorities
+        return arrays
+
+def _exact(rng, widths, count, distribution, options):
+    return _composite(rng, count, widths, distribution, options), None
+
+def _lpm(rng, widths, lpm, count, distribution, prefix_lengths, options):
+    ''' Keys of an lpm table, the prefix length of entries drawn from the
+        histogram prefix_lengths, unique per prefix length.
+    '''
+    if prefix_lengths is None:
+        prefix_lengths = {widths[lpm]: 1}
+    lengths = sorted(prefix_lengths)
+    if lengths[0] < 0 or lengths[-1] > widths[lpm]:
+        raise ValueError('prefix lengths must be within 0..{}'.format(widths[lpm]))
+    weights = numpy.array([prefix_lengths[length] for length in lengths], dtype=numpy.float64)
+    counts = rng.multinomial(count, weights / weights.sum())
+    columns = [[] for _ in widths]
+    groups = []
+    for length, group_count in zip(lengths, counts):
+        group_widths = list(widths)
+        group_widths[lpm] = length
+        try:
+            group = _composite(rng, int(group_count), group_widths, distribution, options)
+        except ValueError:
+            raise ValueError('{} entries of prefix length {} exceed the key space'.format(
+                group_count, length)) from None
+        group[lpm] = group[lpm] << numpy.uint64(widths[lpm] - length)
+        for column, values in zip(columns, group):
+            column.append(values)
+        groups.append(numpy.full(int(group_count), length, dtype=numpy.uint8))
+    return [numpy.concatenate(column) for column in columns], numpy.concatenate(groups)
+
+def _duplicates(columns, widths):
+    ''' Return the indices of rows of columns (of widths bits) equal to an
+        earlier row (in sort order).
+    '''
+    if sum(widths) <= 64:
+        # one sort of the packed rows is much faster than lexsort
+        packed = numpy.zeros(len(columns[0]), dtype=numpy.uint64)
+        for column, width in zip(columns, widths):
+            packed = packed << numpy.uint64(width) | column
+        columns = [packed]
+    order = numpy.lexsort(columns) if len(columns) > 1 else numpy.argsort(columns[0])
+    equal = numpy.ones(max(0, len(order) - 1), dtype=bool)
+    for column in columns:
+        values = column[order]
+        equal &= values[1:] == values[:-1]
+    return order[1:][equal]
+
+def _ternary(rng, widths, count, distribution, mask_density, overlap, options):
+    ''' Keys and masks of a ternary table: mask bits are set with
+        probability mask_density, overlap is the fraction of entries
+        covering another entry (a subset of its mask bits).
+    '''
+    keys = _composite(rng, count, widths, distribution, options)
+    full = [numpy.uint64((1 << width) - 1) if width < 64
+            else numpy.iinfo(numpy.uint64).max for width in widths]
+    masks = [_random_bits(rng, count, mask_density) & limit for limit in full]
+    covering = rng.choice(count, int(round(overlap * count)), replace=False) if count else []
+    if len(covering):
+        covered = rng.integers(0, count, len(covering))
+        for i in range(len(widths)):
+            masks[i][covering] = masks[i][covered] & _random_bits(rng, len(covering), 0.5)
+            keys[i][covering] = keys[i][covered]
+    for _ in range(16):
+        keys = [key & mask for key, mask in zip(keys, masks)]
+        duplicates = _duplicates(keys + masks, widths + widths)
+        if not len(duplicates):
+            return keys, masks
+        # draw duplicates again (losing their overlap)
+        for i, limit in enumerate(full):
+            keys[i][duplicates] = rng.integers(0, limit, len(duplicates), dtype=numpy.uint64,
+                                               endpoint=True)
+            masks[i][duplicates] = _random_bits(rng, len(duplicates), mask_density) & limit
+    raise ValueError('cannot generate {} unique ternary entries with mask density {}'.format(
+        count, mask_density))
+
+def _sorted(entries, rng):
+    # pylint: disable=unused-argument
+    return numpy.lexsort(entries.keys[::-1]) if entries.keys else slice(None)
+
+def _random(entries, rng):
+    return rng.permutation(len(entries))
+
+def _worst_case(entries, rng):
+    ''' Descending keys (exact), longest prefixes first (lpm), lowest
+        priority first (ternary).
+    '''
+    # pylint: disable=unused-argument
+    if entries.priorities is not None:
+        return numpy.argsort(entries.priorities, kind='stable')
+    order = numpy.lexsort(entries.keys[::-1])[::-1] if entries.keys else slice(None)
+    if entries.prefix_lengths is not None:
+        order = order[numpy.argsort(-entries.prefix_lengths[order].astype(numpy.int16),
+                                    kind='stable')]
+    return order
+
+# name -> order(entries, rng) returning the insertion order as indices
+ORDERS = {
+    'sorted': _sorted,
+    'random': _random,
+    'worst-case': _worst_case,
+}
+
+def register_order(name, order):
+    ''' Register an insertion order, see ORDERS. '''
+    ORDERS[name] = order
+
+def generate(table, count=None, distribution='uniform', order='sorted', seed=0,
+             prefix_lengths=None, mask_density=1.0, overlap=0.0, **options):
+    ''' Return count (default: the table size) unique entries of table as
+        EntrySet. prefix_lengths is the histogram {length: weight} of the
+        lpm key (default: full length), mask_density and overlap shape the
+        masks of ternary tables (see _ternary); options are passed on to the
+        distribution. The same arguments and seed yield the same entries.
+    '''
+    # pylint: disable=too-many-arguments
+    _require_numpy()
+    if count is None:
+        count = table.size or 0
+    if order not in ORDERS:
+        raise ValueError('unknown insertion order {!r}'.format(order))
+    if not table.keys:
+        return EntrySet(table, [])
+    widths = [key.field.bits for key in table.keys]
+    if max(widths) > 64:
+        raise ValueError('table {}: keys wider than 64 bits are not supported'.format(
+            table.name))
+    rng = numpy.random.default_rng(seed)
+    kinds = [key.match_kind for key in table.keys]
+    try:
+        if 'ternary' in kinds:
+            keys, masks = _ternary(rng, widths, count, distribution, mask_density, overlap,
+                                   options)
+            # more specific entries win
+            specificity = sum(_popcount(mask).astype(numpy.int64) for mask in masks)
+            priorities = numpy.empty(count, dtype=numpy.int64)
+            priorities[numpy.argsort(specificity, kind='stable')] = numpy.arange(1, count + 1)
+            entries = EntrySet(table, keys, masks=masks, priorities=priorities)
+        elif 'lpm' in kinds:
+            keys, lengths = _lpm(rng, widths, kinds.index('lpm'), count, distribution,
+                                 prefix_lengths, options)
+            entries = EntrySet(table, keys, prefix_lengths=lengths)
+        else:
+            entries = EntrySet(table, _exact(rng, widths, count, distribution, options)[0])
+    except ValueError as error:
+        raise ValueError('table {}: {}'.format(table.name, error)) from None
+    return entries.take(ORDERS[order](entries, rng))
+
+def generate_tables(tables, count=None, **options):
+    ''' Return the EntrySets of tables, see generate(); the seed is varied
+        per table.
+    '''
+    seed = options.pop('seed', 0)
+    return [generate(table, count, seed=seed + i, **options) for i, table in enumerate(tables)]
+
+def dump(entry_sets, file_):
+    ''' Write EntrySets to a file-like object as .npz (numpy.savez). '''
+    _require_numpy()
+    arrays = {}
+    for entries in entry_sets:
+        arrays.update(entries.arrays())
+    numpy.savez(file_, **arrays)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+'''
+Composite key space of a table, enumerating unique keys for the table
+entries installed by controllers and rule writers.
+'''
+
+def shifts(widths):
+    ''' Return the bit offset of each key of widths in the composite key,
+        the last key is least significant (as in the table's key order, and
+        the entries of p4gen16.entries).
+    '''
+    offsets = []
+    shift = 0
+    for width in reversed(widths):
+        offsets.append(shift)
+        shift += width
+    return offsets[::-1]
+
+class KeySpace():
+    ''' The keys of a table as one mixed radix number, one digit per key
+        (radix 2**bits of the key's field, i.e. 256**required_bytes for byte
+        aligned fields), the last key is least significant, see shifts().
+        Entry i gets the digits of i, so entries are unique up to size.
+    '''
+    __slots__ = ('table', 'digits', 'size')
+    def __init__(self, table):
+        self.table = table
+        # (key, shift, mask) per key
+        widths = [key.field.bits for key in table.keys]
+        self.digits = [(key, shift, (1 << width) - 1)
+                       for key, shift, width in zip(table.keys, shifts(widths), widths)]
+        self.size = 1 << sum(widths) if table.keys else 0
+
+    def check(self, count):
+        ''' Raise a ValueError if count unique entries exceed the key space. '''
+        if count > self.size:
+            raise ValueError(
+                'table {}: {} entries exceed its key space of {} keys ({})'.format(
+                    self.table.name, count, self.size,
+                    ' x '.join('{} bit'.format(key.field.bits) for key in self.table.keys)
+                    or 'no keys'))
+
+    def key(self, i):
+        ''' Return the key values of entry i as tuple. '''
+        return tuple(i >> shift & mask for _, shift, mask in self.digits)
+
+    def keys(self, count, start=0):
+        ''' Yield the key values of entries start to start + count. '''
+        self.check(start + count)
+        return map(self.key, range(start, start + count))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+'''
+Optimization passes over the IR of a generated program, stripping
+components unrelated to the measured feature. A pass modifies the program
+(copy-on-write, see Program.clone) and returns descriptions of what it
+removed; run() reports them with the cost model delta of each pass.
+'''
+import copy
+import json
+
+from . import cost
+from .types.control import ControlFlow
+from .types.statement import ApplyTable, ModifyHeader, ModifyMeta, SetHeaderValid, Statement
+from .types.templateable import TrackedList
+
+def _flows(program):
+    return [name for name, block in program.controls.declarations().items()
+            if isinstance(block, ControlFlow)]
+
+def dead_actions(program, entry_actions=None, **options):
+    ''' Remove table actions no entry uses (if entry_actions, the names of
+        the actions installed by the control plane, is known) except the
+        default action, then actions of control blocks referenced by no
+        table and no statement.
+    '''
+    # pylint: disable=unused-argument
+    removed = []
+    for name in _flows(program):
+        block = getattr(program.controls, name)
+        tables = list(block.tables)
+        if entry_actions is not None:
+            for i, table in enumerate(tables):
+                actions = [action for action in table.actions
+                           if action is table.default_action or action.name in entry_actions]
+                if len(actions) == len(table.actions):
+                    continue
+                removed.extend('{}.{}: action {}'.format(name, table.name, action.name)
+                               for action in table.actions if action not in actions)
+                # tables may be shared with clones
+                tables[i] = copy.copy(table)
+                tables[i].actions = TrackedList(actions)
+        used = {id(action) for table in tables for action in table.actions}
+        used.update(id(table.default_action) for table in tables)
+        called = {statement.statement.partition('(')[0] for statement in block.sequence
+                  if type(statement) is Statement} # pylint: disable=unidiomatic-typecheck
+        actions = [action for action in block.actions
+                   if id(action) in used or action.name in called]
+        if tables == list(block.tables) and len(actions) == len(block.actions):
+            continue
+        removed.extend('{}: action {}'.format(name, action.name)
+                       for action in block.actions if action not in actions)
+        block = program.own_block(name)
+        block.tables = tables
+        block.actions = actions
+        # keep applies referring to the current tables
+        by_name = {table.name: table for table in tables}
+        block.sequence = [
+            ApplyTable(by_name[statement.table.name], target=program.target)
+            if isinstance(statement, ApplyTable) and statement.table.name in by_name
+            else statement
+            for statement in block.sequence]
+    return removed
+
+def unused_headers(program, **options):
+    ''' Remove headers that are neither extracted by the parser (except after
+        the parse tree, like the deparser_remove_headers, so nothing depends
+        on their offset), emitted by the deparser, matched by a table nor
+        referenced by a statement (e.g. written by header field modifies),
+        and their headers struct fields and extracts.
+    '''
+    # pylint: disable=unused-argument
+    used = set()
+    for state in program.parser.states:
+        used.update(state.extract_extra)
+        used.add(state.header)
+    used.update(name.split('.', 1)[-1] for name in program.controls.deparse.header)
+    for name in _flows(program):
+        block = getattr(program.controls, name)
+        for table in block.tables:
+            used.update(key.header.name for key in table.keys)
+        for statement in block.sequence:
+            if isinstance(statement, ModifyHeader):
+                used.add(statement.field.parent.name)
+            elif isinstance(statement, SetHeaderValid):
+                used.add(statement.header.name)
+    # lazily created headers are all extracted, only explicit ones are checked
+    unused = [header.name for header in program.explicit_headers() if header.name not in used]
+    if unused:
+        program.remove_headers(unused)
+    return ['header {}'.format(header) for header in unused]
+
+def duplicate_statements(program, **options):
+    ''' Fold repeated writes (header and metadata fields, header validity)
+        between two table applies or other statements into one. Generated
+        programs (also those of Program.derive) write each field once, only
+        programs modified through the IR may repeat writes.
+    '''
+    # pylint: disable=unused-argument
+    writes = (ModifyHeader, ModifyMeta, SetHeaderValid)
+    removed = []
+    for name in _flows(program):
+        sequence = getattr(program.controls, name).sequence
+        kept = []
+        seen = set()
+        for statement in sequence:
+            if not isinstance(statement, writes):
+                seen.clear()
+            elif statement.statement in seen:
+                removed.append('{}: {}'.format(name, statement.statement))
+                continue
+            else:
+                seen.add(statement.statement)
+            kept.append(statement)
+        if len(kept) != len(sequence):
+            program.own_block(name).sequence = kept
+    return removed
+
+# name -> pass(program, **options) returning descriptions of the removed
+# components; run in this order
+PASSES = {
+    'dead-actions': dead_actions,
+    'unused-headers': unused_headers,
+    'duplicate-statements': duplicate_statements,
+}
+
+def register_pass(name, pass_):
+    ''' Register an optimization pass, see PASSES. '''
+    PASSES[name] = pass_
+
+def run(program, names=None, **options):
+    ''' Run the passes names (all if None) on program, in PASSES order; options
+        are passed on to every pass. Return a report of the removed
+        components and the cost model delta per pass.
+    '''
+    if names is None:
+        names = list(PASSES)
+    unknown = set(names) - set(PASSES)
+    if unknown:
+        raise ValueError('unknown passes: {}'.format(', '.join(sorted(unknown))))
+    before = cost.summary(cost.program_cost(program))
+    metrics = before
+    report = {'passes': []}
+    for name, pass_ in PASSES.items():
+        if name not in names:
+            continue
+        removed = pass_(program, **options)
+        previous, metrics = metrics, cost.summary(cost.program_cost(program))
+        program.log.info('pass %s removed %d components', name, len(removed))
+        report['passes'].append({
+            'name': name,
+            'removed': removed,
+            'cost_delta': cost.delta(previous, metrics),
+        })
+    report['cost_delta'] = cost.delta(before, metrics)
+    return report
+
+def dump(report, file_):
+    ''' Write a report of run() as JSON to a file-like object. '''
+    json.dump(report, file_, indent=2)
+    file_.write('\n')
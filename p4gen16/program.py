@@ -5,30 +5,85 @@ P4 program type
 
 import sys
 import collections
-import logging
+import copy
+import functools
+from .catalog import FieldCatalog, select as select_keys
 from .types.action import Action
 from .types.header import Header
+from .types.lazy import LazySequence, flatten, lazy_import
 from .types.parser import Parser
 from .types.struct import Struct
 from .types.statement import Statement
-from .types.templateable import Templateable
+from .types.templateable import Templateable, make_config, set_fragment_key
 from .types.common.header import Ethernet, IPv4, Ethernet_IP_Dummy, Uninteresting
 from . import types as p4
 
+inspect = lazy_import('inspect')
+
+def _stage(func):
+    ''' Record the arguments of a generate_* stage, see Program.derive. '''
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        arguments = inspect.signature(func).bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        self._stages[func.__name__] = dict(list(arguments.arguments.items())[1:])
+        return func(self, *args, **kwargs)
+    return wrapper
+
+def _stable_repr(value):
+    ''' Return a repr of value that is the same in every run (functions by
+        their qualified name), or None if there is none.
+    '''
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        items = [_stable_repr(item) for item in value]
+        if None in items:
+            return None
+        return '({})'.format(', '.join(items))
+    if isinstance(value, dict):
+        items = [(repr(name), _stable_repr(item)) for name, item in sorted(value.items())]
+        if any(item is None for _, item in items):
+            return None
+        return '{{{}}}'.format(', '.join(': '.join(item) for item in items))
+    if callable(value) and hasattr(value, '__qualname__'):
+        return '{}.{}'.format(value.__module__, value.__qualname__)
+    return None
+
 class Program(Templateable):
     ''' A program. '''
     _parser = None
+    # generate_* stages in build order, later stages depend on the headers
+    STAGES = ('generate_headers', 'generate_parser_tree', 'generate_controls',
+              'generate_deparser')
+    # containers shared with clones until modified (copy-on-write)
+    _SHARED = frozenset(['_headers', '_structs', 'controls'])
+    # stages whose arguments determine the keyed fragments, see _key_fragment
+    _FRAGMENT_STAGES = {
+        'structs': ('generate_headers',),
+        'parser': ('generate_headers', 'generate_parser_tree'),
+        'controls': ('generate_headers', 'generate_controls', 'generate_deparser'),
+    }
+
     def __init__(self, target, skip_ethernet, skip_ip, add_uninteresting):
         super().__init__(target=target)
+        self._init_args = {
+            'target': target,
+            'skip_ethernet': skip_ethernet,
+            'skip_ip': skip_ip,
+            'add_uninteresting': add_uninteresting,
+        }
+        self._stages = {}
+        self._shared = set()
         self._parser = collections.OrderedDict()
         self._headers = collections.OrderedDict()
         self._structs = collections.OrderedDict()
+        self._lazy = False
 
         self.controls = p4.control.Control(
             target=target,
         )
 
-        self.log = logging
         self.target = target
 
         # general options
@@ -38,8 +93,99 @@ class Program(Templateable):
         self.skip_ethernet_ip = skip_ethernet and skip_ip
         self.add_uninteresting = add_uninteresting
 
+    def clone(self):
+        ''' Return a copy of this program. Headers, structs, parser and controls
+            are shared until either program modifies them (copy-on-write).
+        '''
+        other = copy.copy(self)
+        self._shared.update(self._SHARED)
+        other._shared = set(self._SHARED)
+        other._stages = dict(self._stages)
+        return other
+
+    def derive(self, **changes):
+        ''' Return a variant of this program with changed arguments of its
+            constructor or generate_* stages. Only stages with changed
+            arguments (and all stages after generate_headers) are rerun,
+            everything else is shared with this program.
+        '''
+        init_args = dict(self._init_args)
+        stages = {name: dict(arguments) for name, arguments in self._stages.items()}
+        unknown = set(changes).difference(init_args, *stages.values())
+        if unknown:
+            raise TypeError('derive() got unexpected arguments: {}'.format(
+                ', '.join(sorted(unknown))))
+
+        rebuild = False
+        for name, value in changes.items():
+            if name in init_args and init_args[name] != value:
+                init_args[name] = value
+                # everything depends on the general options
+                rebuild = True
+        if rebuild:
+            other = Program(**init_args)
+        else:
+            other = self.clone()
+        for stage in self.STAGES:
+            if stage not in stages:
+                continue
+            arguments = stages[stage]
+            changed = rebuild
+            for name, value in changes.items():
+                if name in arguments and arguments[name] != value:
+                    arguments[name] = value
+                    changed = True
+            if changed:
+                getattr(other, stage)(**arguments)
+                # every later stage uses the headers
+                rebuild = rebuild or stage == 'generate_headers'
+        return other
+
+    def retarget(self, target):
+        ''' Return a program for target sharing the target independent IR
+            (headers, structs, parser states) with this one; only the target
+            dependent parts (parser, controls, deparser) are generated again.
+            Shared nodes are bound to this program's target, render them with
+            templateable.set_render_target(target).
+        '''
+        other = self.clone()
+        object.__setattr__(other, '_jinja2', make_config(target=target))
+        other.target = target
+        other._init_args = dict(self._init_args, target=target)
+        other.main_pipeline = None
+        other.controls = p4.control.Control(target=target)
+        other._shared.discard('controls')
+        if self._parser:
+            other._parser = p4.parser.parser_class(target).from_parser(
+                self._parser, target=target)
+        for stage in ('generate_controls', 'generate_deparser'):
+            if stage in self._stages:
+                getattr(other, stage)(**self._stages[stage])
+        return other
+
+    def _key_fragment(self, fragment, node, name=None):
+        ''' Key the rendered output of node, the fragment (and its part
+            name) of this program, for the fragment cache by the arguments of
+            the constructor and the stages building it.
+        '''
+        key = _stable_repr((fragment, name, self._init_args, [
+            (stage, self._stages.get(stage)) for stage in self._FRAGMENT_STAGES[fragment]]))
+        if key is not None:
+            set_fragment_key(node, key)
+
+    def _own(self, name):
+        ''' Return attribute name, copied first if shared with a clone. '''
+        value = getattr(self, name)
+        if name in self._shared:
+            value = copy.copy(value)
+            setattr(self, name, value)
+            self._shared.discard(name)
+        return value
+
     @property
     def headers(self):
+        if self._lazy:
+            return flatten(self._headers.values())
         return self._headers.values()
 
     @headers.setter
@@ -52,7 +198,59 @@ class Program(Templateable):
         if not isinstance(header, Header):
             raise TypeError('{that} is not an instance of Header'.format(
                 that=header.__class__.__name__))
-        self._headers[header.name] = header
+        self._own('_headers')[header.name] = header
+        self._changed()
+
+    def add_lazy_headers(self, headers):
+        ''' Add a LazySequence of headers, created on demand, to this program. '''
+        if not isinstance(headers, LazySequence):
+            raise TypeError('{that} is not an instance of LazySequence'.format(
+                that=headers.__class__.__name__))
+        self._own('_headers')[headers] = headers
+        self._lazy = True
+
+    @property
+    def header_types(self):
+        ''' Return one header per header type, declaring the type. '''
+        types = set()
+        declared = []
+        for header in self._headers.values():
+            if isinstance(header, LazySequence):
+                if len(header) < 2 or header[0].type != header[1].type:
+                    # a type per header
+                    declared.append(header)
+                    continue
+                header = header[0]
+            if header.type not in types:
+                types.add(header.type)
+                declared.append(header)
+        return flatten(declared)
+
+    def explicit_headers(self):
+        ''' Return the headers of this program, except lazily created ones. '''
+        return [header for header in self._headers.values()
+                if not isinstance(header, LazySequence)]
+
+    def remove_headers(self, names):
+        ''' Remove the (explicitly created) headers names, their headers
+            struct fields and their extra extracts from this program.
+        '''
+        names = set(names)
+        headers = self._own('_headers')
+        for name in names:
+            headers.pop(name, None)
+        structs = self._own('_structs')
+        # the struct may be shared with clones
+        structs['headers'] = copy.copy(structs['headers'])
+        structs['headers'].remove_fields(names)
+        self._changed()
+        self.deparser_headers = [header for header in self.deparser_headers
+                                 if header.name not in names]
+        self.deparser_remove_headers = [header for header in self.deparser_remove_headers
+                                        if header.name not in names]
+        if self._parser:
+            # states may be shared with clones
+            self.parser = self._parser.without_extracts(names)
 
     @property
     def structs(self):
@@ -68,7 +266,8 @@ class Program(Templateable):
         if not isinstance(struct, Struct):
             raise TypeError('{that} is not an instance of Struct'.format(
                 that=struct.__class__.__name__))
-        self._structs[struct.name] = struct
+        self._own('_structs')[struct.name] = struct
+        self._changed()
 
     @property
     def parser(self):
@@ -85,7 +284,7 @@ class Program(Templateable):
         '''
         Return number of nodes in tree width height h and branching factor b
         '''
-        return int((b ** h - 1) / (b - 1)) if b > 1 and h > 0 else max(0, h)
+        return p4.parser.nodes_in_tree(b, h)
 
     def struct_headers(self):
         return list(self.structs)[0]
@@ -93,24 +292,36 @@ class Program(Templateable):
     def struct_metadata(self):
         return list(self.structs)[1]
 
+    @_stage
     def generate_headers(self, stack_height=1, branching_factor=1, field_count=1, field_size=8,
                          deparser_headers=0, deparser_remove_headers=0, deparser_field_count=1,
-                         deparser_field_size=8, meta_field_modifies=0):
+                         deparser_field_size=8, meta_field_modifies=0, lazy=False,
+                         shared_types=False):
+        ''' Generate the headers and the headers struct, the generic headers of
+            the parser tree are created on demand while rendering if lazy.
+            Headers of the same layout share one type (h_t, dep_h_t) if
+            shared_types, instead of a type per header.
+        '''
         self.log.info('generate_headers(%d, %d, %d, %d)', stack_height,
                        branching_factor, field_count, field_size)
+        # start from scratch, e.g. when rerun by derive
+        self._headers = collections.OrderedDict()
+        self._structs = collections.OrderedDict()
+        self._shared.difference_update(['_headers', '_structs'])
+        self._lazy = False
         # number of generic headers to generate
         header_count = self._nodes_in_tree(branching_factor, stack_height)
     
         ## preparing header
-        headers = []
+        special_headers = []
         if self.skip_ethernet_ip:
-            headers.append(Ethernet_IP_Dummy)
+            special_headers.append(Ethernet_IP_Dummy)
         if self.skip_ethernet:
-            headers.append(Ethernet)
+            special_headers.append(Ethernet)
         if self.skip_ip:
-            headers.append(IPv4)
+            special_headers.append(IPv4)
         if self.add_uninteresting:
-            headers.append(Uninteresting)
+            special_headers.append(Uninteresting)
         # headers used in pipeline
         fields = [
             p4.header.HeaderField(
@@ -118,14 +329,18 @@ class Program(Templateable):
                 'f{:03}'.format(i),
                 target=self.target,
             ) for i in range(field_count)]
-        for i in range(header_count):
-            headers.append(
-                p4.header.Header(
-                    'h{:03}'.format(i),
-                    fields=fields,
-                    target=self.target,
-                )
-            )
+        generic_type = 'h_t' if shared_types else None
+        generic_header = functools.partial(_generic_header, fields, self.target,
+                                           type_=generic_type)
+        if lazy:
+            generic_headers = LazySequence(
+                header_count, generic_header,
+                ('h', header_count, field_count, field_size, self.target, generic_type))
+        else:
+            generic_headers = p4.header.Header.bulk(
+                ['h{:03}'.format(i) for i in range(header_count)], fields,
+                type=generic_type, target=self.target)
+        deparser_type = 'dep_h_t' if shared_types else None
         # deparser headers
         d_fields = [
             p4.header.HeaderField(
@@ -138,6 +353,7 @@ class Program(Templateable):
             dep_headers.append(
                 p4.header.Header(
                     'dep_h{:03}'.format(i),
+                    type=deparser_type,
                     fields=d_fields,
                     target=self.target,
                 )
@@ -147,14 +363,21 @@ class Program(Templateable):
             dep_remove_headers.append(
                 p4.header.Header(
                     'dep_r_h{:03}'.format(i),
+                    type=deparser_type,
                     fields=d_fields,
                     target=self.target,
                 )
             )
-        self.headers = headers + dep_headers + dep_remove_headers
+        self.headers = special_headers
+        if lazy:
+            self.add_lazy_headers(generic_headers)
+        else:
+            self.headers = generic_headers
+        self.headers = dep_headers + dep_remove_headers
         self.deparser_headers = dep_headers
         self.deparser_remove_headers = dep_remove_headers
-        self.metadata = p4.common.struct.metadata
+        # a copy, fields added below must not leak into other programs
+        self.metadata = p4.struct.Struct('metadata', fields=p4.common.struct.metadata.fields)
 
         for i in range(meta_field_modifies):
             f = p4.struct.StructField(
@@ -171,126 +394,120 @@ class Program(Templateable):
             self.metadata,
         ]
 
-        header_struct_fields = []
-        if self.skip_ethernet_ip:
-            self._structs['headers'].add_field(
-                p4.struct.StructField(Ethernet_IP_Dummy, Ethernet_IP_Dummy.name, target=self.target))
-        if self.skip_ethernet:
-            self._structs['headers'].add_field(
-                p4.struct.StructField(Ethernet, Ethernet.name, target=self.target))
-        if self.skip_ip:
-            self._structs['headers'].add_field(
-                p4.struct.StructField(IPv4, IPv4.name, target=self.target))
-        if self.add_uninteresting:
-            self._structs['headers'].add_field(
-                p4.struct.StructField(Uninteresting, Uninteresting.name, target=self.target))
-        start_idx = 0
+        struct_headers = self._structs['headers']
+        struct_headers.fields = p4.struct.StructField.bulk(special_headers, target=self.target)
+        if lazy:
+            struct_headers.add_lazy_fields(LazySequence(
+                header_count,
+                functools.partial(_generic_struct_field, generic_header, self.target),
+                ('h',) + generic_headers.key))
+        struct_headers.fields = p4.struct.StructField.bulk(
+            ([] if lazy else generic_headers) + dep_headers + dep_remove_headers,
+            target=self.target)
+        for struct in self.structs:
+            self._key_fragment('structs', struct, struct.name)
+
+    @_stage
+    def generate_parser_tree(self, stack_height=1, branching_factor=1, field_count=1, field_size=8,
+                             lazy=False):
+        ''' Generate the parser tree, its states (except the start state) are
+            created on demand while rendering if lazy.
+        '''
+        self.log.info('generate_parser_tree(%d, %d, %d, %d)', stack_height,
+                       branching_factor, field_count, field_size)
+        # some special cases that occur only once in first state
+        extra = []
         if self.skip_ethernet_ip:
-            start_idx += 1
+            extra.append(Ethernet_IP_Dummy.name)
         if self.skip_ethernet:
-            start_idx += 1
+            extra.append(Ethernet.name)
         if self.skip_ip:
-            start_idx += 1
+            extra.append(IPv4.name)
         if self.add_uninteresting:
-            start_idx += 1
-        for i, header in enumerate(self.headers):
-            if i < start_idx:
-                continue
-            self._structs['headers'].add_field(
-                p4.struct.StructField(header, header.name, target=self.target))
-        for i, header in enumerate(self.deparser_remove_headers):
-            self._structs['headers'].add_field(
-                p4.struct.StructField(header, header.name, target=self.target))
-
-    def generate_parser_tree(self, stack_height=1, branching_factor=1, field_count=1, field_size=8):
-        self.log.info('generate_parser_tree(%d, %d, %d, %d)', stack_height,
-                       branching_factor, field_count, field_size)
-        # number of generic headers to generate
-        header_count = self._nodes_in_tree(branching_factor, stack_height)
+            extra.append(Uninteresting.name)
+        extra_after = [header.name for header in self.deparser_remove_headers]
         ## preparing parser
-        pstates = []
-        # link parser states, leafs of parser tree are final states
-        internal_node_count = self._nodes_in_tree(branching_factor, stack_height-1)
-        for i in range(header_count):
-            transitions = []
-            if i < internal_node_count:
-                transitions = [
-                    p4.parser.ParserStateTransition(
-                        '{}w{}'.format(field_size, j),
-                        'parse_h{:03}'.format(i * branching_factor + j),
-                        target=self.target,
-                    ) for j in range(1, branching_factor)
-                ]
-                next_ = branching_factor * (i + 1)
-                if next_ < header_count:
-                    transitions += [
-                        # XXX explicitly set default next header
-                        p4.parser.ParserStateTransition(
-                            'default',
-                            'parse_h{:03}'.format(next_),
-                            target=self.target,
-                        ),
-                    ]
-            extra = []
-            extra_after = []
-            # some special cases that occur only once in first state
-            if i == 0:
-                if self.skip_ethernet_ip:
-                    extra.append(Ethernet_IP_Dummy.name)
-                if self.skip_ethernet:
-                    extra.append(Ethernet.name)
-                if self.skip_ip:
-                    extra.append(IPv4.name)
-                if self.add_uninteresting:
-                    extra.append(Uninteresting.name)
-
-                for header in self.deparser_remove_headers:
-                    extra_after.append(header.name)
-            pstates.append(p4.parser.ParserState(
-                'h{:03}'.format(i), # name
-                'f{:03}'.format(0), # select, XXX fixed selected field
-                # matches, link node to its children
-                transitions=transitions,
-                is_start=i==0,
-                target=self.target,
-                extract_extra=extra,
-                extract_extra_after=extra_after
-            ))
-        parser = p4.parser.make_parser(
-            states=pstates,
+        parser = p4.parser.parser_class(self.target).from_tree(
+            branching_factor,
+            stack_height,
+            field_size,
+            extract_extra=extra,
+            extract_extra_after=extra_after,
+            lazy=lazy,
             target=self.target,
         )
         self.parser = parser
+        self._key_fragment('parser', parser)
 
+    @_stage
     def generate_deparser(self, emit=True):
         self.log.info('generate_deparser()')
         deparse_headers = []
-        if emit:
+        if emit and self._lazy:
+            deparse_headers = flatten(
+                # names of lazily created headers, without creating them
+                LazySequence(len(header), _generic_header_name, header.key)
+                if isinstance(header, LazySequence) else 'h.' + header.name
+                for header in self._headers.values()
+                if header not in self.deparser_remove_headers)
+        elif emit:
             deparse_headers = ['h.' + header.name for header in self.headers if header not in self.deparser_remove_headers]
         deparse = p4.control.make_deparser(deparse_headers, target=self.target)
-        self.controls.add_declaration('deparse', deparse)
+        self._own('controls').add_declaration('deparse', deparse)
+        self._key_fragment('controls', self.controls)
+
+    def _is_key_candidate(self, header):
+        if self.skip_ethernet_ip and header.type == Ethernet_IP_Dummy.type:
+            self.log.debug('skipping ethernet ip dummy')
+            return False
+        if self.skip_ethernet and header.type == Ethernet.type:
+            self.log.debug('skipping ethernet')
+            return False
+        if self.skip_ip and header.type == IPv4.type:
+            self.log.debug('skipping ipv4')
+            return False
+        if self.add_uninteresting and header.type == Uninteresting.type:
+            self.log.debug('skipping uninteresting')
+            return False
+        return True
+
+    def field_catalog(self):
+        ''' Return the FieldCatalog of the fields usable as match keys and for
+            header modifications, lazily created headers are not materialized.
+        '''
+        return FieldCatalog(
+            header for header in self._headers.values()
+            if isinstance(header, LazySequence) or self._is_key_candidate(header))
+
+    def own_block(self, name):
+        ''' Return control block name for modification, copied first as it
+            may be shared with clones (its lists must be replaced, not
+            modified in place).
+        '''
+        block = copy.copy(getattr(self.controls, name))
+        self._own('controls').add_declaration(name, block)
+        return block
 
     def get_main_pipeline(self):
         return getattr(self.controls, self.main_pipeline)
 
+    @_stage
     def generate_controls(self, egress_port=1, number_tables=1, repeat_apply_tables=1,
                           number_table_entries=0,
                           match_type='exact', number_match_keys=1, match_key_size=8,
-                          match_last=False,
+                          match_last=False, key_strategy=None, key_seed=0,
                           action=None, default_action=None, number_action_data=0,
                           header_field_modifies=0, meta_field_modifies=0):
         self.log.info('generate_controls()')
-        controls = None
-        if self.target == 'v1model':
-            controls = p4.v1model.control.generate_controls()
-            self.main_pipeline = 'ingress'
-        elif self.target == 'sume_switch':
-            log.fatal('NYI')
-            return
+        generate_target_controls = p4.targets.get(self.target, 'controls')
+        if generate_target_controls is None:
+            raise ValueError('target {}: controls are not implemented'.format(self.target))
+        controls = generate_target_controls()
+        self.main_pipeline = p4.targets.lookup(self.target, 'main_pipeline')
 
         # add them
         for name, control in controls.items():
-            self.controls.add_declaration(name, control)
+            self._own('controls').add_declaration(name, control)
 
         # actual processing in pipeline
         pipeline = self.get_main_pipeline()
@@ -325,67 +542,56 @@ class Program(Templateable):
 
         # TODO parameterize tables: action data
         # add tables and their invocation
-        self.available_fields = []
-        for i in range(number_tables):
-            name = 'table_benchmark{:03}'.format(i)
-            headers = list(self.structs)[0]
-            for header in self.struct_headers().fields:
-                header = header.header
-                if self.skip_ethernet_ip and header.type == Ethernet_IP_Dummy.type:
-                    self.log.debug('skipping ethernet ip dummy')
-                    continue
-                if self.skip_ethernet and header.type == Ethernet.type:
-                    self.log.debug('skipping ethernet')
-                    continue
-                if self.skip_ip and header.type == IPv4.type:
-                    self.log.debug('skipping ipv4')
-                    continue
-                if self.add_uninteresting and header.type == Uninteresting.type:
-                    self.log.debug('skipping uninteresting')
-                    continue
-                for field in header.fields:
-                    if not field.bits == match_key_size:
-                        continue
-                    self.available_fields.append((header, field))
-
-            if len(self.available_fields) < number_match_keys:
-                self.log.fatal('Not enough available match fields of {} bits found {} for mat({} required)'.format(
-                    match_key_size, len(self.available_fields), number_match_keys))
-                sys.exit(1)
-            all_keys = [p4.table.TableKey(avail[0], avail[1], match_type)
-                    for avail in self.available_fields]
-            keys = all_keys[:number_match_keys]
-            if match_last:
-                all_keys.reverse()
-                keys = all_keys[:number_match_keys]
-                keys.reverse()
-            table = pipeline.add_table(
-                name,
-                actions,
-                keys,
-                default_action=default_action, # TODO potential value of default action
-                size=number_table_entries
-            )
+        catalog = self.field_catalog()
+        available_count = catalog.count(match_key_size)
+        if number_tables and available_count < number_match_keys:
+            self.log.fatal('Not enough available match fields of {} bits found {} for mat({} required)'.format(
+                match_key_size, available_count, number_match_keys))
+            sys.exit(1)
+        if key_strategy is None:
+            key_strategy = 'last' if match_last else 'first'
+        keys = [p4.table.TableKey(view.parent, view.spec, match_type)
+                for view in select_keys(catalog, match_key_size, number_match_keys,
+                                        key_strategy, key_seed)]
+        tables = pipeline.add_tables(
+            [('table_benchmark{:03}'.format(i), keys) for i in range(number_tables)],
+            actions,
+            default_action=default_action, # TODO potential value of default action
+            size=number_table_entries
+        )
+        for table in tables:
             table_apply = p4.statement.ApplyTable(table, target=self.target)
-            for _ in range(repeat_apply_tables):
-                pipeline.sequence.append(table_apply)
+            pipeline.sequence.extend([table_apply] * repeat_apply_tables)
         if number_tables == 0:
             # outgoing port is normally set in action, set here
             pipeline.sequence.append(Statement('{}()'.format(default_action.name)))
 
-        # header field mods
-        if len(self.available_fields) < header_field_modifies:
+        # header field mods, each field is modified once
+        if available_count < header_field_modifies:
             self.log.fatal('Not enough available match fields found for header updates {} ({} required)'.format(
-                len(self.available_fields), header_field_modifies))
+                available_count, header_field_modifies))
             sys.exit(1)
-        for i in range(header_field_modifies):
-            mod_header= p4.statement.ModifyHeader(self.available_fields[i][1], 0xff)
+        for field in catalog.fields(match_key_size)[:header_field_modifies]:
+            mod_header= p4.statement.ModifyHeader(field, 0xff)
             pipeline.sequence.append(mod_header)
 
         # set deparser headers valid
         for header in self.deparser_headers:
             stmt = p4.statement.SetHeaderValid(header, target=self.target)
             pipeline.sequence.append(stmt)
+        self._key_fragment('controls', self.controls)
 
     def generate_controller(self):
         self.log.info('generate_controller()')
+
+def _generic_header(fields, target, i, type_=None):
+    ''' Return generic header i of the parser tree. '''
+    return p4.header.Header('h{:03}'.format(i), type=type_, fields=fields, target=target)
+
+def _generic_header_name(i):
+    return 'h.h{:03}'.format(i)
+
+def _generic_struct_field(generic_header, target, i):
+    ''' Return the headers struct field of generic header i. '''
+    header = generic_header(i)
+    return p4.struct.StructField(header, header.name, target=target)
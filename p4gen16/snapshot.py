@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+'''
+Compact snapshots of generated programs (and their controllers and target
+utilities), e.g. kept on disk or handed to worker processes. Snapshots are
+pickles, load trusted ones only.
+'''
+import pickle
+
+# bumped on incompatible changes of the IR
+VERSION = 4
+PROTOCOL = 5
+
+def dumps(obj):
+    ''' Return a snapshot of obj (and everything it references). '''
+    return pickle.dumps((VERSION, obj), protocol=PROTOCOL)
+
+def loads(data):
+    ''' Return the object of a snapshot. '''
+    version, obj = pickle.loads(data)
+    if version != VERSION:
+        raise ValueError('snapshot version {} is not supported (expected {})'.format(
+            version, VERSION))
+    return obj
+
+def dump(obj, file_):
+    ''' Write a snapshot of obj to a binary file-like object. '''
+    file_.write(dumps(obj))
+
+def load(file_):
+    ''' Return the object of the snapshot read from a binary file-like object. '''
+    return loads(file_.read())
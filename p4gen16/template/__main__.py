@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+Precompile all templates into the bytecode cache, see
+p4gen16.types.templateable.get_bytecode_cache for its location.
+"""
+import logging
+import sys
+
+from ..types import templateable
+
+def main():
+    """ Wrapper for script content. """
+    logging.basicConfig(level=logging.INFO)
+    for name in templateable.precompile():
+        logging.info('compiled %s', name)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,9 +6,11 @@ from . import action
 from . import common
 from . import control
 from . import header
+from . import lazy
 from . import parameter
 from . import parser
 from . import statement
 from . import struct
 from . import table
+from . import targets
 from . import templateable
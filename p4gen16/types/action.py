@@ -8,6 +8,7 @@ from .statement import Statement
 
 class Action(Templateable):
     ''' An action. '''
+    __slots__ = ('name', 'parameter', 'statements')
     # pylint: disable=too-few-public-methods
     def __init__(self, name, parameters=None, statements=None, **kwargs):
         super().__init__(**kwargs)
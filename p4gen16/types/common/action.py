@@ -5,17 +5,11 @@ P4 common actions
 from .. import action
 from .. import parameter
 from .. import statement
-from ..v1model import action as v1model
-from ..sume_switch import action as sume_switch
+from .. import targets
 
 def drop(target):
     ''' Selects action drop implementation based on target. '''
-    actions = {}
-    default = action.Action('drop')
-    # known architectures and their drop implementation:
-    actions['v1model'] = v1model.drop
-    actions['sume_switch'] = sume_switch.drop
-    return actions.get(target, default)
+    return targets.get(target, 'action.drop') or action.Action('drop')
 
 def set_id(target):
     ''' Selects action set_id implementation based on target. '''
@@ -29,27 +23,14 @@ def set_id(target):
 
 def set_egress_port(target):
     ''' Selects action set_egress_port implementation based on target. '''
-    actions = {}
-    default = action.Action('set_egress_port')
-    # known architectures and their drop implementation:
-    actions['v1model'] = v1model.set_egress_port
-    actions['sume_switch'] = sume_switch.set_egress_port
-    return actions.get(target, default)
+    return targets.get(target, 'action.set_egress_port') or action.Action('set_egress_port')
 
 def set_fixed_egress_port(target, port):
     ''' Selects action set_egress_port with fixed port,
     implementation based on target. '''
-    actions = {}
-    # known architectures and their drop implementation:
-    actions['v1model'] = v1model.set_fixed_egress_port
-    #actions['sume_switch'] = sume_switch.set_fixed_egress_port
-    return actions.get(target)(port)
+    return targets.lookup(target, 'action.set_fixed_egress_port')(port)
 
 def scale_action_data(target, port, num):
     ''' Selects action scale_action_data with fixed port and num action datas,
     implementation based on target. '''
-    actions = {}
-    # known architectures and their drop implementation:
-    actions['v1model'] = v1model.scale_action_data
-    #actions['sume_switch'] = sume_switch.set_fixed_egress_port
-    return actions.get(target)(port, num)
+    return targets.lookup(target, 'action.scale_action_data')(port, num)
@@ -6,8 +6,9 @@ P4 types
 
 import collections
 from .action import Action
+from . import targets
 from .parameter import Parameter
-from .templateable import Templateable
+from .templateable import Templateable, check_instances
 from .statement import Statement, Instantiation
 from .table import Table
 
@@ -24,6 +25,11 @@ class Control(Templateable):
                 that=decl.__class__.__name__))
         setattr(self, name, decl)
 
+    def declarations(self):
+        ''' Return the declarations of this control (name -> ControlBlock). '''
+        return {name: decl for name, decl in vars(self).items()
+                if isinstance(decl, ControlBlock)}
+
 class ControlBlock(Templateable):
     ''' A control block. '''
     pass
@@ -59,12 +65,8 @@ class ControlFlow(ControlBlock):
             sequence = []
         self.sequence = sequence
 
-        for value in self._types:
-            for entry in getattr(self, value):
-                if not isinstance(entry, self._types[value]):
-                    raise TypeError('{this} is not an instance of {that}'.format(
-                        this=entry.__class__.__name__,
-                        that=self._types[value].__name__))
+        for value, type_ in self._types.items():
+            check_instances(getattr(self, value), type_)
 
     def _template_name(self):
         return 'ControlFlow' + self._jinja2_suffix
@@ -82,6 +84,15 @@ class ControlFlow(ControlBlock):
         self.tables.append(table)
         return table
 
+    def add_tables(self, specs, actions, size=512, default_action=None):
+        ''' Add a table per (name, keys) in specs, all with the same actions,
+            size and default action. Returns the new tables.
+        '''
+        tables = Table.bulk(specs, actions, size=size, default_action=default_action)
+        self.log.info('add_tables([%s], [%s])', len(tables), len(actions))
+        self.tables.extend(tables)
+        return tables
+
     def add_action(self, action):
         if not isinstance(action, self._types['actions']):
             raise TypeError('action is not an instance of Action')
@@ -102,12 +113,4 @@ class ControlDeparse(ControlBlock):
 
 def make_deparser(*args, **kwargs):
     ''' Returns a parser for the given target (or a KeyError if unknown). '''
-    # XXX cyclic import if global
-    from .v1model import control as v1model
-    from .sume_switch import control as sume_switch
-    options = {
-        'v1model': v1model.V1ModelControlDeparse,
-        'sume_switch': sume_switch.SumeSwitchControlDeparse,
-    }
-    deparser = options[kwargs['target']]
-    return deparser(*args, **kwargs)
+    return targets.lookup(kwargs['target'], 'deparser')(*args, **kwargs)
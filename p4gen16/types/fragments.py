@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+'''
+Cache of rendered fragments (structs, parser, controls), shared by program
+variants (e.g. of a parameter sweep) and, on disk, by runs.
+'''
+import os
+import tempfile
+
+class FragmentCache():
+    ''' Rendered output keyed by Templateable._fragment_key, kept in memory
+        and optionally in a directory.
+    '''
+    def __init__(self, directory=None):
+        self._memory = {}
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        # shard by the first byte, keeps directories small
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        ''' Return the fragment stored for key, or None. '''
+        try:
+            fragment = self._memory[key]
+        except KeyError:
+            fragment = None
+            if self.directory:
+                try:
+                    with open(self._path(key), 'rt') as file_:
+                        fragment = file_.read()
+                    self._memory[key] = fragment
+                except FileNotFoundError:
+                    pass
+        if fragment is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return fragment
+
+    def put(self, key, fragment):
+        ''' Store the fragment for key. '''
+        self._memory[key] = fragment
+        if not self.directory:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write and rename, concurrent generators may share the directory
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wt') as file_:
+            file_.write(fragment)
+        os.replace(tmp, path)
+
+    def generate(self, key, chunks):
+        ''' Yield chunks, their concatenation is stored for key once all
+            were consumed.
+        '''
+        consumed = []
+        for chunk in chunks:
+            consumed.append(chunk)
+            yield chunk
+        self.put(key, ''.join(consumed))
+
+    def clear(self):
+        ''' Drop all fragments kept in memory. '''
+        self._memory.clear()
@@ -2,11 +2,13 @@
 '''
 P4 header types
 '''
-import collections
-from .templateable import Templateable
+from .templateable import Templateable, check_instances, make_config, register_emitter
 
 class HeaderField(Templateable):
-    ''' A header field. '''
+    ''' A header field specification. Immutable, thus shared by all headers
+        using it; HeaderFieldView binds it to a particular header.
+    '''
+    __slots__ = ('bits', 'required_bytes', 'name')
     # pylint: disable=too-few-public-methods
     def __init__(self, bits, name, **kwargs):
         super().__init__(**kwargs)
@@ -16,19 +18,56 @@ class HeaderField(Templateable):
         if not isinstance(name, str):
             raise TypeError('{that} is not an instance of str'.format(
                 that=name.__class__.__name__))
-        self.bits = bits
-        self.required_bytes = self.bits // 8 + (1 if self.bits % 8 else 0)
-        self.name = name
-        self.parent = None
+        object.__setattr__(self, 'bits', bits)
+        object.__setattr__(self, 'required_bytes', bits // 8 + (1 if bits % 8 else 0))
+        object.__setattr__(self, 'name', name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('HeaderField is immutable')
 
-    def set_parent(self, parent):
+class HeaderFieldView():
+    ''' A field of a particular header, i.e. a (header, field spec) pair. '''
+    __slots__ = ('parent', 'spec')
+    def __init__(self, parent, spec):
         if not isinstance(parent, Header):
             raise TypeError('{that} is not an instance of Header'.format(
                 that=parent.__class__.__name__))
+        if not isinstance(spec, HeaderField):
+            raise TypeError('{that} is not an instance of HeaderField'.format(
+                that=spec.__class__.__name__))
         self.parent = parent
+        self.spec = spec
+
+    @property
+    def name(self): # pylint: disable=missing-docstring
+        return self.spec.name
+
+    @property
+    def bits(self): # pylint: disable=missing-docstring
+        return self.spec.bits
+
+    @property
+    def required_bytes(self): # pylint: disable=missing-docstring
+        return self.spec.required_bytes
+
+    def __eq__(self, other):
+        return (isinstance(other, HeaderFieldView)
+                and self.parent is other.parent and self.spec is other.spec)
+
+    def __hash__(self):
+        return hash((id(self.parent), id(self.spec)))
+
+    def __str__(self):
+        return str(self.spec)
+
+def _emit_header_field(this):
+    return 'bit<{}> {}'.format(this.bits, this.name)
+
+register_emitter('HeaderField.p4.j2', _emit_header_field)
 
 class Header(Templateable):
     ''' A header. '''
+    __slots__ = ('name', 'type', '_fields')
     def __init__(self, name, type=None, fields=None, **kwargs):
         # pylint: disable=redefined-builtin
         super().__init__(**kwargs)
@@ -40,7 +79,7 @@ class Header(Templateable):
             self.type = name + '_t'
         else:
             self.type = type
-        self._fields = collections.OrderedDict()
+        self._fields = {} # insertion ordered, smaller than OrderedDict
         if fields:
             self.fields = fields
 
@@ -50,9 +89,9 @@ class Header(Templateable):
 
     @fields.setter
     def fields(self, fields):
-        self._fields = collections.OrderedDict()
-        for field in fields:
-            self.add_field(field)
+        fields = list(fields)
+        check_instances(fields, HeaderField)
+        self._fields = {field.name: field for field in fields}
 
     def add_field(self, field):
         ''' Add a new field to this header. '''
@@ -60,4 +99,33 @@ class Header(Templateable):
             raise TypeError('{that} is not an instance of HeaderField'.format(
                 that=field.__class__.__name__))
         self._fields[field.name] = field
-        field.set_parent(self)
+        self._changed()
+
+    @classmethod
+    def bulk(cls, names, fields, type=None, **kwargs):
+        ''' Return a header per name, all with the given fields (and type,
+            name_t if not given); names and fields are validated once for all
+            headers.
+        '''
+        # pylint: disable=redefined-builtin
+        names = list(names)
+        check_instances(names, str)
+        fields = list(fields)
+        check_instances(fields, HeaderField)
+        fields = {field.name: field for field in fields}
+        config = make_config(**kwargs)
+        headers = [
+            cls._new_unchecked(config, name=name, type=type or name + '_t', _fields=dict(fields))
+            for name in names]
+        return headers
+
+    def field(self, name):
+        ''' Return the field name of this header as HeaderFieldView. '''
+        return HeaderFieldView(self, self._fields[name])
+
+    def field_views(self):
+        ''' Yield all fields of this header as HeaderFieldViews (created on
+            demand, field specs are shared between headers).
+        '''
+        for field in self._fields.values():
+            yield HeaderFieldView(self, field)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+'''
+Lazy sequences of IR nodes, created on demand (e.g. while rendering), and
+lazily imported modules.
+'''
+import collections.abc
+import importlib.util
+import itertools
+import sys
+
+def lazy_import(name):
+    ''' Return module name, imported on first attribute access (keeps the
+        startup of short runs fast).
+    '''
+    try:
+        return sys.modules[name]
+    except KeyError:
+        pass
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError('No module named {!r}'.format(name), name=name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+class LazySequence(collections.abc.Sequence):
+    ''' A read-only sequence of length elements, element i is created by
+        factory(start + i) on each access. key identifies the content (used
+        for its repr), e.g. the factory's parameters.
+    '''
+    __slots__ = ('_length', '_factory', '_start', 'key')
+    def __init__(self, length, factory, key, start=0):
+        if not isinstance(length, int):
+            raise TypeError('{that} is not an instance of int'.format(
+                that=length.__class__.__name__))
+        self._length = max(0, length)
+        self._factory = factory
+        self._start = start
+        self.key = key
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._factory(self._start + i)
+                    for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('LazySequence index out of range')
+        return self._factory(self._start + index)
+
+    def __iter__(self):
+        return map(self._factory, range(self._start, self._start + self._length))
+
+    def __repr__(self):
+        return 'LazySequence({!r})'.format(self.key)
+
+class Concat(collections.abc.Sequence):
+    ''' A read-only concatenation of sequences. '''
+    __slots__ = ('_sequences',)
+    def __init__(self, *sequences):
+        self._sequences = [sequence for sequence in sequences if len(sequence)]
+
+    def __len__(self):
+        return sum(len(sequence) for sequence in self._sequences)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for sequence in self._sequences:
+                if index < len(sequence):
+                    return sequence[index]
+                index -= len(sequence)
+        raise IndexError('Concat index out of range')
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._sequences)
+
+    def __repr__(self):
+        return 'Concat({})'.format(', '.join(repr(sequence) for sequence in self._sequences))
+
+def flatten(values):
+    ''' Return values (e.g. of a dict holding both nodes and LazySequences of
+        nodes) as one sequence, LazySequences expanded in place.
+    '''
+    runs = []
+    for value in values:
+        if isinstance(value, LazySequence):
+            runs.append(value)
+        elif runs and isinstance(runs[-1], list):
+            runs[-1].append(value)
+        else:
+            runs.append([value])
+    return Concat(*runs)
@@ -2,10 +2,11 @@
 '''
 P4 parameter type
 '''
-from .templateable import Templateable
+from .templateable import Templateable, register_emitter
 
 class Parameter(Templateable):
     ''' A parameter. '''
+    __slots__ = ('type', 'name', 'size')
     # pylint: disable=too-few-public-methods
     def __init__(self, type_, name, size=0, **kwargs): # pylint: disable=redefined-builtin
         super().__init__(**kwargs)
@@ -18,3 +19,8 @@ class Parameter(Templateable):
                 that=name.__class__.__name__))
         self.name = name
         self.size = size
+
+def _emit_parameter(this):
+    return '{} {}'.format(this.type, this.name)
+
+register_emitter('Parameter.p4.j2', _emit_parameter)
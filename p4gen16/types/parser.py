@@ -3,12 +3,17 @@
 P4 types
 '''
 import collections
+import copy
+import functools
 import warnings
+from .lazy import LazySequence, flatten
+from . import targets
 from .parameter import Parameter
-from .templateable import Templateable
+from .templateable import Templateable, TrackedList, make_config
 
 class ParserStateTransition(Templateable):
     ''' A parser state transition. '''
+    __slots__ = ('expr', 'next')
     # pylint: disable=too-few-public-methods
     def __init__(self, expr, next, **kwargs): # pylint: disable=redefined-builtin
         super().__init__(**kwargs)
@@ -23,6 +28,8 @@ class ParserStateTransition(Templateable):
 
 class ParserState(Templateable):
     ''' A parser state. '''
+    __slots__ = ('header', 'field', 'name', 'is_end', '_transitions', 'extract_extra',
+                 'extract_extra_after')
     def __init__(self, header, field, transitions=None, is_start=False,
                  extract_extra=None, extract_extra_after=None, **kwargs):
         super().__init__(**kwargs)
@@ -39,7 +46,7 @@ class ParserState(Templateable):
         else:
             self.name = 'parse_' + self.header
         self.is_end = not transitions
-        self._transitions = collections.OrderedDict()
+        self._transitions = {} # insertion ordered, smaller than OrderedDict
         if transitions:
             self.transitions = transitions
         self.extract_extra = extract_extra
@@ -51,7 +58,7 @@ class ParserState(Templateable):
 
     @transitions.setter
     def transitions(self, transitions):
-        self._transitions = collections.OrderedDict()
+        self._transitions = {}
         for transition in transitions:
             self.add_transition(transition)
 
@@ -61,6 +68,41 @@ class ParserState(Templateable):
             raise TypeError('{that} is not an instance of ParserStateTransition'.format(
                 that=transition.__class__.__name__))
         self._transitions[transition.expr] = transition
+        self._changed()
+
+def nodes_in_tree(b, h):
+    '''
+    Return number of nodes in tree width height h and branching factor b
+    '''
+    return int((b ** h - 1) / (b - 1)) if b > 1 and h > 0 else max(0, h)
+
+def _tree_state(config, branching_factor, header_count, internal_node_count, field_size,
+                i, extract_extra=None, extract_extra_after=None):
+    ''' Return parser state i of a parse tree, linked to its children. '''
+    # pylint: disable=too-many-arguments
+    # arguments are generated, skip the checks of __init__
+    transitions = {}
+    if i < internal_node_count:
+        for j in range(1, branching_factor):
+            expr = '{}w{}'.format(field_size, j)
+            transitions[expr] = ParserStateTransition._new_unchecked(
+                config, expr=expr, next='parse_h{:03}'.format(i * branching_factor + j))
+        next_ = branching_factor * (i + 1)
+        if next_ < header_count:
+            # XXX explicitly set default next header
+            transitions['default'] = ParserStateTransition._new_unchecked(
+                config, expr='default', next='parse_h{:03}'.format(next_))
+    header = 'h{:03}'.format(i)
+    return ParserState._new_unchecked(
+        config,
+        header=header,
+        field='f{:03}'.format(0), # select, XXX fixed selected field
+        name='start' if i == 0 else 'parse_' + header,
+        is_end=not transitions,
+        _transitions=transitions,
+        extract_extra=TrackedList(extract_extra or []),
+        extract_extra_after=TrackedList(extract_extra_after or []),
+    )
 
 class Parser(Templateable):
     ''' A parser. '''
@@ -69,6 +111,7 @@ class Parser(Templateable):
         # pylint: disable=too-many-arguments
         super().__init__(**kwargs)
         self._states = collections.OrderedDict()
+        self._lazy = False
         if states:
             self.states = states
         self.name = name
@@ -79,11 +122,14 @@ class Parser(Templateable):
 
     @property
     def states(self): # pylint: disable=missing-docstring
+        if self._lazy:
+            return flatten(self._states.values())
         return self._states.values()
 
     @states.setter
     def states(self, states):
         self._states = collections.OrderedDict()
+        self._lazy = False
         for state in states:
             self.add_state(state)
 
@@ -93,17 +139,89 @@ class Parser(Templateable):
             raise TypeError('{that} is not an instance of ParserState'.format(
                 that=state.__class__.__name__))
         self._states[state.header] = state
+        self._changed()
+
+    @classmethod
+    def from_tree(cls, branching_factor, stack_height, field_size=8, extract_extra=None,
+                  extract_extra_after=None, lazy=False, **kwargs):
+        ''' Return a parser for a parse tree of stack_height levels with
+            branching_factor children per state; state i parses header
+            h<i>, the start state also extracts extract_extra (before) and
+            extract_extra_after. Created in one go, or on demand (except the
+            start state) while rendering if lazy.
+        '''
+        # pylint: disable=too-many-arguments
+        parser = cls(**kwargs)
+        header_count = nodes_in_tree(branching_factor, stack_height)
+        config = make_config(target=kwargs.get('target'))
+        # link parser states, leafs of parser tree are final states
+        state = functools.partial(
+            _tree_state, config, branching_factor,
+            header_count, nodes_in_tree(branching_factor, stack_height - 1), field_size)
+        states = collections.OrderedDict()
+        if header_count:
+            states['h000'] = state(0, extract_extra, extract_extra_after)
+        if not lazy:
+            for i in range(1, header_count):
+                states['h{:03}'.format(i)] = state(i)
+        parser._states = states
+        if lazy:
+            parser.add_lazy_states(LazySequence(
+                header_count - 1, state,
+                ('parse_h', branching_factor, header_count, field_size, config),
+                start=1))
+        return parser
+
+    @classmethod
+    def from_parser(cls, parser, **kwargs):
+        ''' Return a parser sharing the (target independent) states of parser,
+            e.g. of another target.
+        '''
+        other = cls(**kwargs)
+        # pylint: disable=protected-access
+        other._states = parser._states
+        other._lazy = parser._lazy
+        return other
+
+    def without_extracts(self, names):
+        ''' Return a parser that does not extract the extra headers names,
+            sharing all other states with this one (this parser, if none
+            extracts them).
+        '''
+        names = set(names)
+        states = [state for state in self._states.values()
+                  if isinstance(state, ParserState)
+                  and not names.isdisjoint(list(state.extract_extra or ())
+                                           + list(state.extract_extra_after or ()))]
+        if not states:
+            return self
+        other = copy.copy(self)
+        other._states = collections.OrderedDict(self._states)
+        for state in states:
+            state = copy.copy(state)
+            state.extract_extra = [name for name in state.extract_extra if name not in names]
+            state.extract_extra_after = [name for name in state.extract_extra_after
+                                         if name not in names]
+            other._states[state.header] = state
+        other._changed()
+        return other
+
+    def add_lazy_states(self, states):
+        ''' Add a LazySequence of states, created on demand, to this parser. '''
+        if not isinstance(states, LazySequence):
+            raise TypeError('{that} is not an instance of LazySequence'.format(
+                that=states.__class__.__name__))
+        self._states[states] = states
+        self._lazy = True
 
 def make_parser(*args, **kwargs):
     ''' Returns a parser for the given target (or a KeyError if the target is
         unknown).
     '''
-    from .v1model.parser import V1ModelParser
-    from .sume_switch.parser import SumeSwitchParser
-    options = {
-        'v1model': V1ModelParser,
-        'v1model_t4p4s': V1ModelParser,
-        'sume_switch': SumeSwitchParser,
-    }
-    parser = options[kwargs['target']]
-    return parser(*args, **kwargs)
+    return parser_class(kwargs['target'])(*args, **kwargs)
+
+def parser_class(target):
+    ''' Returns the parser class for the given target (or a KeyError if the
+        target is unknown).
+    '''
+    return targets.lookup(target, 'parser')
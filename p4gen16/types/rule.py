@@ -3,9 +3,12 @@
 P4 target rule types
 '''
 import collections
-import ipcalc
+from .lazy import lazy_import
 from .templateable import Templateable
 
+# only needed for L3 rules
+ipcalc = lazy_import('ipcalc')
+
 class L3Rule(Templateable):
     ''' A layer 3 rule. '''
     # pylint: disable=too-few-public-methods
@@ -95,6 +98,7 @@ class Rules(Templateable):
             raise TypeError('{that} is not an instance of L3Rule'.format(
                 that=rule.__class__.__name__))
         self._l3_rules[str(rule.address)+str(rule.table)] = rule
+        self._changed()
 
     def add_table_rule(self, rule):
         ''' Add a new rule for this target. '''
@@ -102,3 +106,4 @@ class Rules(Templateable):
             raise TypeError('{that} is not an instance of L3Rule'.format(
                 that=rule.__class__.__name__))
         self._table_rules[str(rule.address)] = rule
+        self._changed()
@@ -2,10 +2,11 @@
 '''
 P4 statement type
 '''
-from .templateable import Templateable
+from .templateable import Templateable, register_emitter
 
 class Statement(Templateable):
     ''' A statement. '''
+    __slots__ = ('statement',)
     # pylint: disable=too-few-public-methods
     def __init__(self, statement, **kwargs):
         super().__init__(**kwargs)
@@ -14,12 +15,19 @@ class Statement(Templateable):
                 that=statement.__class__.__name__))
         self.statement = statement
 
+def _emit_statement(this):
+    return '{};'.format(this.statement)
+
+register_emitter('Statement.p4.j2', _emit_statement)
+
 class Instantiation(Statement): # pylint: disable=too-few-public-methods
     ''' An instantiation. (Restricted declaration.) '''
+    __slots__ = ()
     # XXX relaxed instantiation definition
 
 class Define(Statement): # pylint: disable=too-few-public-methods
     ''' A define statement. '''
+    __slots__ = ('name',)
     # pylint: disable=too-few-public-methods
     def __init__(self, name, statement, **kwargs):
         super().__init__(statement, **kwargs)
@@ -32,50 +40,68 @@ class Define(Statement): # pylint: disable=too-few-public-methods
         self.name = name
         self.statement = statement
 
+def _emit_define(this):
+    return '#define {} {}'.format(this.name, this.statement)
+
+register_emitter('Define.p4.j2', _emit_define)
+
 class ApplyTable(Statement):
     ''' Apply a table '''
+    __slots__ = ('table',)
+    # rendered by name, the reference is kept for analyses (see cost)
+    _unrendered = frozenset(['table'])
     def __init__(self, tbl, **kwargs):
         from .table import Table
         if not isinstance(tbl, Table):
             raise TypeError('{that} is not an instance of Table'.format(
                 that=tbl.__class__.__name__))
         super().__init__(tbl.name + '.apply()', **kwargs)
+        self.table = tbl
 
     def _template_name(self):
         return 'Statement' + self._jinja2_suffix
 
 class ModifyHeader(Statement):
     ''' Modify a header value'''
+    __slots__ = ('field',)
+    _unrendered = frozenset(['field'])
     def __init__(self, field, value, **kwargs):
-        from .header import HeaderField
-        if not isinstance(field, HeaderField):
-            raise TypeError('{that} is not an instance of HeaderField'.format(
+        from .header import HeaderFieldView
+        if not isinstance(field, HeaderFieldView):
+            raise TypeError('{that} is not an instance of HeaderFieldView'.format(
                 that=field.__class__.__name__))
         super().__init__('h.' + field.parent.name + '.' + field.name + ' = ' + str(value), **kwargs)
+        self.field = field
 
     def _template_name(self):
         return 'Statement' + self._jinja2_suffix
 
 class ModifyMeta(Statement):
     ''' Modify a meta value'''
+    __slots__ = ('field',)
+    _unrendered = frozenset(['field'])
     def __init__(self, field, value, **kwargs):
         from .struct import StructField
         if not isinstance(field, StructField):
             raise TypeError('{that} is not an instance of StructField'.format(
                 that=field.__class__.__name__))
         super().__init__(field.parent + '.' + field.name + ' = ' + str(value), **kwargs)
+        self.field = field
 
     def _template_name(self):
         return 'Statement' + self._jinja2_suffix
 
 class SetHeaderValid(Statement):
     ''' set a header valid '''
+    __slots__ = ('header',)
+    _unrendered = frozenset(['header'])
     def __init__(self, hdr, **kwargs):
         from .header import Header
         if not isinstance(hdr, Header):
             raise TypeError('{that} is not an instance of str'.format(
                 that=hdr.__class__.__name__))
         super().__init__('h.' + hdr.name + '.setValid()', **kwargs)
+        self.header = hdr
 
     def _template_name(self):
         return 'Statement' + self._jinja2_suffix
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+'''
+Render statistics per template and per class.
+'''
+import json
+import time
+
+class RenderStats():
+    ''' Render count, memoized count, cumulative time, self time (excluding
+        nested renders) and output bytes per template name and per class.
+    '''
+    def __init__(self):
+        self.templates = {}
+        self.classes = {}
+        # time spent in nested renders, one entry per active render
+        self._nested = []
+
+    def enter(self):
+        ''' Mark the start of a render, returns a token for leave(). '''
+        self._nested.append(0.0)
+        return time.perf_counter()
+
+    def leave(self, token):
+        ''' Mark the end of a render, returns its (cumulative, self) time. '''
+        elapsed = time.perf_counter() - token
+        nested = self._nested.pop()
+        if self._nested:
+            self._nested[-1] += elapsed
+        return elapsed, elapsed - nested
+
+    def record(self, template, cls, elapsed=0.0, self_time=0.0, output=0, memoized=False):
+        ''' Account a render of template by an instance of cls. '''
+        # pylint: disable=too-many-arguments
+        for table, key in ((self.templates, template), (self.classes, cls)):
+            try:
+                entry = table[key]
+            except KeyError:
+                entry = table[key] = {
+                    'count': 0, 'memoized': 0, 'time': 0.0, 'self_time': 0.0, 'bytes': 0,
+                }
+            if memoized:
+                entry['memoized'] += 1
+            else:
+                entry['count'] += 1
+            entry['time'] += elapsed
+            entry['self_time'] += self_time
+            entry['bytes'] += output
+
+    def as_dict(self):
+        ''' Return all statistics, sorted by name. '''
+        return {
+            'templates': dict(sorted(self.templates.items())),
+            'classes': dict(sorted(self.classes.items())),
+        }
+
+    def dump(self, file_):
+        ''' Write all statistics as JSON to a file-like object. '''
+        json.dump(self.as_dict(), file_, indent=2)
+        file_.write('\n')
@@ -2,12 +2,13 @@
 '''
 P4 struct types
 '''
-import collections
-from .templateable import Templateable
+from .templateable import Templateable, check_instances, make_config, register_emitter
 from .header import Header
+from .lazy import LazySequence, flatten
 
 class StructField(Templateable):
     ''' A struct field. '''
+    __slots__ = ('name', 'header', 'type', 'parent')
     # pylint: disable=too-few-public-methods
     def __init__(self, type_, name, **kwargs): # pylint: disable=redefined-builtin
         super().__init__(**kwargs)
@@ -27,35 +28,60 @@ class StructField(Templateable):
             self.name = name
         self.parent = None
 
+    @classmethod
+    def bulk(cls, headers, **kwargs):
+        ''' Return a field per header, named after it; headers are validated
+            once for all fields.
+        '''
+        headers = list(headers)
+        check_instances(headers, Header)
+        config = make_config(**kwargs)
+        fields = [
+            cls._new_unchecked(config, name=header.name, header=header, type=header.type,
+                               parent=None)
+            for header in headers]
+        return fields
+
     def set_parent(self, parent):
         if not isinstance(parent, str):
             raise TypeError('{that} is not an instance of str'.format(
                 that=parent.__class__.__name__))
         self.parent = parent
 
+def _emit_struct_field(this):
+    return '{} {}'.format(this.type, this.name)
+
+register_emitter('StructField.p4.j2', _emit_struct_field)
+
 class Struct(Templateable):
     ''' A struct. '''
+    __slots__ = ('name', '_fields', '_lazy', '_fragment')
     def __init__(self, name, fields=None, **kwargs):
         super().__init__(**kwargs)
         if not isinstance(name, str):
             raise TypeError('{that} is not an instance of str'.format(
                 that=name.__class__.__name__))
         self.name = name
-        self._fields = collections.OrderedDict()
+        self._fields = {} # insertion ordered, smaller than OrderedDict
+        self._lazy = False
         if fields:
             self.fields = fields
 
     @property
     def fields(self): # pylint: disable=missing-docstring
+        if self._lazy:
+            return flatten(self._fields.values())
         return self._fields.values()
 
     def get_fields(self): # pylint: disable=missing-docstring
-        return self._fields.values()
+        return self.fields
 
     @fields.setter
     def fields(self, fields):
-        for field in fields:
-            self.add_field(field)
+        fields = list(fields)
+        check_instances(fields, StructField)
+        self._fields.update((field.name, field) for field in fields)
+        self._changed()
 
     def add_field(self, field):
         ''' Add a new field to this struct. '''
@@ -63,3 +89,19 @@ class Struct(Templateable):
             raise TypeError('{that} is not an instance of StructField'.format(
                 that=field.__class__.__name__))
         self._fields[field.name] = field
+        self._changed()
+
+    def remove_fields(self, names):
+        ''' Remove the fields names from this struct. '''
+        names = set(names)
+        # rebound, not modified in place: copies of this struct share the dict
+        self._fields = {name: field for name, field in self._fields.items()
+                        if name not in names}
+
+    def add_lazy_fields(self, fields):
+        ''' Add a LazySequence of fields, created on demand, to this struct. '''
+        if not isinstance(fields, LazySequence):
+            raise TypeError('{that} is not an instance of LazySequence'.format(
+                that=fields.__class__.__name__))
+        self._fields[fields] = fields
+        self._lazy = True
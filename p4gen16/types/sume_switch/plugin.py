@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+'''
+sume_switch target plugin, see types.targets
+'''
+from . import action
+from . import register
+from .control import SumeSwitchControlDeparse
+from .parser import SumeSwitchParser
+
+OPERATIONS = {
+    'register.declare': register.declare,
+    'register.read': register.read,
+    'register.write': register.write,
+    'parser': SumeSwitchParser,
+    'deparser': SumeSwitchControlDeparse,
+    'action.drop': action.drop,
+    'action.set_egress_port': action.set_egress_port,
+}
@@ -2,12 +2,15 @@
 '''
 P4 table types
 '''
-from .templateable import Templateable
+import warnings
+from .templateable import (Templateable, TrackedList, check_instances, make_config,
+                           register_emitter)
 from .header import Header, HeaderField
 from .action import Action
 
 class TableKey(Templateable):
     ''' A table key. '''
+    __slots__ = ('header', 'field', 'match_kind')
     # pylint: disable=too-few-public-methods
     _types = ['exact', 'lpm', 'ternary', 'NoAction']
     def __init__(self, header, field, match_kind, **kwargs):
@@ -28,8 +31,14 @@ class TableKey(Templateable):
         self.field = field
         self.match_kind = match_kind
 
+def _emit_table_key(this):
+    return 'h.{}.{}: {};'.format(this.header.name, this.field.name, this.match_kind)
+
+register_emitter('TableKey.p4.j2', _emit_table_key)
+
 class Table(Templateable):
     ''' A table. '''
+    __slots__ = ('name', 'keys', 'actions', 'size', 'default_action')
     # pylint: disable=too-few-public-methods
     def __init__(self, name, keys=None, actions=None, size=None, default_action=None,
                  **kwargs):
@@ -68,3 +77,29 @@ class Table(Templateable):
             warnings.warn('Table "{name}": default action not in actions list'.format(
                 name=name))
         self.default_action = default_action
+
+    @classmethod
+    def bulk(cls, specs, actions, size=None, default_action=None, **kwargs):
+        ''' Return a table per (name, keys) in specs, all with the same
+            actions, size and default action; validated once for all tables.
+        '''
+        specs = list(specs)
+        check_instances([name for name, _ in specs], str)
+        check_instances([key for _, keys in specs for key in keys], TableKey)
+        actions = list(actions)
+        check_instances(actions, Action)
+        if not isinstance(size, int):
+            raise TypeError('size is not an instance of int')
+        if not isinstance(default_action, Action):
+            raise TypeError('{that} is not an instance of Action'.format(
+                that=default_action.__class__.__name__))
+        if specs and default_action not in actions:
+            warnings.warn('Table "{name}" (and {count} more): default action not in '
+                          'actions list'.format(name=specs[0][0], count=len(specs) - 1))
+        config = make_config(**kwargs)
+        tables = [
+            cls._new_unchecked(config, name=name, keys=TrackedList(keys),
+                               actions=TrackedList(actions), size=size,
+                               default_action=default_action)
+            for name, keys in specs]
+        return tables
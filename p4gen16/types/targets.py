@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+'''
+Target plugins: modules providing the target dependent operations (register
+declare/read/write, parser, deparser, actions, ...) of a target. A plugin is
+imported on first use, each (target, operation) is resolved once.
+'''
+import importlib
+
+# target -> (plugin module name, base target or None)
+_plugins = {}
+# (target, operation) -> implementation or _MISSING
+_dispatch = {}
+_MISSING = object()
+
+def register_target(target, module, base=None):
+    ''' Register the plugin module (name) of target. Its OPERATIONS dict
+        maps operation names to implementations; operations it lacks are
+        looked up in the plugin of base.
+    '''
+    _plugins[target] = (module, base)
+    _dispatch.clear()
+
+def _resolve(target, operation):
+    try:
+        module, base = _plugins[target]
+    except (KeyError, TypeError):
+        return _MISSING
+    operations = importlib.import_module(module).OPERATIONS
+    if operation in operations:
+        return operations[operation]
+    if base is None:
+        return _MISSING
+    return _resolve(base, operation)
+
+def is_registered(target):
+    ''' Return whether target (e.g. 'v1model/t4p4s') has a plugin. '''
+    return target in _plugins
+
+def lookup(target, operation):
+    ''' Return the implementation of operation for target (or a KeyError if
+        either is unknown).
+    '''
+    key = (target, operation)
+    try:
+        implementation = _dispatch[key]
+    except KeyError:
+        implementation = _dispatch[key] = _resolve(target, operation)
+    except TypeError: # unhashable target
+        implementation = _MISSING
+    if implementation is _MISSING:
+        raise KeyError(key)
+    return implementation
+
+def get(target, operation, default=None):
+    ''' Return the implementation of operation for target, or default. '''
+    try:
+        return lookup(target, operation)
+    except KeyError:
+        return default
+
+register_target('v1model', 'p4gen16.types.v1model.plugin')
+register_target('v1model/t4p4s', 'p4gen16.types.v1model.t4p4s.plugin', base='v1model')
+# former name of the t4p4s sub-target
+register_target('v1model_t4p4s', 'p4gen16.types.v1model.t4p4s.plugin', base='v1model')
+register_target('sume_switch', 'p4gen16.types.sume_switch.plugin')
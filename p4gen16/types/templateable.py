@@ -2,65 +2,704 @@
 '''
 P4 types
 '''
+import collections.abc
+import importlib
 import os.path
-import jinja2
 import logging
 
+from .lazy import lazy_import
+from .stats import RenderStats
+
+# imported on first use, not needed by runs that render nothing (in parallel)
+hashlib = lazy_import('hashlib')
+jinja2 = lazy_import('jinja2')
+multiprocessing = lazy_import('multiprocessing')
+
+_DELIMITERS = {
+    'default': {'bs': '{%', 'be': '%}', 'vs': '{{', 've': '}}'},
+    'c': {'bs': '@@', 'be': '@@', 'vs': '@=', 've': '=@'},
+}
+
+# process-wide caches, keyed by (module, templates, delimiter) resp.
+# (module, templates, delimiter, filename)
+_environments = {}
+_templates = {}
+
+# on-disk cache of compiled templates, shared between runs; jinja2 compares
+# the checksum of the template source and recompiles changed templates
+BYTECODE_CACHE_ENV = 'P4GEN16_BYTECODE_CACHE'
+_bytecode_caches = {}
+
+def get_bytecode_cache(delimiter):
+    ''' Return the bytecode cache, configured by $P4GEN16_BYTECODE_CACHE:
+        unset uses jinja2's default (per-user temporary directory), an empty
+        value disables the cache and any other value names its directory.
+    '''
+    # jinja2 keys compiled templates by name and source only, so templates
+    # compiled with different delimiters are kept in separate files
+    try:
+        return _bytecode_caches[delimiter]
+    except KeyError:
+        pass
+    directory = os.environ.get(BYTECODE_CACHE_ENV)
+    cache = None
+    if directory != '':
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        cache = jinja2.FileSystemBytecodeCache(
+            directory, pattern='__p4gen16_' + delimiter + '_%s.cache')
+    _bytecode_caches[delimiter] = cache
+    return cache
+
+def get_environment(module, templates, delimiter):
+    ''' Return the (cached) jinja2 environment for a template directory. '''
+    key = (module, templates, delimiter)
+    try:
+        return _environments[key]
+    except KeyError:
+        pass
+    try:
+        delim = _DELIMITERS[delimiter]
+    except KeyError:
+        logging.fatal('unknown delimiter: %s', delimiter)
+        raise
+    _loader = jinja2.ChoiceLoader([
+        jinja2.PackageLoader(module, os.path.join('template', templates)),
+        jinja2.PackageLoader(module, os.path.join('template', 'default')),
+        ])
+    _env = jinja2.Environment(
+        line_statement_prefix='#%',
+        loader=_loader,
+        block_start_string=delim['bs'],
+        block_end_string=delim['be'],
+        variable_start_string=delim['vs'],
+        variable_end_string=delim['ve'],
+        bytecode_cache=get_bytecode_cache(delimiter),
+    )
+    _env.filters['drop'] = _sequence_drop
+    _env.filters['stream'] = _stream
+    _env.filters['rendered'] = _rendered
+    _env.filters['safe_first'] = _sequence_safe_first
+    _environments[key] = _env
+    return _env
+
+def get_template(module, templates, delimiter, filename):
+    ''' Return the (cached) jinja2 template object for a template file. '''
+    key = (module, templates, delimiter, filename)
+    try:
+        return _templates[key]
+    except KeyError:
+        pass
+    template = get_environment(module, templates, delimiter).get_template(filename)
+    _templates[key] = template
+    return template
+
+# string building replacements for the default templates of high-volume
+# leaf types (single line of P4), used instead of jinja2 if selected
+EMITTERS = ['jinja2', 'native']
+_emitter = 'jinja2'
+_native_emitters = {}
+_native = {}
+
+def register_emitter(filename, emit):
+    ''' Register a native emitter emit(this) -> str that produces the same
+        output as the default template filename.
+    '''
+    _native_emitters[filename] = emit
+
+def set_emitter(emitter):
+    ''' Select the emitter backend ('jinja2' or 'native'). '''
+    global _emitter # pylint: disable=global-statement
+    if emitter not in EMITTERS:
+        raise ValueError('unknown emitter: {}'.format(emitter))
+    _emitter = emitter
+
+def get_native_emitter(module, templates, delimiter, filename):
+    ''' Return the native emitter for a template file, or None if there is
+        none or the template is overridden by the target.
+    '''
+    key = (module, templates, delimiter, filename)
+    try:
+        return _native[key]
+    except KeyError:
+        pass
+    emit = _native_emitters.get(filename)
+    if emit is not None:
+        path = os.path.dirname(get_template(*key).filename)
+        if not os.path.normpath(path).endswith(os.path.join('template', 'default')):
+            emit = None
+    _native[key] = emit
+    return emit
+
+# parallel rendering of long sequences of blocks (tables, parser states);
+# forked workers share the IR with the parent, spawned ones get pickled chunks
+PARALLEL_MIN_ITEMS = 256
+_jobs = 1
+_parallel_items = None
+
+def set_jobs(jobs):
+    ''' Set the number of worker processes used for rendering (0: one per
+        CPU).
+    '''
+    global _jobs # pylint: disable=global-statement
+    if jobs < 0:
+        raise ValueError('invalid number of jobs: {}'.format(jobs))
+    _jobs = jobs or os.cpu_count() or 1
+
+def _init_worker(emitter, render_target):
+    global _jobs, _emitter, _render_target # pylint: disable=global-statement
+    _jobs = 1
+    _emitter = emitter
+    _render_target = render_target
+
+def _render_range(bounds):
+    start, stop = bounds
+    return [str(item) for item in _parallel_items[start:stop]]
+
+def _render_items(items):
+    return [str(item) for item in items]
+
+def render_parallel(items):
+    ''' Yield str(item) for all items in order, rendered by worker processes
+        if enabled and worthwhile.
+    '''
+    global _parallel_items # pylint: disable=global-statement
+    if not isinstance(items, collections.abc.Sequence):
+        items = list(items)
+    if _jobs < 2 or len(items) < PARALLEL_MIN_ITEMS:
+        yield from items
+        return
+    # a few chunks per worker to balance uneven items
+    size = -(-len(items) // (_jobs * 4))
+    bounds = [(i, i + size) for i in range(0, len(items), size)]
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        render, tasks = _render_range, bounds
+        _parallel_items = items
+    else:
+        context = multiprocessing.get_context()
+        render, tasks = _render_items, (items[start:stop] for start, stop in bounds)
+    try:
+        with context.Pool(_jobs, initializer=_init_worker,
+                          initargs=(_emitter, _render_target)) as pool:
+            for rendered in pool.imap(render, tasks):
+                yield from rendered
+    finally:
+        _parallel_items = None
+
+# opt-in render statistics, see enable_stats
+_stats = None
+
+def enable_stats():
+    ''' Start recording render statistics, returns the (new) RenderStats. '''
+    global _stats # pylint: disable=global-statement
+    _stats = RenderStats()
+    return _stats
+
+def disable_stats():
+    ''' Stop recording render statistics, returns the recorded RenderStats. '''
+    global _stats # pylint: disable=global-statement
+    stats, _stats = _stats, None
+    return stats
+
+def invalidate_cache():
+    ''' Drop all cached environments and templates, e.g. after templates
+        changed on disk.
+    '''
+    _environments.clear()
+    _templates.clear()
+    _bytecode_caches.clear()
+    _native.clear()
+    invalidate_renders()
+
+# memoized __str__ output: nodes rendered more than once (e.g. an ApplyTable
+# appended repeat_apply_tables times, header field specs shared by headers)
+# keep their output, nodes rendered once only a marker, so programs are not
+# held in memory as a whole. Modifications stamp the modified node (or
+# TrackedList) with the clock, memoized output is valid as long as no node
+# below its node has a later stamp. The clock advances on the first
+# modification after output was memoized, so the stamps of unmodified programs
+# all equal the clock and memoized output is checked at once. Changing the
+# templates bumps the generation and thus invalidates all memoized output.
+MEMOIZE = True
+_generation = 0
+_clock = 0
+_clock_read = False # memoized output is stamped with the current clock
+
+def invalidate_renders():
+    ''' Invalidate the memoized output of all Templateables. '''
+    global _generation # pylint: disable=global-statement
+    _generation += 1
+
+def _touch(obj):
+    ''' Stamp obj (a Templateable or TrackedList) as modified. '''
+    global _clock, _clock_read # pylint: disable=global-statement
+    if _clock_read:
+        _clock += 1
+        _clock_read = False
+    object.__setattr__(obj, '_modified', _clock)
+
+def _read_clock():
+    ''' Return the clock to stamp memoized output with. '''
+    global _clock_read # pylint: disable=global-statement
+    _clock_read = True
+    return _clock
+
+def _unmodified(node, since):
+    ''' Return whether neither node nor any node (or TrackedList) it refers
+        to, directly or indirectly, was modified after the clock since.
+    '''
+    pending = [node]
+    seen = set()
+    while pending:
+        value = pending.pop()
+        if isinstance(value, Templateable):
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            if value._modified > since: # pylint: disable=protected-access
+                return False
+            cls = value.__class__
+            try:
+                names = _walked_slots[cls]
+            except KeyError:
+                names = _walked_slots[cls] = tuple(
+                    name for name in _slots_of(cls)
+                    if name not in _OWN_SLOTS and name not in cls._unrendered) # pylint: disable=protected-access
+            for name in names:
+                item = getattr(value, name, None)
+                if type(item) not in _SCALARS:
+                    pending.append(item)
+            attributes = getattr(value, '__dict__', None)
+            if attributes:
+                unrendered = cls._unrendered # pylint: disable=protected-access
+                pending.extend(
+                    item for name, item in attributes.items()
+                    if type(item) not in _SCALARS and name not in _OWN_SLOTS
+                    and name not in unrendered)
+        elif isinstance(value, TrackedList):
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            if value._modified > since: # pylint: disable=protected-access
+                return False
+            pending.extend(value)
+        elif isinstance(value, (list, tuple)):
+            pending.extend(value)
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+    return True
+
+# slots walked by _unmodified per class: those referring to rendered nodes
+_walked_slots = {}
+
+# types of attribute values referring to no nodes, skipped by _unmodified
+_SCALARS = frozenset([str, int, float, bool, type(None)])
+
+# rendered output of coarse nodes (structs, parser, controls) shared by the
+# program variants of a sweep, and by runs if the cache keeps it on disk. The
+# program keys these nodes by the arguments of the generate_* stages building
+# them (see set_fragment_key), a key holds as long as the node is unmodified
+# (checked like memoized output) and is combined with the template
+# configuration and a digest of the generator's code and templates.
+_fragments = None
+_sources = None
+
+def set_fragment_cache(cache):
+    ''' Look up and store the output of keyed nodes in cache (a
+        fragments.FragmentCache), None disables the lookup.
+    '''
+    global _fragments # pylint: disable=global-statement
+    _fragments = cache
+
+def set_fragment_key(node, key):
+    ''' Key the rendered output of node by key (a str identifying how node
+        was built) until node or a node below it is modified.
+    '''
+    object.__setattr__(node, '_fragment', (key, _read_clock()))
+
+def _sources_digest():
+    ''' Return the digest of the code and templates of this package. '''
+    global _sources # pylint: disable=global-statement
+    if _sources is None:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        digest = hashlib.sha256()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(name for name in dirnames if name != '__pycache__')
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, 'rb') as file_:
+                    digest.update(file_.read())
+        _sources = digest.hexdigest()
+    return _sources
+
+class TrackedList(list):
+    ''' A list stamping itself as modified on modification, see _touch. '''
+    # pylint: disable=missing-docstring
+    __slots__ = ('_modified',)
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        _touch(self)
+
+    def append(self, item):
+        super().append(item)
+        _touch(self)
+
+    def extend(self, items):
+        super().extend(items)
+        _touch(self)
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        _touch(self)
+
+    def remove(self, item):
+        super().remove(item)
+        _touch(self)
+
+    def pop(self, *args):
+        item = super().pop(*args)
+        _touch(self)
+        return item
+
+    def clear(self):
+        super().clear()
+        _touch(self)
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        _touch(self)
+
+    def reverse(self):
+        super().reverse()
+        _touch(self)
+
+    def __setitem__(self, index, item):
+        super().__setitem__(index, item)
+        _touch(self)
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        _touch(self)
+
+    def __iadd__(self, items):
+        result = super().__iadd__(items)
+        _touch(self)
+        return result
+
+    def __imul__(self, count):
+        result = super().__imul__(count)
+        _touch(self)
+        return result
+
+def precompile(module='p4gen16'):
+    ''' Compile every template below template/ into the bytecode cache.
+        Returns the names of the compiled templates.
+    '''
+    root = os.path.join(os.path.dirname(importlib.import_module(module).__file__),
+                        'template')
+    compiled = []
+    for dirpath, _, filenames in sorted(os.walk(root)):
+        templates = os.path.relpath(dirpath, root)
+        for filename in sorted(filenames):
+            if not filename.endswith('.j2'):
+                continue
+            compiled_any = False
+            for delimiter in _DELIMITERS:
+                try:
+                    get_template(module, templates, delimiter, filename)
+                except jinja2.TemplateSyntaxError:
+                    continue
+                compiled_any = True
+            if compiled_any:
+                compiled.append(os.path.join(templates, filename))
+            else:
+                logging.warning('precompile: cannot compile %s/%s', templates, filename)
+    return compiled
+
+# template configurations (module, templates, delimiter, suffix), shared by
+# all instances using the same one
+_configs = {}
+
+def make_config(module='p4gen16', target=None, sub_target=None, suffix='.p4.j2',
+                delimiter='default'):
+    ''' Return the template configuration for the Templateable arguments. '''
+    if not target:
+        target = 'default'
+    if sub_target:
+        target = '/'.join([target, sub_target])
+    config = (module, target, delimiter, suffix)
+    return _configs.setdefault(config, config)
+
+# target whose templates render all target bound Templateables (None: the
+# target each is bound to), see set_render_target
+_render_target = None
+
+def set_render_target(target, sub_target=None):
+    ''' Render Templateables bound to any target with the templates of target
+        (and sub_target) instead, e.g. the target independent nodes of one IR
+        shared by the programs of several targets; None restores the targets
+        bound at construction.
+    '''
+    global _render_target # pylint: disable=global-statement
+    if target and sub_target:
+        target = '/'.join([target, sub_target])
+    _render_target = target or None
+    # memoized output depends on the templates
+    invalidate_renders()
+
+def check_instances(values, cls):
+    ''' Raise a TypeError unless all values are instances of cls; checked once
+        per distinct type, i.e. once for a homogeneous batch.
+    '''
+    for type_ in set(map(type, values)):
+        if not issubclass(type_, cls):
+            raise TypeError('{that} is not an instance of {this}'.format(
+                that=type_.__name__, this=cls.__name__))
+# attribute (slot) names per class, see Templateable._attributes
+_slot_names = {}
+
+def _slots_of(cls):
+    ''' Return the slot names of cls, including those of its bases. '''
+    try:
+        return _slot_names[cls]
+    except KeyError:
+        names = _slot_names[cls] = tuple(
+            name for klass in cls.__mro__
+            for name in klass.__dict__.get('__slots__', ()))
+        return names
+
+# slots of a Templateable not referring to other nodes
+_OWN_SLOTS = frozenset(['_jinja2', '_rendered', '_modified', '_fragment'])
+
+class _Unset():
+    ''' Marks an unset slot in a pickled Templateable. '''
+    # pylint: disable=too-few-public-methods
+
 # jinja2 wrapper class
 class Templateable():
     ''' Jinja2 powered __str__ implementations. '''
     # pylint: disable=too-few-public-methods
+    # compact instances: subclasses for high-volume nodes declare __slots__
+    __slots__ = ('_jinja2', '_rendered', '_modified')
+    log = logging
+    # attributes not rendered, but kept for analyses: modifications of the
+    # nodes they refer to do not invalidate the output of this one
+    _unrendered = frozenset()
+
     def __init__(self, module='p4gen16', target=None, sub_target=None, suffix='.p4.j2',
                  delimiter='default'):
-        self._jinja2_suffix = suffix
-        self._jinja2_module = module
-        if not target:
-            target = 'default'
-        if sub_target:
-            target = '/'.join([target, sub_target])
-        self._jinja2_templates = target
-        self.delimiter = delimiter
+        object.__setattr__(self, '_jinja2', make_config(
+            module, target, sub_target, suffix, delimiter))
+        object.__setattr__(self, '_rendered', None)
+        _touch(self)
+
+    @classmethod
+    def _new_unchecked(cls, config, **attributes):
+        ''' Return an instance with the given attributes, bypassing __init__
+            and its checks. For bulk constructors, which validate their
+            arguments once per batch.
+        '''
+        self = object.__new__(cls)
+        object.__setattr__(self, '_jinja2', config)
+        object.__setattr__(self, '_rendered', None)
+        _touch(self)
+        for name, value in attributes.items():
+            object.__setattr__(self, name, value)
+        return self
+
+    @property
+    def _jinja2_module(self):
+        return self._jinja2[0]
+
+    @property
+    def _jinja2_templates(self):
+        return self._jinja2[1]
+
+    @property
+    def delimiter(self): # pylint: disable=missing-docstring
+        return self._jinja2[2]
 
-        self.log = logging
+    @property
+    def _jinja2_suffix(self):
+        return self._jinja2[3]
 
     def _template_name(self):
-        return self.__class__.__name__ + self._jinja2_suffix
+        return self.__class__.__name__ + self._jinja2[3]
+
+    def _config(self):
+        ''' Return the template configuration to render with, see
+            set_render_target.
+        '''
+        config = self._jinja2
+        if _render_target is None or config[1] == 'default':
+            return config
+        module, _, delimiter, suffix = config
+        return make_config(module, _render_target, None, suffix, delimiter)
+
+    def _template(self):
+        module, templates, delimiter, _ = self._config()
+        return get_template(module, templates, delimiter, self._template_name())
+
+    def __setattr__(self, name, value):
+        # track lists so in-place modifications invalidate memoized output
+        if type(value) is list: # pylint: disable=unidiomatic-typecheck
+            value = TrackedList(value)
+        object.__setattr__(self, name, value)
+        _touch(self)
+
+    def _changed(self):
+        ''' Invalidate memoized output after a modification of this node
+            bypassing __setattr__, e.g. of a dict of child nodes.
+        '''
+        _touch(self)
+
+    def _attributes(self):
+        ''' Yield (name, value) of all set attributes, slots and __dict__. '''
+        for name in _slots_of(self.__class__):
+            try:
+                yield name, object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        yield from getattr(self, '__dict__', {}).items()
+
+    def __getstate__(self):
+        # compact: slot values by position, memoized output and fragment
+        # keys are not kept (their clock is that of this process)
+        values = []
+        for name in _slots_of(self.__class__):
+            if name == '_rendered':
+                values.append(None)
+                continue
+            if name == '_fragment':
+                values.append(_Unset)
+                continue
+            try:
+                values.append(object.__getattribute__(self, name))
+            except AttributeError:
+                values.append(_Unset)
+        attributes = getattr(self, '__dict__', None) or None
+        if attributes and '_fragment' in attributes:
+            attributes = dict(attributes)
+            del attributes['_fragment']
+        return tuple(values), attributes or None
+
+    def __setstate__(self, state):
+        # bypasses __setattr__, e.g. of immutable HeaderFields
+        values, attributes = state
+        for name, value in zip(_slots_of(self.__class__), values):
+            if value is not _Unset:
+                object.__setattr__(self, name, value)
+        if attributes:
+            self.__dict__.update(attributes)
+
+    def _memoized(self):
+        ''' Return the memoized output or None, if it is outdated (or this
+            node was rendered once at most).
+        '''
+        memoized = self._rendered
+        if type(memoized) is not tuple or memoized[0] != _generation: # pylint: disable=unidiomatic-typecheck
+            return None
+        _, since, rendered = memoized
+        if since != _clock:
+            if not _unmodified(self, since):
+                return None
+            # checked, up to date until the next modification
+            object.__setattr__(self, '_rendered', (_generation, _read_clock(), rendered))
+        return rendered
+
+    def _fragment_key(self):
+        ''' Return the fragment cache key of this node, or None if it has
+            none or was modified since it was keyed.
+        '''
+        fragment = getattr(self, '_fragment', None)
+        if fragment is None:
+            return None
+        key, since = fragment
+        if since != _clock and not _unmodified(self, since):
+            return None
+        return hashlib.sha256(repr((_sources_digest(), self._config(),
+                                    self.__class__.__name__, key)).encode()).hexdigest()
+
+    def _render(self):
+        if _emitter == 'native':
+            module, templates, delimiter, _ = self._config()
+            emit = get_native_emitter(module, templates, delimiter, self._template_name())
+            if emit is not None:
+                return emit(self)
+        rendered = self._memoized()
+        if rendered is not None:
+            return rendered
+        marker = self._rendered
+        key = None if _fragments is None else self._fragment_key()
+        if key is not None:
+            rendered = _fragments.get(key)
+        if rendered is None:
+            rendered = self._template().render(this=self) # XXX cannot pass self as self
+            if key is not None:
+                _fragments.put(key, rendered)
+        if MEMOIZE:
+            # the first render leaves a marker (the generation), the second
+            # keeps the output; bypass __setattr__, this is no modification
+            object.__setattr__(self, '_rendered', (_generation, _read_clock(), rendered)
+                               if marker == _generation else _generation)
+        return rendered
 
     def __str__(self):
-        filename = self._template_name()
-        _loader = jinja2.ChoiceLoader([
-            jinja2.PackageLoader(self._jinja2_module, os.path.join(
-                'template', self._jinja2_templates)),
-            jinja2.PackageLoader(self._jinja2_module, os.path.join(
-                'template', 'default')),
-            ])
-
-        delim = {}
-        if self.delimiter == 'default':
-            delim['bs'] = '{%'
-            delim['be'] = '%}'
-            delim['vs'] = '{{'
-            delim['ve'] = '}}'
-        elif self.delimiter == 'c':
-            delim['bs'] = '@@'
-            delim['be'] = '@@'
-            delim['vs'] = '@='
-            delim['ve'] = '=@'
+        if _stats is None:
+            return self._render()
+        memoized = self._memoized() is not None
+        token = _stats.enter()
+        rendered = self._render()
+        elapsed, self_time = _stats.leave(token)
+        _stats.record(self._template_name(), self.__class__.__name__, elapsed, self_time,
+                      len(rendered.encode()), memoized)
+        return rendered
+
+    def generate(self):
+        ''' Yield the rendered output chunk-wise, nested Templateables
+            rendered via the 'stream' filter are not held in memory as a whole.
+            (Streamed output is not memoized.)
+        '''
+        rendered = self._memoized()
+        key = None
+        if rendered is None and _fragments is not None:
+            key = self._fragment_key()
+            if key is not None:
+                rendered = _fragments.get(key)
+        if rendered is not None:
+            chunks = iter([rendered])
+        elif key is not None:
+            chunks = _fragments.generate(key, self._template().generate(this=self))
         else:
-            self.log.fatal('unknown delimiter: %s', self.delimiter)
-
-        _env = jinja2.Environment(
-            line_statement_prefix='#%',
-            loader=_loader,
-            block_start_string=delim['bs'],
-            block_end_string=delim['be'],
-            variable_start_string=delim['vs'],
-            variable_end_string=delim['ve']
-        )
-        _env.filters['drop'] = _sequence_drop
-        _env.filters['safe_first'] = _sequence_safe_first
-        template = _env.get_template(filename)
-        return template.render(this=self) # XXX cannot pass self as self
+            chunks = self._template().generate(this=self)
+        if _stats is None:
+            return chunks
+        return self._generate_recorded(chunks, rendered is not None)
+
+    def _generate_recorded(self, chunks, memoized):
+        elapsed = self_time = 0.0
+        output = 0
+        while True:
+            # only time spent producing chunks counts, not their consumption
+            token = _stats.enter()
+            chunk = next(chunks, None)
+            step, step_self = _stats.leave(token)
+            elapsed += step
+            self_time += step_self
+            if chunk is None:
+                break
+            output += len(chunk.encode())
+            yield chunk
+        _stats.record(self._template_name(), self.__class__.__name__, elapsed, self_time,
+                      output, memoized)
+
+    def render_to(self, stream):
+        ''' Write the rendered output chunk-wise to a file-like object. '''
+        for chunk in self.generate():
+            stream.write(chunk)
 
     def _id(self):
         ''' Allows no-op getattr calls. '''
@@ -83,3 +722,16 @@ def _sequence_drop(iterable, i=1):
     for j, element in enumerate(iterable, start=1):
         if j > i:
             yield element
+
+def _rendered(iterable):
+    ''' Render the elements of iterable, in parallel if enabled. '''
+    if _jobs < 2:
+        return iterable
+    return render_parallel(iterable)
+
+def _stream(value):
+    ''' Yield the output of value chunk-wise (instead of `value | string`). '''
+    if isinstance(value, Templateable):
+        yield from value.generate()
+    else:
+        yield str(value)
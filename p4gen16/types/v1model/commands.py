@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+'''
+v1model simple_switch_CLI commands filling the benchmark tables
+'''
+import itertools
+import re
+
+from ...keyspace import KeySpace
+
+_BITS = re.compile(r'bit<(\d+)>')
+
+def _action_data(action, value):
+    ''' Return the action data of action, every parameter set to value. '''
+    value = int(value)
+    data = []
+    for parameter in action.parameter:
+        bits = parameter.size or int(_BITS.fullmatch(parameter.type).group(1))
+        data.append(str(value & ((1 << bits) - 1)))
+    return data
+
+class SimpleSwitchCommands():
+    ''' The simple_switch_CLI commands setting the default action of tables
+        and adding count (default: the table size) entries with action to
+        each, its parameters set to egress_port. Keys are enumerated by
+        KeySpace, or taken from entries.generate_tables() if entry_options
+        (its options) are given. Commands are created on demand and written
+        in chunks of chunk_size lines, so memory use does not grow with the
+        number of entries (except for the arrays of generated entries).
+    '''
+    # pylint: disable=too-many-arguments
+    def __init__(self, program, tables=None, action=None, egress_port=0, count=None,
+                 entry_options=None, skip_filling_tables=False, chunk_size=4096):
+        if tables is None:
+            tables = program.get_main_pipeline().tables
+        self.tables = list(tables)
+        self.action = action
+        self.egress_port = egress_port
+        self.count = count
+        self.entry_options = entry_options
+        self.skip_filling_tables = skip_filling_tables
+        self.chunk_size = chunk_size
+        self.entry_sets = {}
+        if skip_filling_tables:
+            return
+        for table in self.tables:
+            KeySpace(table).check(self._count(table))
+        if entry_options is not None:
+            from ... import entries # requires numpy
+            # generated now, so invalid options fail before anything is written
+            self.entry_sets = dict(zip(
+                (table.name for table in self.tables),
+                entries.generate_tables(self.tables, count, **entry_options)))
+
+    def _count(self, table):
+        return (table.size or 0) if self.count is None else self.count
+
+    def _matches(self, table):
+        ''' Yield the match fields of the entries of table as lists of
+            strings and their priority (None unless table has ternary keys).
+        '''
+        kinds = [key.match_kind for key in table.keys]
+        if self.entry_options is None:
+            masks = ['&&&{}'.format((1 << key.field.bits) - 1) for key in table.keys]
+            for i, values in enumerate(KeySpace(table).keys(self._count(table))):
+                match = []
+                for kind, value, mask, key in zip(kinds, values, masks, table.keys):
+                    if kind == 'lpm':
+                        match.append('{}/{}'.format(value, key.field.bits))
+                    elif kind == 'ternary':
+                        match.append('{}{}'.format(value, mask))
+                    else:
+                        match.append(str(value))
+                yield match, i + 1 if 'ternary' in kinds else None
+            return
+
+        entry_set = self.entry_sets[table.name]
+        keys = len(table.keys)
+        # simple_switch_CLI: lower priority values win
+        top = len(entry_set) + 1
+        for row in entry_set.rows():
+            values = row[:keys]
+            if entry_set.prefix_lengths is not None:
+                lpm = kinds.index('lpm')
+                match = [str(value) for value in values]
+                match[lpm] = '{}/{}'.format(values[lpm], row[keys])
+                yield match, None
+            elif entry_set.masks is not None:
+                yield (['{}&&&{}'.format(value, mask) if kind == 'ternary' else str(value)
+                        for kind, value, mask in zip(kinds, values, row[keys:2 * keys])],
+                       top - row[-1])
+            else:
+                yield [str(value) for value in values], None
+
+    def _table_commands(self, table):
+        ''' Yield the commands of table. '''
+        default = table.default_action
+        yield ' '.join(['table_set_default', table.name, default.name]
+                       + _action_data(default, self.egress_port))
+        if self.skip_filling_tables or not table.keys:
+            return
+        action = next((action for action in table.actions if action.name == self.action),
+                      default)
+        prefix = 'table_add {} {} '.format(table.name, action.name)
+        data = _action_data(action, self.egress_port)
+        for match, priority in self._matches(table):
+            yield ' '.join([prefix + ' '.join(match), '=>'] + data
+                           + ([] if priority is None else [str(priority)]))
+
+    def generate(self):
+        ''' Yield the commands in chunks of chunk_size lines. '''
+        lines = itertools.chain.from_iterable(
+            self._table_commands(table) for table in self.tables)
+        while True:
+            chunk = list(itertools.islice(lines, self.chunk_size))
+            if not chunk:
+                return
+            yield '\n'.join(chunk) + '\n'
+
+    def render_to(self, stream):
+        ''' Write the commands chunk-wise to a file-like object. '''
+        for chunk in self.generate():
+            stream.write(chunk)
+
+    def __str__(self):
+        return ''.join(self.generate())
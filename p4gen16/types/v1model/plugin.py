@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+'''
+v1model target plugin, see types.targets
+'''
+from . import action
+from . import register
+from .commands import SimpleSwitchCommands
+from .control import V1ModelControlDeparse, generate_controls
+from .parser import V1ModelParser
+
+OPERATIONS = {
+    'register.declare': register.declare,
+    'register.read': register.read,
+    'register.write': register.write,
+    'parser': V1ModelParser,
+    'deparser': V1ModelControlDeparse,
+    'controls': generate_controls,
+    'main_pipeline': 'ingress',
+    'action.drop': action.drop,
+    'action.set_egress_port': action.set_egress_port,
+    'action.set_fixed_egress_port': action.set_fixed_egress_port,
+    'action.scale_action_data': action.scale_action_data,
+    'rules': SimpleSwitchCommands,
+}
@@ -2,6 +2,7 @@
 '''
 P4 v1model t4p4s controlplane type
 '''
+from ....keyspace import KeySpace
 from ....types.templateable import Templateable
 
 class ControlPlane(Templateable):
@@ -11,6 +12,9 @@ class ControlPlane(Templateable):
                          delimiter='c', **kwargs)
 
         self.tables = program.get_main_pipeline().tables
+        self.key_spaces = [KeySpace(table) for table in self.tables]
+        for key_space, table in zip(self.key_spaces, self.tables):
+            key_space.check(table.size or 0)
         self.egress_port = egress_port
         if self.tables:
             self.action = [ac for ac in self.tables[0].actions if ac.name == action[0]][0]
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+'''
+t4p4s (v1model sub-target) plugin, see types.targets
+'''
+from .controlplane import ControlPlane
+
+OPERATIONS = {
+    'controlplane': ControlPlane,
+}
@@ -0,0 +1,8 @@
+'''
+pytest configuration: import generate.py, benchmark.py and p4gen16 from the
+repository root.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,22 @@
+'''
+bmv2 JSON emitted from the IR
+'''
+import json
+
+import generate
+
+def test_program_json(tmp_path):
+    assert generate.main(['-t', 'v1model', '--number-tables', '2', '--bmv2-json',
+                          '-o', str(tmp_path)]) == 0
+    with open(str(tmp_path / 'program.json')) as file_:
+        config = json.load(file_)
+    ingress = [pipeline for pipeline in config['pipelines'] if pipeline['name'] == 'ingress']
+    names = [table['name'] for table in ingress[0]['tables']]
+    assert 'table_benchmark000' in names and 'table_benchmark001' in names
+
+def test_unsupported_program_fails(tmp_path):
+    # tables applied more than once are not supported
+    assert generate.main(['-t', 'v1model', '--repeat-apply-tables', '2', '--bmv2-json',
+                          '-o', str(tmp_path)]) == 1
+    assert not (tmp_path / 'program.json').exists()
+    assert (tmp_path / 'program.p4').exists()
@@ -0,0 +1,102 @@
+'''
+simple_switch_CLI commands filling the tables of v1model programs
+'''
+import pytest
+
+import generate
+
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
+requires_numpy = pytest.mark.skipif(numpy is None, reason='requires numpy')
+
+OPTIONS = ['-t', 'v1model', '--number-match-keys', '2', '--header-fields', '2']
+
+def _commands(output, *options, name='commands.txt'):
+    assert generate.main(['-o', str(output)] + OPTIONS + list(options)) == 0
+    return (output / name).read_text().splitlines()
+
+def _entries(lines):
+    ''' Return the match fields and the action data (then the priority) of
+        table_add lines.
+    '''
+    parsed = []
+    for line in lines:
+        if line.startswith('table_add '):
+            match, _, data = line.split(' ', 3)[3].partition('=>')
+            parsed.append((match.split(), data.split()))
+    return parsed
+
+@pytest.mark.parametrize('match_type, first, later', [
+    ('exact', '0 0', '1 0'),
+    ('lpm', '0/8 0/8', '1/8 0/8'),
+    ('ternary', '0&&&255 0&&&255', '1&&&255 0&&&255'),
+])
+def test_table_add_syntax(tmp_path, match_type, first, later):
+    lines = _commands(tmp_path, '--number-tables', '1', '--number-table-entries', '300',
+                      '--match-type', match_type)
+    assert lines[0] == 'table_set_default table_benchmark000 set_fixed_egress_port'
+    assert len(lines) == 301
+    prefix = 'table_add table_benchmark000 set_fixed_egress_port '
+    # the last key is the least significant digit of the entry index
+    assert lines[1] == prefix + first + ' =>' + (' 1' if match_type == 'ternary' else '')
+    assert lines[257] == prefix + later + ' =>' + (' 257' if match_type == 'ternary' else '')
+
+def test_ternary_priorities(tmp_path):
+    lines = _commands(tmp_path, '--number-tables', '1', '--number-table-entries', '5',
+                      '--match-type', 'ternary')
+    # without --entries the keys are disjoint, the priorities follow the entries
+    assert [data for _, data in _entries(lines)] == [[str(i)] for i in range(1, 6)]
+
+@requires_numpy
+def test_generated_ternary_priorities(tmp_path):
+    lines = _commands(tmp_path, '--number-tables', '1', '--number-table-entries', '200',
+                      '--match-type', 'ternary', '--entries', '--ternary-mask-density', '0.5')
+    entries = _entries(lines)
+    priorities = [int(data[-1]) for _, data in entries]
+    assert sorted(priorities) == list(range(1, 201))
+    # lower priority values win: more specific (more mask bits) entries first
+    specificity = [sum(bin(int(field.partition('&&&')[2])).count('1') for field in match)
+                   for match, _ in entries]
+    by_priority = [bits for _, bits in sorted(zip(priorities, specificity))]
+    assert by_priority == sorted(by_priority, reverse=True)
+
+def test_action_data_is_truncated(tmp_path):
+    lines = _commands(tmp_path, '--number-tables', '1', '--number-table-entries', '2',
+                      '--action', 'scale_action_data', '--number-action-data', '2',
+                      '--default-egress-spec', '300')
+    # 300 does not fit into the bit<8> parameters
+    assert [data for _, data in _entries(lines)] == [['44', '44'], ['44', '44']]
+
+@pytest.mark.parametrize('entries', [[], ['--entries', '--entry-seed', '7']])
+def test_shard_commands(tmp_path, entries):
+    options = ['--number-tables', '3', '--number-table-entries', '20'] + entries
+    (tmp_path / 'sharded').mkdir()
+    (tmp_path / 'single').mkdir()
+    shards = [_commands(tmp_path / 'sharded', '--shard-commands', *options,
+                        name='commands_table_benchmark00{}.txt'.format(i)) for i in range(3)]
+    assert not (tmp_path / 'sharded' / 'commands.txt').exists()
+    for i, shard in enumerate(shards):
+        assert len(shard) == 21
+        assert all(line.split()[1] == 'table_benchmark00{}'.format(i) for line in shard)
+    # a table's shard is seeded with entry_seed + i, as in commands.txt
+    assert sum(shards, []) == _commands(tmp_path / 'single', *options)
+
+@requires_numpy
+@pytest.mark.parametrize('match_type', ['exact', 'lpm', 'ternary'])
+def test_commands_match_entries(tmp_path, match_type):
+    lines = _commands(tmp_path, '--number-tables', '2', '--number-table-entries', '50',
+                      '--header-field-size', '16', '--match-key-size', '16',
+                      '--match-type', match_type, '--entries', '--entry-seed', '3')
+    with numpy.load(str(tmp_path / 'entries.npz')) as arrays:
+        for i in range(2):
+            table = 'table_benchmark00{}'.format(i)
+            columns = [arrays[name].tolist() for name in sorted(arrays.files)
+                       if name.startswith(table + '.') and name.count('.') == 2]
+            matches = [match for match, _ in
+                       _entries(line for line in lines if line.split()[1] == table)]
+            keys = [tuple(int(field.split('/')[0].split('&&&')[0]) for field in match)
+                    for match in matches]
+            assert keys == list(zip(*columns))
@@ -0,0 +1,101 @@
+'''
+Native emitters produce the output of the Jinja2 templates they replace
+'''
+import pytest
+
+import generate
+from p4gen16.types import templateable
+from p4gen16.types.header import Header, HeaderField
+from p4gen16.types.parameter import Parameter
+from p4gen16.types.statement import Define, Statement
+from p4gen16.types.struct import StructField
+from p4gen16.types.table import TableKey
+
+# header, key and action variations
+CONFIGS = [
+    [],
+    ['--header-fields', '4', '--header-field-size', '16', '--match-key-size', '16',
+     '--number-match-keys', '2', '--header-stack-height', '3'],
+    ['--match-type', 'lpm', '--header-fields', '3', '--header-field-size', '32',
+     '--match-key-size', '32', '--match-last'],
+    ['--match-type', 'ternary', '--action', 'scale_action_data', '--number-action-data', '3',
+     '--number-tables', '3'],
+    ['--header-field-modifies', '2', '--meta-field-modifies', '2', '--header-fields', '2',
+     '--deparser-add-headers', '2', '--header-types', 'shared'],
+    ['--skip-ethernet', '--add-uninteresting-header', '--action', 'drop',
+     '--number-tables', '0'],
+]
+
+@pytest.fixture(autouse=True)
+def _jinja2_emitter():
+    yield
+    templateable.set_emitter('jinja2')
+
+def _render(node, emitter):
+    templateable.set_emitter(emitter)
+    templateable.invalidate_renders()
+    return str(node)
+
+def _nodes(root):
+    ''' Return the Templateables reachable from root. '''
+    nodes = {}
+    pending = [root]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, templateable.Templateable):
+            if id(value) in nodes:
+                continue
+            nodes[id(value)] = value
+            pending.extend(item for _, item in value._attributes()) # pylint: disable=protected-access
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple, set)):
+            pending.extend(value)
+    return nodes.values()
+
+def _native_nodes(nodes):
+    ''' Return the nodes rendered by a native emitter, by template name. '''
+    by_name = {}
+    for node in nodes:
+        module, templates, delimiter, _ = node._config() # pylint: disable=protected-access
+        name = node._template_name() # pylint: disable=protected-access
+        if templateable.get_native_emitter(module, templates, delimiter, name):
+            by_name.setdefault(name, []).append(node)
+    return by_name
+
+def _assert_equal(by_name):
+    for name, nodes in by_name.items():
+        jinja2 = [_render(node, 'jinja2') for node in nodes]
+        native = [_render(node, 'native') for node in nodes]
+        assert native == jinja2, name
+
+@pytest.mark.parametrize('sub_target', [[], ['--sub-target', 't4p4s']])
+@pytest.mark.parametrize('options', CONFIGS)
+def test_v1model(options, sub_target):
+    args = generate.create_parser().parse_args(['-t', 'v1model'] + sub_target + options)
+    program, controller, utilities = generate.build(args)
+    by_name = _native_nodes(_nodes(program))
+    assert by_name
+    _assert_equal(by_name)
+    # and whole outputs
+    for content in [program, controller] + list(utilities.values()):
+        if content is not None:
+            assert _render(content, 'native') == _render(content, 'jinja2')
+
+@pytest.mark.parametrize('target', ['v1model', 'sume_switch'])
+def test_every_emitter(target):
+    # nodes built directly: not every type occurs in generated programs
+    # (e.g. Define) and sume_switch programs cannot be generated (no controls)
+    fields = [HeaderField(bits, 'f{}'.format(bits), target=target) for bits in (1, 9, 48)]
+    header = Header('h', fields=fields, target=target)
+    nodes = list(fields) + [
+        StructField(header, 'h', target=target),
+        StructField('bit<8>', 'meta_f', target=target),
+        Parameter('bit<9>', 'port', target=target),
+        Statement('sume_metadata.dst_port = port', target=target),
+        Define('PORT', '0b00000001', target=target),
+    ] + [TableKey(header, field, kind, target=target)
+         for field, kind in zip(fields, ['exact', 'lpm', 'ternary'])]
+    by_name = _native_nodes(nodes)
+    assert set(by_name) == set(templateable._native_emitters) # pylint: disable=protected-access
+    _assert_equal(by_name)
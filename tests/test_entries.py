@@ -0,0 +1,84 @@
+'''
+Vectorized table entry generation
+'''
+import pytest
+
+import generate
+from p4gen16 import entries
+
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
+requires_numpy = pytest.mark.skipif(numpy is None, reason='requires numpy')
+
+def _generate(output, *options):
+    return generate.main(['-t', 'v1model', '--number-table-entries', '200', '--entries',
+                          '-o', str(output)] + list(options))
+
+def test_missing_numpy_fails(tmp_path, monkeypatch):
+    def lazy_import(name):
+        raise ModuleNotFoundError(name)
+    monkeypatch.setattr(entries, 'numpy', None)
+    monkeypatch.setattr(entries, 'lazy_import', lazy_import)
+    # the t4p4s controller does not use the entries, the plain v1model commands do
+    assert _generate(tmp_path, '--sub-target', 't4p4s') == 1
+    assert (tmp_path / 'program.p4').exists()
+    assert not (tmp_path / 'entries.npz').exists()
+    assert _generate(tmp_path) == 1
+
+@requires_numpy
+def test_invalid_options_fail(tmp_path):
+    # 200 entries do not fit into the 2**4 prefixes of length 4
+    assert _generate(tmp_path, '--sub-target', 't4p4s', '--match-type', 'lpm',
+                     '--match-key-size', '16', '--header-field-size', '16',
+                     '--lpm-prefix-lengths', '4') == 1
+    assert not (tmp_path / 'entries.npz').exists()
+    assert _generate(tmp_path, '--sub-target', 't4p4s') == 0
+    assert (tmp_path / 'entries.npz').exists()
+
+@requires_numpy
+@pytest.mark.parametrize('distribution', sorted(entries.DISTRIBUTIONS))
+@pytest.mark.parametrize('bits', [8, 32, 62, 63, 64, 80, 128])
+@pytest.mark.parametrize('count', [0, 1, 200])
+def test_unique_keys(distribution, bits, count):
+    keys = entries.unique_keys(numpy.random.default_rng(1), count, bits, distribution)
+    assert keys.dtype == numpy.uint64
+    assert len(keys) == count
+    assert (numpy.diff(keys) > 0).all()
+    if bits < 64:
+        assert count == 0 or int(keys[-1]) < 1 << bits
+
+@requires_numpy
+@pytest.mark.parametrize('distribution', sorted(entries.DISTRIBUTIONS))
+@pytest.mark.parametrize('keys, size', [(2, 32), (3, 32), (2, 64)])
+def test_wide_composite_keys(distribution, keys, size):
+    ''' Composite keys of 64 bits and more, e.g. --number-match-keys 2
+        --match-key-size 32, are generated for every distribution.
+    '''
+    args = generate.create_parser().parse_args([
+        '-t', 'v1model', '--header-fields', str(keys), '--number-match-keys', str(keys),
+        '--header-field-size', str(size), '--match-key-size', str(size),
+        '--number-table-entries', '500'])
+    program = generate.build_targets(args)[0][1]
+    table = program.get_main_pipeline().tables[0]
+    entry_set = entries.generate(table, distribution=distribution, seed=3)
+    assert len(entry_set) == 500
+    rows = {tuple(row) for row in entry_set.rows()}
+    assert len(rows) == 500
+
+@requires_numpy
+@pytest.mark.parametrize('match_type', ['exact', 'lpm', 'ternary'])
+def test_high_key_columns(match_type):
+    ''' The keys beyond the low 63 bits of the composite key are not 0. '''
+    args = generate.create_parser().parse_args([
+        '-t', 'v1model', '--header-fields', '3', '--number-match-keys', '3',
+        '--header-field-size', '32', '--match-key-size', '32', '--match-type', match_type,
+        '--number-table-entries', '500'])
+    program = generate.build_targets(args)[0][1]
+    table = program.get_main_pipeline().tables[0]
+    entry_set = entries.generate(table, seed=3, mask_density=0.5)
+    for column in entry_set.keys:
+        assert int(column.max()) < 1 << 32
+        assert len(numpy.unique(column)) > 400
@@ -0,0 +1,76 @@
+'''
+Fragment cache: rendered structs, parser and controls reused by variants
+built with the same stage arguments, unless modified after they were built
+'''
+import pytest
+
+import generate
+from p4gen16 import snapshot
+from p4gen16.types import templateable
+from p4gen16.types.fragments import FragmentCache
+from p4gen16.types.struct import StructField
+
+def _program(*options):
+    args = generate.create_parser().parse_args(
+        ['-t', 'v1model', '--number-tables', '2', '--header-stack-height', '3']
+        + list(options))
+    return generate.build(args)[0]
+
+def _rendered(program):
+    templateable.invalidate_renders()
+    return ''.join(program.generate())
+
+@pytest.fixture(name='cache')
+def fixture_cache():
+    cache = FragmentCache()
+    templateable.set_fragment_cache(cache)
+    yield cache
+    templateable.set_fragment_cache(None)
+
+def test_variants_share_fragments(cache):
+    _rendered(_program('--number-table-entries', '1'))
+    # two structs and the parser are shared, the controls differ
+    assert (cache.hits, cache.misses) == (0, 4)
+    variant = _program('--number-table-entries', '2')
+    rendered = _rendered(variant)
+    assert (cache.hits, cache.misses) == (3, 5)
+    assert 'size = 2;' in rendered
+    templateable.set_fragment_cache(None)
+    assert rendered == _rendered(variant)
+
+def test_modified_fragments_are_rendered(cache):
+    _rendered(_program())
+    variant = _program()
+    variant.struct_metadata().add_field(StructField('bit<8>', 'added', target='v1model'))
+    variant.get_main_pipeline().tables[0].size = 77
+    rendered = _rendered(variant)
+    # only the headers struct and the parser are unmodified
+    assert cache.hits == 2
+    assert 'bit<8> added;' in rendered
+    assert 'size = 77;' in rendered
+
+def test_derived_variants(cache):
+    program = _program()
+    _rendered(program)
+    derived = program.derive(number_table_entries=5)
+    rendered = _rendered(derived)
+    assert cache.hits == 3
+    assert 'size = 5;' in rendered
+    assert 'size = 5;' not in _rendered(program)
+
+def test_disk_cache_is_shared_by_runs(tmp_path):
+    try:
+        templateable.set_fragment_cache(FragmentCache(str(tmp_path)))
+        rendered = _rendered(_program())
+        # a later run
+        cache = FragmentCache(str(tmp_path))
+        templateable.set_fragment_cache(cache)
+        assert _rendered(_program()) == rendered
+        assert (cache.hits, cache.misses) == (4, 0)
+    finally:
+        templateable.set_fragment_cache(None)
+
+def test_snapshots_are_not_keyed(cache):
+    loaded = snapshot.loads(snapshot.dumps(_program()))
+    _rendered(loaded)
+    assert (cache.hits, cache.misses) == (0, 0)
@@ -0,0 +1,90 @@
+'''
+Composite key space: unique keys of the entries installed by controllers
+and rule writers, the last key least significant
+'''
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import generate
+from p4gen16.keyspace import KeySpace, shifts
+
+def _table(*widths):
+    keys = [SimpleNamespace(field=SimpleNamespace(bits=width, required_bytes=(width + 7) // 8))
+            for width in widths]
+    return SimpleNamespace(name='table_0', keys=keys)
+
+def test_keys_are_unique_up_to_size():
+    key_space = KeySpace(_table(3, 2))
+    assert key_space.size == 32
+    keys = list(key_space.keys(32))
+    assert len(set(keys)) == 32
+    assert all(a < 8 and b < 4 for a, b in keys)
+
+def test_check_rejects_count_above_size():
+    key_space = KeySpace(_table(3, 2))
+    key_space.check(32)
+    with pytest.raises(ValueError, match='33 entries exceed its key space of 32 keys'):
+        key_space.check(33)
+    with pytest.raises(ValueError):
+        list(key_space.keys(2, start=31))
+    with pytest.raises(ValueError, match='no keys'):
+        KeySpace(_table()).check(1)
+
+@pytest.mark.parametrize('widths', [(8,), (3, 2), (1, 16, 5), (48, 32), (9, 64, 1)])
+def test_mixed_widths(widths):
+    key_space = KeySpace(_table(*widths))
+    assert shifts(list(widths)) == [sum(widths[i + 1:]) for i in range(len(widths))]
+    for i in [0, 1, 2, 5, 1000, (1 << sum(widths)) - 1]:
+        i %= key_space.size
+        values = key_space.key(i)
+        assert all(value < 1 << width for value, width in zip(values, widths))
+        composite = 0
+        for value, width in zip(values, widths):
+            composite = composite << width | value
+        assert composite == i
+
+def _built(tmp_path, *options):
+    options = ['-t', 'v1model', '--sub-target', 't4p4s', '--number-tables', '2',
+               '--number-match-keys', '2', '--header-fields', '2',
+               '--number-table-entries', '20'] + list(options)
+    assert generate.main(['-o', str(tmp_path)] + options) == 0
+    program = generate.build_targets(generate.create_parser().parse_args(options))[0][1]
+    return [KeySpace(table) for table in program.get_main_pipeline().tables]
+
+def _digit(i, shift, mask):
+    return (i >> int(shift)) & (int(mask) if mask else (1 << 64) - 1)
+
+@pytest.mark.parametrize('size', ['8', '12'])
+def test_controller_matches_key_space(tmp_path, size):
+    key_spaces = _built(tmp_path, '--header-field-size', size, '--match-key-size', size)
+    text = (tmp_path / 'controller').read_text()
+    matches = re.findall(r'match_(\d+)_(\d+)\[0\] = \(uint\d+_t\) '
+                         r'\(\(\(uint64_t\) i >> (\d+)\)(?: & (\d+)ULL)?\);', text)
+    assert len(matches) == 4
+    for i in range(20):
+        for table, key, shift, mask in matches:
+            assert _digit(i, shift, mask) == key_spaces[int(table) - 1].key(i)[int(key) - 1]
+
+@pytest.mark.parametrize('size', ['8', '12'])
+def test_control_plane_matches_key_space(tmp_path, size):
+    ''' The keys are written in network byte order, one digit per key. '''
+    key_spaces = _built(tmp_path, '--header-field-size', size, '--match-key-size', size)
+    text = (tmp_path / 'controlplane.c.py').read_text()
+    digit = re.compile(r'digit = \(\(uint64_t\) j >> (\d+)\)(?: & (\d+)ULL)?;')
+    byte = re.compile(r'\(\(uint8_t\*\)keys(\d+)\[j\]\)\[(\d+)\] = \(uint8_t\) \(digit >> (\d+)\);')
+    for j in range(20):
+        written = [bytearray(4) for _ in key_spaces]
+        value = None
+        for line in text.splitlines():
+            if digit.search(line):
+                value = _digit(j, *digit.search(line).groups())
+            elif byte.search(line):
+                table, offset, shift = map(int, byte.search(line).groups())
+                written[table - 1][offset] = value >> shift & 0xFF
+        for key_space, key in zip(key_spaces, written):
+            required = [digit_key.field.required_bytes for digit_key, _, _ in key_space.digits]
+            expected = b''.join(value.to_bytes(width, 'big')
+                                for value, width in zip(key_space.key(j), required))
+            assert bytes(key[:sum(required)]) == expected
@@ -0,0 +1,113 @@
+'''
+Memoized output: kept for repeatedly rendered nodes only, invalidated by
+modifications of the node or a node below it
+'''
+import copy
+
+import generate
+from p4gen16 import snapshot
+from p4gen16.types import templateable
+from p4gen16.types.header import HeaderField
+from p4gen16.types.statement import Statement
+
+def _program(*options):
+    args = generate.create_parser().parse_args(['-t', 'v1model', '--number-tables', '3']
+                                               + list(options))
+    return generate.build(args)[0]
+
+def _memoized(node):
+    return node._memoized() is not None # pylint: disable=protected-access
+
+def _rendered_twice(program):
+    ''' Render program twice, the second render memoizes all its nodes. '''
+    templateable.invalidate_renders()
+    str(program)
+    rendered = str(program)
+    assert _memoized(program)
+    return rendered
+
+def test_only_repeated_nodes_are_kept():
+    program = _program('--repeat-apply-tables', '2')
+    templateable.invalidate_renders()
+    str(program)
+    pipeline = program.get_main_pipeline()
+    # applied twice, thus rendered twice
+    assert all(_memoized(statement) for statement in pipeline.sequence)
+    assert not any(_memoized(table) for table in pipeline.tables)
+    assert not _memoized(pipeline)
+    assert not _memoized(program)
+
+def test_attribute_modification():
+    program = _program()
+    rendered = _rendered_twice(program)
+    table = program.get_main_pipeline().tables[1]
+    table.size = 77
+    assert not _memoized(program)
+    modified = str(program)
+    assert modified != rendered
+    assert 'size = 77;' in str(table)
+    assert modified == str(copy.deepcopy(program))
+
+def test_list_modification():
+    program = _program()
+    rendered = _rendered_twice(program)
+    program.get_main_pipeline().sequence.append(Statement('mark_to_drop()'))
+    modified = str(program)
+    assert modified != rendered
+    assert 'mark_to_drop();' in modified
+
+def test_child_modification():
+    program = _program()
+    rendered = _rendered_twice(program)
+    # program > controls > ingress > tables > table > keys > key, the key
+    # is shared by all tables
+    key = program.get_main_pipeline().tables[0].keys[0]
+    key.match_kind = 'lpm'
+    modified = str(program)
+    assert modified != rendered
+    assert modified.count(': lpm;') == 3
+
+def test_dict_modification():
+    program = _program()
+    rendered = _rendered_twice(program)
+    header = program.explicit_headers()[0]
+    header.add_field(HeaderField(8, 'added'))
+    modified = str(program)
+    assert modified != rendered
+    assert 'bit<8> added;' in modified
+
+def test_unrelated_output_is_kept():
+    program = _program()
+    _rendered_twice(program)
+    tables = program.get_main_pipeline().tables
+    tables[0].size = 77
+    assert not _memoized(tables[0])
+    assert not _memoized(program)
+    # other tables and the headers are not below the modified node
+    assert _memoized(tables[1])
+    assert all(_memoized(header) for header in program.explicit_headers())
+    # neither are the nodes of other programs
+    other = _program()
+    _rendered_twice(other)
+    tables[1].size = 78
+    assert _memoized(other)
+
+def test_shared_node_modification():
+    program = _program()
+    clone = program.clone()
+    rendered = _rendered_twice(program)
+    _rendered_twice(clone)
+    program.explicit_headers()[0].add_field(HeaderField(8, 'added'))
+    assert 'bit<8> added;' in str(program)
+    assert 'bit<8> added;' in str(clone)
+    assert str(program) != rendered
+
+def test_snapshot_modification():
+    program = _program()
+    rendered = _rendered_twice(program)
+    loaded = snapshot.loads(snapshot.dumps(program))
+    assert str(loaded) == rendered
+    str(loaded)
+    loaded.get_main_pipeline().tables[2].size = 77
+    assert 'size = 77;' in str(loaded)
+    assert str(program) == rendered
@@ -0,0 +1,113 @@
+'''
+IR optimization passes, each on a generated program it leaves alone and on
+a program generated (or, for duplicate-statements, built) to trigger it
+'''
+import generate
+from p4gen16 import passes
+from p4gen16.types.header import Header, HeaderField
+from p4gen16.types.statement import ApplyTable, ModifyHeader
+from p4gen16.types.struct import StructField
+
+def _program(*options):
+    args = generate.create_parser().parse_args(['-t', 'v1model', '--number-tables', '2']
+                                               + list(options))
+    return generate.build(args)[0]
+
+def _optimized(*options):
+    ''' Return the program of a generate.py run with options and the
+        components each pass removed.
+    '''
+    args = generate.create_parser().parse_args(['-t', 'v1model'] + list(options))
+    report = {}
+    program = generate.build(args, report)[0]
+    return program, {entry['name']: entry['removed'] for entry in report['passes']}
+
+def _removed(program, name, **options):
+    return passes.run(program, [name], **options)['passes'][0]['removed']
+
+def _add_header(program, name):
+    header = Header(name, fields=[HeaderField(8, 'f')], target=program.target)
+    program.add_header(header)
+    program.struct_headers().add_field(StructField(header, name, target=program.target))
+    return header
+
+def test_dead_actions():
+    program = _program('--action', 'drop')
+    assert _removed(program.clone(), 'dead-actions', entry_actions=['drop']) == []
+    derived = program.clone()
+    assert sorted(_removed(derived, 'dead-actions', entry_actions=['set_fixed_egress_port'])) == [
+        'ingress.table_benchmark000: action drop',
+        'ingress.table_benchmark001: action drop',
+        'ingress: action drop',
+    ]
+    assert 'drop' not in str(derived.get_main_pipeline())
+    # the program the clone was made from is unchanged
+    assert sorted(action.name for action in program.get_main_pipeline().tables[0].actions) == [
+        'drop', 'set_fixed_egress_port']
+
+def test_dead_actions_of_generated_programs():
+    # the simple_switch_CLI commands install no entries, only the default action
+    program, removed = _optimized('--number-tables', '2', '--action', 'drop',
+                                  '--passes', 'dead-actions')
+    assert sorted(removed['dead-actions']) == [
+        'ingress.table_benchmark000: action drop',
+        'ingress.table_benchmark001: action drop',
+        'ingress: action drop',
+    ]
+    assert 'drop' not in str(program)
+    # entries use the action
+    _, removed = _optimized('--number-tables', '2', '--action', 'drop',
+                            '--number-table-entries', '4', '--passes', 'dead-actions')
+    assert removed == {'dead-actions': []}
+    _, removed = _optimized('--number-tables', '2', '--action', 'drop', '--sub-target', 't4p4s',
+                            '--number-table-entries', '4', '--passes', 'dead-actions')
+    assert removed == {'dead-actions': []}
+
+def test_unused_headers():
+    program = _program('--header-field-modifies', '1', '--deparser-add-headers', '1')
+    assert _removed(program.clone(), 'unused-headers') == []
+
+    _add_header(program, 'unused')
+    modified = _add_header(program, 'modified')
+    block = program.own_block('ingress')
+    block.sequence = list(block.sequence) + [ModifyHeader(modified.field('f'), 1)]
+    assert _removed(program, 'unused-headers') == ['header unused']
+    assert [header.name for header in program.explicit_headers()] == [
+        'h000', 'dep_h000', 'modified']
+    rendered = str(program)
+    assert 'h.modified.f = 1;' in rendered
+    assert 'unused' not in rendered
+
+def test_unused_headers_of_generated_programs():
+    # extracted after the parse tree and not emitted
+    program, removed = _optimized('--deparser-remove-headers', '2', '--passes', 'unused-headers')
+    assert removed == {'unused-headers': ['header dep_r_h000', 'header dep_r_h001']}
+    assert program.deparser_remove_headers == []
+    assert 'dep_r_h' not in str(program)
+    # matched by the tables
+    program, removed = _optimized('--deparser-remove-headers', '2', '--match-last',
+                                  '--passes', 'unused-headers')
+    assert removed == {'unused-headers': ['header dep_r_h000']}
+    assert 'p.extract(h.dep_r_h001);' in str(program.parser)
+    assert 'dep_r_h000' not in str(program)
+
+def test_removed_headers_of_clones():
+    program = _program('--deparser-remove-headers', '1')
+    clone = program.clone()
+    assert _removed(clone, 'unused-headers') == ['header dep_r_h000']
+    assert 'dep_r_h000' not in str(clone)
+    assert 'p.extract(h.dep_r_h000);' in str(program)
+
+def test_duplicate_statements():
+    # generated programs modify every field once
+    program = _program('--header-field-modifies', '1', '--deparser-add-headers', '1')
+    assert _removed(program.clone(), 'duplicate-statements') == []
+
+    block = program.own_block('ingress')
+    apply, _, modify, set_valid = block.sequence
+    assert isinstance(apply, ApplyTable)
+    block.sequence = [modify, set_valid, modify, set_valid, apply, modify]
+    assert _removed(program, 'duplicate-statements') == [
+        'ingress: h.h000.f000 = 255', 'ingress: h.dep_h000.setValid()']
+    # writes separated by a table apply are kept
+    assert program.get_main_pipeline().sequence == [modify, set_valid, apply, modify]
@@ -0,0 +1,55 @@
+'''
+Several targets and sub-targets emitted from one IR build
+'''
+import os
+
+import pytest
+
+import generate
+
+OPTIONS = ['--number-tables', '2', '--header-stack-height', '2', '--header-fields', '2',
+           '--number-table-entries', '4']
+
+def _files(directory):
+    contents = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name)) as file_:
+            contents[name] = file_.read()
+    return contents
+
+def _generate(output, *options):
+    output.mkdir()
+    return generate.main(['-o', str(output)] + list(options) + OPTIONS)
+
+def test_one_build_matches_single_builds(tmp_path):
+    args = generate.create_parser().parse_args(
+        ['-t', 'v1model', '--sub-target', 'none,t4p4s'] + OPTIONS)
+    built = generate.build_targets(args)
+    assert [unit[0] for unit in built] == ['v1model', 'v1model_t4p4s']
+    # both are emitted from the same program
+    assert built[0][1] is built[1][1]
+
+    assert _generate(tmp_path / 'multi', '-t', 'v1model', '--sub-target', 'none,t4p4s') == 0
+    assert sorted(os.listdir(str(tmp_path / 'multi'))) == ['v1model', 'v1model_t4p4s']
+    assert _generate(tmp_path / 'v1model', '-t', 'v1model') == 0
+    assert _generate(tmp_path / 't4p4s', '-t', 'v1model', '--sub-target', 't4p4s') == 0
+    assert _files(str(tmp_path / 'multi' / 'v1model')) == _files(str(tmp_path / 'v1model'))
+    assert _files(str(tmp_path / 'multi' / 'v1model_t4p4s')) == _files(str(tmp_path / 't4p4s'))
+
+def test_failing_target_is_reported(tmp_path):
+    status = _generate(tmp_path / 'multi', '-t', 'v1model,sume_switch',
+                       '--sub-target', 'none,t4p4s')
+    # the other targets are still written
+    assert status == 1
+    assert sorted(os.listdir(str(tmp_path / 'multi'))) == ['v1model', 'v1model_t4p4s']
+    assert _generate(tmp_path / 't4p4s', '-t', 'v1model', '--sub-target', 't4p4s') == 0
+    assert _files(str(tmp_path / 'multi' / 'v1model_t4p4s')) == _files(str(tmp_path / 't4p4s'))
+
+def test_target_without_controls(tmp_path):
+    args = generate.create_parser().parse_args(['-t', 'sume_switch'] + OPTIONS)
+    with pytest.raises(ValueError, match='sume_switch: controls are not implemented'):
+        generate.build_targets(args)
+    failed = []
+    assert generate.build_targets(args, failed) == []
+    assert [target for target, _ in failed] == ['sume_switch']
+    assert _generate(tmp_path / 'sume_switch', '-t', 'sume_switch') == 1